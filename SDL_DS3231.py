@@ -33,10 +33,13 @@
 
 from __future__ import print_function
 
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timedelta
+import errno
+import threading
 import time
 
-import smbus
+import SDL_DS3231_bus
 
 #  DS3232 Register Addresses
 RTC_SECONDS = 0x00
@@ -106,16 +109,44 @@ YEARS_PER_CENTURY = 100
 
 OSCILLATOR_ON_MASK = 0b1<<7
 
+_monotonic = getattr(time, 'monotonic', time.time)
+
 def bv(n):
     return (1<<n)
 
+#  BCD lookup tables. _BCD_DECODE holds None for bytes with a nibble > 9.
+_BCD_DECODE = tuple(
+    (b >> 4) * 10 + (b & 0x0F) if (b >> 4) < 10 and (b & 0x0F) < 10 else None
+    for b in range(0x100))
+_BCD_ENCODE = tuple(((x // 10) << 4) | (x % 10) for x in range(100))
+
+
 def bcd_to_int(bcd, n=2):
     """Decode n least significant packed binary coded decimal digits to binary.
     Return binary result.
     n defaults to 2 (BCD digits).
     n=0 decodes all digits.
+    Raise ValueError if a decoded digit is not 0-9.
     """
-    return int(('%x' % bcd)[-n:])
+    if n == 2 and bcd >= 0:
+        x = _BCD_DECODE[bcd & 0xFF]
+        if x is not None:
+            return x
+    elif bcd >= 0:
+        x = 0
+        scale = 1
+        rest = bcd
+        while True:
+            digit = rest & 0x0F
+            if digit > 9:
+                break
+            x += digit * scale
+            rest >>= 4
+            n -= 1
+            if not rest or n == 0:
+                return x
+            scale *= 10
+    raise ValueError('Invalid BCD value 0x%x.' % bcd)
 
 
 def int_to_bcd(x, n=2):
@@ -126,7 +157,301 @@ def int_to_bcd(x, n=2):
     n defaults to 2 (digits).
     n=0 encodes all digits.
     """
-    return int(str(x)[-n:], 0x10)
+    if 0 <= x < 100 and n == 2:
+        return _BCD_ENCODE[x]
+    if x < 0:
+        raise ValueError('Cannot encode negative value %r as BCD.' % (x,))
+    if n:
+        x %= 10 ** n
+    bcd = 0
+    shift = 0
+    while x:
+        bcd |= _BCD_ENCODE[x % 100] << shift
+        x //= 100
+        shift += 8
+    return bcd
+
+
+def bcd_to_ints(data):
+    """Decode every byte of a register block (bytes, bytearray or a list
+    of ints such as read_i2c_block_data() returns) from 2-digit BCD.
+    Return a list of ints.
+    """
+    values = [_BCD_DECODE[b] for b in bytearray(data)]
+    if None in values:
+        i = values.index(None)
+        raise ValueError(
+            'Invalid BCD value 0x%02x at offset %i.' % (bytearray(data)[i], i))
+    return values
+
+
+def ints_to_bcd(values):
+    """Encode each value in [0,99] to 2-digit BCD.
+    Return a bytearray ready for a block write.
+    """
+    for x in values:
+        if not 0 <= x < 100:
+            raise ValueError('BCD value %r is out of range [0,99].' % (x,))
+    return bytearray([_BCD_ENCODE[x] for x in values])
+
+
+def _block_unsupported(e):
+    """Return True if the exception e means the bus adapter can't do
+    I2C block transfers at all (as opposed to a transient bus error)."""
+    if isinstance(e, (AttributeError, NotImplementedError)):
+        return True
+    return getattr(e, 'errno', None) in (errno.EOPNOTSUPP, errno.ENOSYS)
+
+
+def _decode_time(registers):
+    """Return tuple of year, month, date, day, hours, minutes, seconds
+    decoded from the raw values of registers 0x00-0x06."""
+    seconds, minutes, hours, day, date, month, year = registers[:7]
+    seconds &= ~OSCILLATOR_ON_MASK
+    month &= ~bv(CENTURY)
+    if True:
+        # This stuff is suspicious.
+        if hours == 0x64:
+            hours = 0x40
+        hours &= 0x3F
+    return tuple(
+        bcd_to_ints((year, month, date, day, hours, minutes, seconds)))
+
+
+def _signed_byte(b):
+    return b - 0x100 if b & 0x80 else b
+
+
+def _decode_temp(msb, lsb):
+    """Return degrees C from the temperature registers 0x11/0x12.
+    The value is a 10-bit two's complement number in 0.25 C steps."""
+    return (_signed_byte(msb) * 4 + (lsb >> 6)) * 0.25
+
+
+def _decode_alarm(registers, alarmNumber):
+    """Return tuple of alarmType, seconds, minutes, hours, daydate, i.e.
+    the arguments setAlarm() would need to program these registers.
+    registers is the register file starting at RTC_SECONDS."""
+    if alarmNumber == 1:
+        seconds = registers[ALM1_SECONDS]
+        minutes, hours, daydate = registers[ALM1_MINUTES:ALM1_DAYDATE + 1]
+        alarmType = (seconds >> A1M1) & 0x01
+    else:
+        seconds = 0
+        minutes, hours, daydate = registers[ALM2_MINUTES:ALM2_DAYDATE + 1]
+        alarmType = 0x80
+    alarmType |= ((minutes >> A1M2) & 0x01) << 1
+    alarmType |= ((hours >> A1M3) & 0x01) << 2
+    alarmType |= ((daydate >> A1M4) & 0x01) << 3
+    if daydate & bv(DYDT):
+        alarmType |= 0x10
+        daydate &= 0x0F
+    else:
+        daydate &= 0x3F
+    return (alarmType, bcd_to_int(seconds & 0x7F), bcd_to_int(minutes & 0x7F),
+            bcd_to_int(hours & 0x3F), bcd_to_int(daydate))
+
+
+def _encode_alarm(alarmType, seconds, minutes, hours, daydate):
+    """Return the raw alarm register values setAlarm() writes: four from
+    ALM1_SECONDS on for Alarm 1, three from ALM2_MINUTES on for Alarm 2
+    (alarmType & 0x80)."""
+    seconds = int_to_bcd(seconds)
+    minutes = int_to_bcd(minutes)
+    hours = int_to_bcd(hours)
+    daydate = int_to_bcd(daydate)
+
+    if (alarmType & 0x01):
+        seconds |= bv(A1M1)
+
+    if (alarmType & 0x02):
+        minutes |= bv(A1M2)
+
+    if (alarmType & 0x04):
+        hours |= bv(A1M3)
+
+    if (alarmType & 0x10):
+        daydate |= bv(DYDT)
+
+    if (alarmType & 0x08):
+        daydate |= bv(A1M4)
+
+    if alarmType & 0x80:
+        return [minutes, hours, daydate]
+    return [seconds, minutes, hours, daydate]
+
+
+# Settings of both alarms and of the INT/SQW pin, for SDL_DS3231.apply()
+# and read_alarm_config(). alarm1 and alarm2 are setAlarm() argument
+# tuples (alarmType, seconds, minutes, hours, daydate), the interrupts
+# booleans as for alarmInterrupt(), square_wave a SQWAVE_* value as for
+# squareWave(). apply() leaves the fields that are None alone.
+AlarmConfig = namedtuple('AlarmConfig', (
+    'alarm1', 'alarm2', 'alarm1_interrupt', 'alarm2_interrupt',
+    'square_wave'))
+AlarmConfig.__new__.__defaults__ = (None,) * len(AlarmConfig._fields)
+
+
+def _decode_alarm_config(registers):
+    """Return the AlarmConfig of registers, the register file starting at
+    RTC_SECONDS up to RTC_CONTROL at least."""
+    control = registers[RTC_CONTROL]
+    if control & bv(INTCN):
+        square_wave = SDL_DS3231.SQWAVE_NONE
+    else:
+        square_wave = (control >> RS1) & 0x03
+    return AlarmConfig(
+        _decode_alarm(registers, 1), _decode_alarm(registers, 2),
+        bool(control & bv(A1IE)), bool(control & bv(A2IE)), square_wave)
+
+
+def _changed_runs(old, new, gap=2):
+    """Yield (start, stop) of the runs of indices where new differs from
+    old. Runs at most gap unchanged bytes apart are merged: rewriting a
+    byte costs 9 bits on the wire, a transaction of its own about 30."""
+    run = None
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a == b:
+            continue
+        if run is not None and i - run[1] <= gap:
+            run[1] = i + 1
+            continue
+        if run is not None:
+            yield tuple(run)
+        run = [i, i + 1]
+    if run is not None:
+        yield tuple(run)
+
+
+class DS3231Snapshot(object):
+    """Immutable copy of the DS3231 register file 0x00-0x12, as returned
+    by SDL_DS3231.snapshot(). Fields are decoded on access."""
+
+    __slots__ = ('_registers',)
+
+    SIZE = RTC_TEMP_LSB + 1
+
+    def __init__(self, registers):
+        registers = tuple(bytearray(registers))
+        if len(registers) != self.SIZE:
+            raise ValueError(
+                'Expected %i register bytes, got %i.'
+                % (self.SIZE, len(registers)))
+        object.__setattr__(self, '_registers', registers)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('DS3231Snapshot is immutable')
+
+    def __eq__(self, other):
+        return (isinstance(other, DS3231Snapshot)
+                and self._registers == other._registers)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._registers)
+
+    def __repr__(self):
+        return 'DS3231Snapshot(%r)' % (self.registers,)
+
+    def __getitem__(self, register):
+        """Return the raw value of a register, e.g. snap[RTC_CONTROL]."""
+        return self._registers[register]
+
+    @property
+    def registers(self):
+        """The raw register bytes."""
+        return bytes(bytearray(self._registers))
+
+    @property
+    def time(self):
+        """Tuple of year, month, date, day, hours, minutes, seconds,
+        same as SDL_DS3231.read_all()."""
+        return _decode_time(self._registers)
+
+    def datetime(self, century=21, tzinfo=None):
+        """Return the datetime.datetime object."""
+        year, month, date, _, hours, minutes, seconds = self.time
+        year = 100 * (century - 1) + year
+        return datetime(
+            year, month, date, hours, minutes, seconds,
+            0, tzinfo=tzinfo)
+
+    @property
+    def alarm1(self):
+        """Tuple of alarmType, seconds, minutes, hours, daydate."""
+        return _decode_alarm(self._registers, 1)
+
+    @property
+    def alarm2(self):
+        """Tuple of alarmType, seconds, minutes, hours, daydate.
+        seconds is always 0 (Alarm 2 has no seconds register)."""
+        return _decode_alarm(self._registers, 2)
+
+    @property
+    def control(self):
+        return self[RTC_CONTROL]
+
+    @property
+    def status(self):
+        return self[RTC_STATUS]
+
+    @property
+    def oscillator_enabled(self):
+        """False if EOSC is set, i.e. the oscillator stops on battery."""
+        return not self.control & bv(EOSC)
+
+    @property
+    def square_wave(self):
+        """The squareWave() setting, SQWAVE_NONE when INTCN is set."""
+        control = self.control
+        if control & bv(INTCN):
+            return SDL_DS3231.SQWAVE_NONE
+        return (control >> RS1) & 0x03
+
+    @property
+    def alarm_config(self):
+        """The AlarmConfig (see SDL_DS3231.apply())."""
+        return _decode_alarm_config(self._registers)
+
+    def alarm_interrupt(self, alarmNumber):
+        """True if the alarm asserts the INT pin (see alarmInterrupt())."""
+        return bool(self.control & (bv(A1IE) << (alarmNumber - 1)))
+
+    def alarm_fired(self, alarmNumber):
+        """True if the alarm flag is set (see alarm())."""
+        return bool(self.status & (bv(A1F) << (alarmNumber - 1)))
+
+    @property
+    def osc_stopped(self):
+        """True if the OSF flag is set (see oscStopped())."""
+        return bool(self.status & bv(OSF))
+
+    @property
+    def century(self):
+        """True if the century bit is set, i.e. the year rolled over from
+        99 to 00."""
+        return bool(self[RTC_MONTH] & bv(CENTURY))
+
+    @property
+    def en32khz(self):
+        return bool(self.status & bv(EN32KHZ))
+
+    @property
+    def busy(self):
+        """True while a temperature conversion is in progress."""
+        return bool(self.status & bv(BSY))
+
+    @property
+    def aging(self):
+        """Signed aging offset, -128..127."""
+        return _signed_byte(self[RTC_AGING])
+
+    @property
+    def temperature(self):
+        """Temperature in degrees C, 0.25 C resolution."""
+        return _decode_temp(self[RTC_TEMP_MSB], self[RTC_TEMP_LSB])
 
 
 class SDL_DS3231():
@@ -163,31 +488,73 @@ class SDL_DS3231():
     ALARM_1 = 1                  #  constants for calling functions
     ALARM_2 = 2
 
+    AT24C32_SIZE = 4096          #  bytes
+    AT24C32_PAGE_SIZE = 32       #  a write must not cross a page boundary
+    AT24C32_WRITE_TIMEOUT = 0.05 #  seconds; tWR is 10 ms typ., 20 ms max
+    AT24C32_POLL_INTERVAL = 0.0005 #  seconds between ACK polls
+
+    AGING_PPM_PER_LSB = 0.1      #  typical at 25 C, see datasheet Figure 1
+    CONVERSION_TIMEOUT = 0.5     #  seconds; tCONV is 125 ms typ., 200 ms max
+
     ###########################
     # DS3231 Code
     # datasheet: https://datasheets.maximintegrated.com/en/ds/DS3231.pdf
     ###########################
-    def __init__(self, twi=1, addr=0x68, at24c32_addr=0x56):
-        self._bus = smbus.SMBus(twi)
+    def __init__(self, twi=1, addr=0x68, at24c32_addr=0x56, burst=True,
+            bus=None, cache_control=False, status_max_age=0.0):
+        """twi is the I2C bus number, shared with the other drivers through
+        SDL_DS3231_bus.get_bus(twi), unless bus is given: any object with
+        the smbus.SMBus methods, e.g. SDL_DS3231_sim.SimulatedBus.
+
+        With cache_control the control register is read once and then kept
+        in a shadow copy: only the host changes it (apart from CONV, which
+        isn't cached), so the read-modify-writes need no read, and writes
+        that change nothing are skipped. The status flags are set by the
+        hardware, so a status read is reused for status_max_age seconds
+        only: 0 reads it every time, float('inf') until
+        invalidate_shadow(), e.g. on an INT edge. Use these only if no
+        other program writes the RTC.
+        """
+        if bus is None:
+            bus = SDL_DS3231_bus.get_bus(twi)
+        self._bus = bus
         self._addr = addr
         self._at24c32_addr = at24c32_addr
+        # Held by the multi-transaction sequences so that threads (and
+        # other drivers on a SharedBus) can't interleave with them.
+        if hasattr(bus, 'device_lock'):
+            self._lock = bus.device_lock(addr)
+            self._at24c32_lock = bus.device_lock(at24c32_addr)
+        else:
+            self._lock = threading.RLock()
+            self._at24c32_lock = threading.RLock()
+        # Use single-transaction block reads and writes of the registers.
+        # Cleared automatically if the bus adapter can't do block transfers.
+        self._burst = burst
+        # Largest I2C block transfer the bus adapter can do (smbus: 32).
+        self._max_block = getattr(bus, 'max_block', 32)
+        # Use combined write/read transactions (bus.transfer()) for the
+        # AT24C32 random reads. Cleared automatically if the bus has none.
+        self._combined = True
+        # Waits between the AT24C32 ACK polls and of write_datetime(sync).
+        # A simulated bus brings its own sleep, which lets simulated time
+        # pass.
+        self._sleep = getattr(bus, 'sleep', time.sleep)
+        # Wait before the first ACK poll, learned from the last write cycle.
+        self._AT24C32_first_poll = 0.005
+        # Shadow copies of RTC_CONTROL (without CONV) and RTC_STATUS, None
+        # when unknown.
+        self.cache_control = cache_control
+        self.status_max_age = status_max_age
+        self._control = None
+        self._status = None
+        self._status_time = None
 
     def _write(self, register, data):
-        if False:
-            print(
-                "addr =0x%x register = 0x%x data = 0x%x %i " %
-                (self._addr, register, data, bcd_to_int(data)))
         self._bus.write_byte_data(self._addr, register, data)
 
     def _read(self, register_address):
-        data = self._bus.read_byte_data(self._addr, register_address)
-        if False:
-            print(
-                "addr = 0x%x register_address = 0x%x %i data = 0x%x %i "
-                % (
-                    self._addr, register_address, register_address,
-                    data, bcd_to_int(data)))
-        return data
+        return self._bus.read_byte_data(self._addr, register_address)
 
     def _incoherent_read_all(self):
         """Return tuple of year, month, date, day, hours, minutes, seconds.
@@ -203,25 +570,32 @@ class SDL_DS3231():
             self._REG_MONTH,
             self._REG_YEAR,
         )
-        seconds, minutes, hours, day, date, month, year = (
+        return _decode_time([
             self._read(register_address)
             for register_address in register_addresses
-        )
-        seconds &= ~OSCILLATOR_ON_MASK
-        if True:
-            # This stuff is suspicious.
-            if hours == 0x64:
-                hours = 0x40
-            hours &= 0x3F
-        return tuple(
-            bcd_to_int(t)
-            for t in (year, month, date, day, hours, minutes, seconds))
+        ])
+
+    def _burst_read_all(self):
+        """Return tuple of year, month, date, day, hours, minutes, seconds.
+        All seven registers are read in one block transfer. The DS3231
+        copies the time registers to a secondary buffer on the START of
+        a multi-byte read, so the result is always coherent."""
+        return _decode_time(self._bus.read_i2c_block_data(
+            self._addr, self._REG_SECONDS, self._REG_YEAR + 1))
 
     def read_all(self):
         """Return tuple of year, month, date, day, hours, minutes, seconds.
         """
-
-        """Read until one gets same result twice in a row.
+        if self._burst:
+            try:
+                return self._burst_read_all()
+            except (AttributeError, NotImplementedError, IOError) as e:
+                if not _block_unsupported(e):
+                    raise
+                # Adapter can't do block reads, use the slow path from now on.
+                self._burst = False
+
+        """Fallback: read until one gets same result twice in a row.
         Then one knows the time is coherent."""
 
         old = self._incoherent_read_all()
@@ -250,64 +624,238 @@ class SDL_DS3231():
             year, month, date, hours, minutes, seconds,
             0, tzinfo=tzinfo)
 
+    def snapshot(self):
+        """Return a DS3231Snapshot of registers 0x00-0x12 (time, alarms,
+        control, status, aging and temperature) read in one block transfer.
+        """
+        with self._lock:
+            snapshot = DS3231Snapshot(self._read_block(
+                RTC_SECONDS, DS3231Snapshot.SIZE))
+            self._update_shadow(snapshot.control, snapshot.status)
+            return snapshot
+
     def write_all(self, seconds=None, minutes=None, hours=None, day=None,
             date=None, month=None, year=None, save_as_24h=True):
         """Direct write un-none value.
         Range: seconds [0,59], minutes [0,59], hours [0,23],
                day [0,7], date [1-31], month [1-12], year [0-99].
+        All values are checked before anything is written. If every value
+        is given, registers 0x00-0x06 are written in one block transfer
+        so the clock can't roll over half way through.
         """
         if seconds is not None:
             if not 0 <= seconds < SECONDS_PER_MINUTE:
                 raise ValueError('Seconds is out of range [0,59].')
-            seconds_reg = int_to_bcd(seconds)
-            self._write(self._REG_SECONDS, seconds_reg)
 
         if minutes is not None:
             if not 0 <= minutes < MINUTES_PER_HOUR:
                 raise ValueError('Minutes is out of range [0,59].')
-            self._write(self._REG_MINUTES, int_to_bcd(minutes))
 
         if hours is not None:
             if not 0 <= hours < HOURS_PER_DAY:
                 raise ValueError('Hours is out of range [0,23].')
-            self._write(self._REG_HOURS, int_to_bcd(hours) ) # not  | 0x40 according to datasheet
 
         if year is not None:
             if not 0 <= year < YEARS_PER_CENTURY:
                 raise ValueError('Years is out of range [0,99].')
-            self._write(self._REG_YEAR, int_to_bcd(year))
 
         if month is not None:
             if not 1 <= month <= MONTHS_PER_YEAR:
                 raise ValueError('Month is out of range [1,12].')
-            self._write(self._REG_MONTH, int_to_bcd(month))
 
         if date is not None:
             # How about a more sophisticated check?
             if not 1 <= date <= MAX_DAYS_PER_MONTH:
                 raise ValueError('Date is out of range [1,31].')
-            self._write(self._REG_DATE, int_to_bcd(date))
 
         if day is not None:
             if not 1 <= day <= DAYS_PER_WEEK:
                 raise ValueError('Day is out of range [1,7].')
-            self._write(self._REG_DAY, int_to_bcd(day))
 
-    def write_datetime(self, dt):
+        # hours: not | 0x40 according to datasheet
+        values = (seconds, minutes, hours, day, date, month, year)
+        if self._burst and None not in values:
+            try:
+                self._bus.write_i2c_block_data(
+                    self._addr, self._REG_SECONDS, list(ints_to_bcd(values)))
+                return
+            except (AttributeError, NotImplementedError, IOError) as e:
+                if not _block_unsupported(e):
+                    raise
+                self._burst = False
+
+        for register, value in (
+                (self._REG_SECONDS, seconds),
+                (self._REG_MINUTES, minutes),
+                (self._REG_HOURS, hours),
+                (self._REG_YEAR, year),
+                (self._REG_MONTH, month),
+                (self._REG_DATE, date),
+                (self._REG_DAY, day)):
+            if value is not None:
+                self._write(register, int_to_bcd(value))
+
+    def write_datetime(self, dt, sync=False):
         """Write from a datetime.datetime object.
+        With sync=True, dt is taken to be the current system time: the
+        write is delayed until dt's next whole second has passed and that
+        second is written. Writing the seconds register restarts the RTC's
+        1 Hz countdown, so this leaves no sub-second phase error.
         """
+        if sync and dt.microsecond:
+            wait = 1000000 - dt.microsecond
+            dt += timedelta(microseconds=wait)
+            self._sleep(wait / 1000000.0)
         self.write_all(dt.second, dt.minute, dt.hour,
                 dt.isoweekday(), dt.day, dt.month, dt.year % 100)
 
-    def write_now(self):
-        """Equal to DS3231.write_datetime(datetime.datetime.now()).
+    def write_now(self, sync=False):
+        """Equal to DS3231.write_datetime(datetime.datetime.now(), sync).
+        """
+        self.write_datetime(datetime.now(), sync)
+
+    def _read_block(self, register, length):
+        """Return length registers from register on as a list, in one block
+        read if the adapter can do it."""
+        if self._burst:
+            try:
+                return self._bus.read_i2c_block_data(
+                    self._addr, register, length)
+            except (AttributeError, NotImplementedError, IOError) as e:
+                if not _block_unsupported(e):
+                    raise
+                self._burst = False
+        return [self._read(r) for r in range(register, register + length)]
+
+    def _write_block(self, register, data):
+        """Write data to the registers from register on, in one block write
+        if the adapter can do it."""
+        if self._burst:
+            try:
+                self._bus.write_i2c_block_data(self._addr, register, list(data))
+                return
+            except (AttributeError, NotImplementedError, IOError) as e:
+                if not _block_unsupported(e):
+                    raise
+                self._burst = False
+        for offset, value in enumerate(data):
+            self._write(register + offset, value)
+
+    def getTemp(self, convert=False, sleep=time.sleep):
+        """Return the temperature in degrees C, in 0.25 C steps.
+        The DS3231 converts every 64 s; with convert=True a conversion is
+        forced and waited for first (see convertTemp()).
+        """
+        if convert:
+            self.convertTemp(sleep)
+        return _decode_temp(*self._read_block(RTC_TEMP_MSB, 2))
+
+    def convertTemp(self, sleep=time.sleep):
+        """Start a temperature conversion, or join the one in progress, and
+        wait until it is done (CONV and BSY clear). The RTC is polled every
+        10 ms; sleep is the function used to wait between polls.
+        """
+        self._start_conversion()
+        deadline = _monotonic() + self.CONVERSION_TIMEOUT
+        while True:
+            sleep(0.01)
+            control, status = self._read_block(RTC_CONTROL, 2)
+            if not (control & bv(CONV) or status & bv(BSY)):
+                return
+            if _monotonic() > deadline:
+                raise IOError(errno.ETIMEDOUT,
+                              'DS3231 temperature conversion timed out.')
+
+    def read_aging(self):
+        """Return the aging offset, a signed value in [-128,127].
+        """
+        return _signed_byte(self._read(RTC_AGING))
+
+    def write_aging(self, offset, convert=True):
+        """Write the aging offset. Each step slows the oscillator by about
+        AGING_PPM_PER_LSB ppm at 25 C. The new value takes effect at the next
+        temperature conversion, which convert=True starts right away.
         """
-        self.write_datetime(datetime.now())
+        if not -128 <= offset <= 127:
+            raise ValueError('Aging offset is out of range [-128,127].')
+        with self._lock:
+            self._write(RTC_AGING, offset & 0xFF)
+            if convert:
+                self._start_conversion()
+
+    def _start_conversion(self):
+        """Set CONV to start a temperature conversion (and oscillator
+        adjustment), unless one is already running. Return True if one was
+        started."""
+        with self._lock:
+            if self._read_status(fresh=True) & bv(BSY):
+                return False
+            self._write_control(self._read_control() | bv(CONV))
+            return True
 
-    def getTemp(self):
-        byte_tmsb = self._bus.read_byte_data(self._addr,0x11)
-        byte_tlsb = bin(self._bus.read_byte_data(self._addr,0x12))[2:].zfill(8)
-        return byte_tmsb+int(byte_tlsb[0])*2**(-1)+int(byte_tlsb[1])*2**(-2)
+    ###########################
+    # Control and status shadow registers
+    ###########################
+    def invalidate_shadow(self, control=True):
+        """Forget the shadow copies of the control and status registers,
+        e.g. after another program or a power loss changed them. With
+        control=False only the status copy is dropped, e.g. on an INT edge.
+        """
+        with self._lock:
+            if control:
+                self._control = None
+            self._status = None
+
+    def refresh_shadow(self):
+        """Read the control and status registers into the shadow copies in
+        one transfer. Return (control, status)."""
+        with self._lock:
+            control, status = self._read_block(RTC_CONTROL, 2)
+            self._update_shadow(control, status)
+            return control, status
+
+    def _update_shadow(self, control, status):
+        if self.cache_control:
+            self._control = control & ~bv(CONV)
+        self._status = status
+        self._status_time = _monotonic()
+
+    def _read_control(self):
+        if self._control is not None:
+            return self._control
+        control = self._read(RTC_CONTROL)
+        if self.cache_control:
+            self._control = control & ~bv(CONV)
+        return control
+
+    def _write_control(self, control):
+        if control == self._control:
+            return
+        self._control = None
+        self._write(RTC_CONTROL, control)
+        if self.cache_control:
+            # CONV clears itself when the conversion is done.
+            self._control = control & ~bv(CONV)
+
+    def _read_status(self, fresh=False):
+        if (not fresh and self._status is not None and
+                _monotonic() - self._status_time < self.status_max_age):
+            return self._status
+        self._status = None
+        status = self._read(RTC_STATUS)
+        self._status = status
+        self._status_time = _monotonic()
+        return status
+
+    def _clear_status(self, status, flags):
+        """Clear the flags (a mask) of status, the value last read. The
+        other flags are written as 1, which leaves them alone, so one that
+        the hardware set meanwhile isn't lost."""
+        self._status = None
+        self._write(RTC_STATUS, (status | bv(OSF) | bv(A2F) | bv(A1F))
+                    & ~flags & 0xFF)
+        self._status = status & ~flags
+        self._status_time = _monotonic()
 
     ###########################
     # DS3231 ALARM Code
@@ -322,81 +870,128 @@ class SDL_DS3231():
     #  * ignored, recommend using zero. (Alarm 2 has no seconds register.)    *
     #  *----------------------------------------------------------------------*
     def setAlarm(self, alarmType, seconds, minutes, hours, daydate):
-        addr = ALM1_SECONDS
-        seconds = int_to_bcd(seconds)
-        minutes = int_to_bcd(minutes)
-        hours = int_to_bcd(hours)
-        daydate = int_to_bcd(daydate)
-
-        if (alarmType & 0x01):
-            seconds |= bv(A1M1)
-
-        if (alarmType & 0x02):
-            minutes |= bv(A1M2)
-
-        if (alarmType & 0x04):
-            hours |= bv(A1M3)
-
-        if (alarmType & 0x10):
-            daydate |= bv(DYDT)
-
-        if (alarmType & 0x08):
-            daydate |= bv(A1M4)
-
         if ( not (alarmType & 0x80) ):
             addr = ALM1_SECONDS
-            self._write(addr, seconds)
-            addr += 1
         else:
             addr = ALM2_MINUTES
 
-        self._write(addr, minutes)
-        addr += 1
-        self._write(addr, hours)
-        addr += 1
-        self._write(addr, daydate)
+        with self._lock:
+            self._write_block(
+                addr, _encode_alarm(alarmType, seconds, minutes, hours,
+                                    daydate))
+
+    #  *----------------------------------------------------------------------*
+    #  * Program both alarms, their interrupt enables and the INT/SQW pin    *
+    #  * from an AlarmConfig. Registers 0x07-0x0E are read in one transfer   *
+    #  * and only the ones that change are written, in block writes.         *
+    #  * Returns the list of (first register, count) written.               *
+    #  *----------------------------------------------------------------------*
+    def apply(self, config):
+        control_index = RTC_CONTROL - ALM1_SECONDS
+        with self._lock:
+            current = self._read_block(ALM1_SECONDS, control_index + 1)
+            desired = list(current)
+            if config.alarm1 is not None:
+                alarmType = config.alarm1[0] & ~0x80
+                desired[0:4] = _encode_alarm(alarmType, *config.alarm1[1:])
+            if config.alarm2 is not None:
+                alarmType = config.alarm2[0] | 0x80
+                desired[4:7] = _encode_alarm(alarmType, *config.alarm2[1:])
+            # CONV clears itself; writing 0 doesn't stop a conversion.
+            current[control_index] &= ~bv(CONV)
+            control = current[control_index]
+            for alarmNumber, enabled in ((1, config.alarm1_interrupt),
+                                         (2, config.alarm2_interrupt)):
+                if enabled is not None:
+                    mask = bv(A1IE) << (alarmNumber - 1)
+                    control = control | mask if enabled else control & ~mask
+            if config.square_wave is not None:
+                if config.square_wave >= self.SQWAVE_NONE:
+                    control |= bv(INTCN)
+                else:
+                    control &= ~(bv(INTCN) | bv(RS2) | bv(RS1))
+                    control |= config.square_wave << RS1
+            desired[control_index] = control
+            written = []
+            # Without block writes every byte is a transaction of its own.
+            gap = 2 if self._burst else 0
+            for start, stop in _changed_runs(current, desired, gap):
+                if stop > control_index:
+                    self._control = None
+                self._write_block(ALM1_SECONDS + start, desired[start:stop])
+                written.append((ALM1_SECONDS + start, stop - start))
+            if self.cache_control:
+                self._control = control
+            return written
+
+    #  *----------------------------------------------------------------------*
+    #  * Returns the AlarmConfig the RTC holds, read in one transfer.         *
+    #  *----------------------------------------------------------------------*
+    def read_alarm_config(self):
+        registers = [0] * ALM1_SECONDS + self._read_block(
+            ALM1_SECONDS, RTC_CONTROL - ALM1_SECONDS + 1)
+        return _decode_alarm_config(registers)
 
     #  *----------------------------------------------------------------------*
     #  * Enable or disable an alarm "interrupt" which asserts the INT pin     *
     #  * on the RTC.                                                          *
     #  *----------------------------------------------------------------------*
     def alarmInterrupt(self, alarmNumber, interruptEnabled):
-        controlReg = self._read(RTC_CONTROL)
-        mask = bv(A1IE) << (alarmNumber - 1)
-        if (interruptEnabled):
-            controlReg |= mask
-        else:
-            controlReg &= ~mask
+        with self._lock:
+            controlReg = self._read_control()
+            mask = bv(A1IE) << (alarmNumber - 1)
+            if (interruptEnabled):
+                controlReg |= mask
+            else:
+                controlReg &= ~mask
 
-        self._write(RTC_CONTROL, controlReg)
+            self._write_control(controlReg)
 
     #  *----------------------------------------------------------------------*
     #  * Returns true or false depending on whether the given alarm has been  *
     #  * triggered, and resets the alarm flag bit.                            *
     #  *----------------------------------------------------------------------*
     def alarm(self, alarmNumber):
-        statusReg = self._read(RTC_STATUS)
-        mask = bv(A1F) << (alarmNumber - 1)
+        with self._lock:
+            statusReg = self._read_status()
+            mask = bv(A1F) << (alarmNumber - 1)
 
-        if (statusReg & mask):
-            statusReg &= ~mask
-            self._write(RTC_STATUS, statusReg)
-            return True
-        else:
-            return False
+            if (statusReg & mask):
+                self._clear_status(statusReg, mask)
+                return True
+            else:
+                return False
+
+    #  *----------------------------------------------------------------------*
+    #  * Same as alarm() for several alarms with a single status register    *
+    #  * read and at most one write. Returns the list of the given alarms    *
+    #  * that have triggered and resets only their flags.                    *
+    #  *----------------------------------------------------------------------*
+    def alarms(self, alarmNumbers=(ALARM_1, ALARM_2)):
+        with self._lock:
+            statusReg = self._read_status()
+            fired = [alarmNumber for alarmNumber in alarmNumbers
+                     if statusReg & (bv(A1F) << (alarmNumber - 1))]
+            if fired:
+                mask = 0
+                for alarmNumber in fired:
+                    mask |= bv(A1F) << (alarmNumber - 1)
+                self._clear_status(statusReg, mask)
+            return fired
 
    #  *----------------------------------------------------------------------*
    #  * Enable or disable the square wave output.                            *
    #  * Use a value from the SQWAVE_FREQS_t enumeration for the parameter.   *
    #  *----------------------------------------------------------------------*
     def squareWave(self, freq):
-        controlReg = self._read(RTC_CONTROL)
-        if (freq >= self.SQWAVE_NONE):
-            controlReg |= bv(INTCN)
-        else:
-            controlReg = (controlReg & 0x03) | (freq << RS1)
+        with self._lock:
+            controlReg = self._read_control()
+            if (freq >= self.SQWAVE_NONE):
+                controlReg |= bv(INTCN)
+            else:
+                controlReg = (controlReg & 0x03) | (freq << RS1)
 
-        self._write(RTC_CONTROL, controlReg)
+            self._write_control(controlReg)
 
     #  *----------------------------------------------------------------------*
     #  * Returns the value of the oscillator stop flag (OSF) bit in the       *
@@ -405,12 +1000,13 @@ class SDL_DS3231():
     #  * Optionally clears the OSF bit depending on the argument passed.      *
     #  *----------------------------------------------------------------------*
     def oscStopped(self, clearOSF):
-        s = self._read(RTC_STATUS)  # read the status register
-        ret = s & bv(OSF)           # isolate the osc stop flag to return to caller
-        if (ret and clearOSF):       # clear OSF if it's set and the caller wants to clear it
-            self._write(RTC_STATUS, s & ~bv(OSF))
+        with self._lock:
+            s = self._read_status()     # read the status register
+            ret = s & bv(OSF)           # isolate the osc stop flag to return to caller
+            if (ret and clearOSF):       # clear OSF if it's set and the caller wants to clear it
+                self._clear_status(s, bv(OSF))
 
-        return ret
+            return ret
 
     ###########################
     # AT24C32 Code
@@ -421,20 +1017,301 @@ class SDL_DS3231():
         a1, a0 = divmod(address, 1<<8)
         self._bus.write_i2c_block_data(self._at24c32_addr,a1,[a0])
 
+    def _AT24C32_random_read(self, address, length):
+        """Return length bytes from address on read in one combined
+        transaction (address write, repeated START, sequential read), or
+        None if the bus can't do that."""
+        if not self._combined:
+            return None
+        try:
+            return self._bus.transfer(
+                self._at24c32_addr, bytearray(divmod(address, 1<<8)), length)
+        except (AttributeError, NotImplementedError, IOError) as e:
+            if not _block_unsupported(e):
+                raise
+            self._combined = False
+            return None
+
     def read_AT24C32_byte(self, address):
-        if False:
-            print(
-                "i2c_address =0x%x eepromaddress = 0x%x  " %
-                (self._at24c32_addr, address))
+        with self._at24c32_lock:
+            data = self._AT24C32_random_read(address, 1)
+            if data is not None:
+                return data[0]
+            self.set_current_AT24C32_address(address)
+            return self._bus.read_byte(self._at24c32_addr)
+
+    def readinto_AT24C32(self, address, buffer):
+        """Fill buffer (a bytearray, memoryview or other writable buffer)
+        from the AT24C32 starting at address. Return the number of bytes
+        read.
+        On a bus with combined transactions (bus.transfer()) this is a
+        single transaction. Otherwise the address is set once and the
+        bytes are streamed with sequential reads, one transaction per byte
+        instead of two.
+        """
+        view = memoryview(buffer)
+        if view.itemsize != 1:
+            view = view.cast('B')
+        length = len(view)
+        if not 0 <= address <= self.AT24C32_SIZE - length:
+            raise ValueError('AT24C32 read is out of range [0,4095].')
+        if length:
+            read_byte = self._bus.read_byte
+            at24c32_addr = self._at24c32_addr
+            with self._at24c32_lock:
+                data = self._AT24C32_random_read(address, length)
+                if data is not None:
+                    view[:] = data
+                    return length
+                self.set_current_AT24C32_address(address)
+                for i in range(length):
+                    view[i] = read_byte(at24c32_addr)
+        return length
+
+    def read_AT24C32_block(self, address, length):
+        """Return length bytes read from the AT24C32 starting at address.
+        """
+        buffer = bytearray(length)
+        self.readinto_AT24C32(address, buffer)
+        return bytes(buffer)
 
-        self.set_current_AT24C32_address(address)
-        return self._bus.read_byte(self._at24c32_addr)
+    def read_AT24C32_all(self):
+        """Return the whole 4 KB contents of the AT24C32.
+        """
+        return self.read_AT24C32_block(0, self.AT24C32_SIZE)
 
     def write_AT24C32_byte(self, address, value):
-        if False:
-            print(
-                "i2c_address =0x%x eepromaddress = 0x%x value = 0x%x %i " %
-                (self._at24c32_addr, address, value, value))
         a1, a0 = divmod(address, 1<<8)
-        self._bus.write_i2c_block_data(self._at24c32_addr,a1,[a0, value])
-        time.sleep(0.20)
+        with self._at24c32_lock:
+            self._bus.write_i2c_block_data(self._at24c32_addr,a1,[a0, value])
+            self._AT24C32_wait_ready()
+
+    def _AT24C32_wait_ready(self):
+        """Wait for the internal write cycle to finish by ACK polling.
+        The AT24C32 doesn't acknowledge its address until the cycle is done.
+        The first poll comes after about as long as the last cycle took,
+        the others AT24C32_POLL_INTERVAL apart, so a cycle costs about two
+        polls. The bus is free for the other devices in between.
+        """
+        deadline = _monotonic() + self.AT24C32_WRITE_TIMEOUT
+        interval = self.AT24C32_POLL_INTERVAL
+        delay = self._AT24C32_first_poll
+        waited = 0.0
+        while True:
+            self._sleep(delay)
+            waited += delay
+            if self._AT24C32_ready(_monotonic() > deadline):
+                break
+            delay = interval
+        # Aim one interval early: the first poll then lands just before
+        # the end of the cycle, and the estimate follows shorter cycles.
+        self._AT24C32_first_poll = max(interval, waited - interval)
+
+    def _AT24C32_ready(self, last=False):
+        """Poll the AT24C32 once. Return True if it acknowledged, i.e. no
+        write cycle is in progress. With last the IOError is raised instead.
+        """
+        try:
+            self._bus.read_byte(self._at24c32_addr)
+        except IOError:
+            if last:
+                raise
+            return False
+        return True
+
+    def _AT24C32_pages(self, address, data):
+        """Split a write of data at address into (address, chunk) pairs that
+        don't cross a page boundary or exceed the bus block size."""
+        data = bytearray(data)
+        if not 0 <= address <= self.AT24C32_SIZE - len(data):
+            raise ValueError('AT24C32 write is out of range [0,4095].')
+        # One byte of every block goes to the low address byte.
+        chunk = self._max_block - 1
+        offset = 0
+        while offset < len(data):
+            n = min(self.AT24C32_PAGE_SIZE - address % self.AT24C32_PAGE_SIZE,
+                    chunk, len(data) - offset)
+            yield address, data[offset:offset + n]
+            address += n
+            offset += n
+
+    def _AT24C32_write_page(self, address, data):
+        """Start the write of one page chunk. Doesn't wait for the write
+        cycle."""
+        a1, a0 = divmod(address, 1<<8)
+        self._bus.write_i2c_block_data(
+            self._at24c32_addr, a1, [a0] + list(data))
+
+    def write_AT24C32_block(self, address, data):
+        """Write data (bytes, bytearray or list of ints) starting at address.
+        The data is split at the 32 byte page boundaries (and at the bus
+        adapter's block size limit) and each write is ACK polled.
+        """
+        with self._at24c32_lock:
+            for page_address, chunk in self._AT24C32_pages(address, data):
+                self._AT24C32_write_page(page_address, chunk)
+                self._AT24C32_wait_ready()
+
+
+class AT24C32Buffer(object):
+    """Write-back cached, bytearray-like view of the AT24C32 EEPROM.
+
+    Supports indexing and slicing, seek()/tell()/read()/readinto()/write()
+    and getbuffer(), a read-only memoryview. On Python 3.12 and later
+    memoryview(buffer) works too (__buffer__). Pages are read
+    from the chip on first use. Writes only go to the RAM copy; bytes that
+    already hold the written value are not marked dirty. flush() writes
+    back the changed span of each dirty 32 byte page.
+    """
+
+    def __init__(self, rtc):
+        self._rtc = rtc
+        self._size = rtc.AT24C32_SIZE
+        self._page = rtc.AT24C32_PAGE_SIZE
+        self._data = bytearray(self._size)
+        self._loaded = bytearray(self._size // self._page)
+        self._dirty = {}   # page -> [first, last] dirty address
+        self._pos = 0
+
+    def _load(self, start, stop):
+        """Make sure addresses [start, stop) are in the cache. Runs of
+        missing pages are read with one sequential read each."""
+        page = self._page
+        p = start // page
+        last = (stop + page - 1) // page
+        while p < last:
+            if self._loaded[p]:
+                p += 1
+                continue
+            q = p
+            while q < last and not self._loaded[q]:
+                q += 1
+            self._rtc.readinto_AT24C32(
+                p * page, memoryview(self._data)[p * page:q * page])
+            # Only now: after a failed read the pages are read again.
+            self._loaded[p:q] = b'\x01' * (q - p)
+            p = q
+
+    def _index(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('AT24C32Buffer index out of range')
+        return i
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._size)
+            if start < stop:
+                self._load(start, stop)
+            elif step < 0 and stop < start:
+                self._load(stop + 1, start + 1)
+            return bytes(self._data[key])
+        i = self._index(key)
+        self._load(i, i + 1)
+        return self._data[i]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            indices = range(*key.indices(self._size))
+            value = bytearray(value)
+            if len(value) != len(indices):
+                raise ValueError('AT24C32Buffer can not be resized.')
+        else:
+            indices = [self._index(key)]
+            value = bytearray([value])
+        if not len(indices):
+            return
+        self._load(min(indices), max(indices) + 1)
+        data = self._data
+        page = self._page
+        dirty = self._dirty
+        for i, v in zip(indices, value):
+            if data[i] != v:
+                data[i] = v
+                span = dirty.get(i // page)
+                if span is None:
+                    dirty[i // page] = [i, i]
+                elif i < span[0]:
+                    span[0] = i
+                elif i > span[1]:
+                    span[1] = i
+
+    def __iter__(self):
+        self._load(0, self._size)
+        return iter(self._data)
+
+    def getbuffer(self):
+        """Return a read-only memoryview of the whole (fully loaded) cache."""
+        self._load(0, self._size)
+        return memoryview(self._data).toreadonly()
+
+    def __buffer__(self, flags):
+        # The Python level buffer protocol, Python 3.12 and later only.
+        return self.getbuffer()
+
+    @property
+    def dirty_pages(self):
+        """Sorted list of the pages flush() would write."""
+        return sorted(self._dirty)
+
+    def flush(self):
+        """Write the dirty span of every dirty page back to the chip."""
+        for p in sorted(self._dirty):
+            first, last = self._dirty[p]
+            self._rtc.write_AT24C32_block(first, self._data[first:last + 1])
+            del self._dirty[p]
+
+    def invalidate(self):
+        """Drop clean pages from the cache so they are re-read on next use.
+        """
+        for p in range(len(self._loaded)):
+            if p not in self._dirty:
+                self._loaded[p] = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self._size
+        if offset < 0:
+            raise ValueError('negative seek position %i' % offset)
+        self._pos = offset
+        return offset
+
+    def tell(self):
+        return self._pos
+
+    def read(self, size=-1):
+        start = min(self._pos, self._size)
+        if size is None or size < 0:
+            stop = self._size
+        else:
+            stop = min(start + size, self._size)
+        self._pos = stop
+        return self[start:stop]
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def write(self, b):
+        b = bytearray(b)
+        if self._pos + len(b) > self._size:
+            raise ValueError('AT24C32 write is out of range [0,4095].')
+        self[self._pos:self._pos + len(b)] = b
+        self._pos += len(b)
+        return len(b)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# SDL_DS3231_async.py
+# asyncio interface to the DS3231 and its AT24C32 EEPROM.
+#
+# Every bus transfer runs on one dedicated executor thread, so the I2C
+# traffic of all coroutines is serialized and the event loop never waits
+# for the bus. EEPROM writes release that thread during the chip's write
+# cycles, which lets clock reads go through while a page is being written.
+# Needs Python 3.7 or later.
+
+import asyncio
+import concurrent.futures
+import functools
+
+import SDL_DS3231
+
+# Interval between ACK polls of an EEPROM write cycle (typically 5-10 ms).
+AT24C32_POLL_INTERVAL = 0.002
+
+# Methods of SDL_DS3231 that AsyncDS3231 exposes as coroutines.
+_METHODS = (
+    'read_all', 'read_str', 'read_datetime', 'snapshot',
+    'write_all', 'write_datetime', 'write_now', 'getTemp',
+    'setAlarm', 'alarmInterrupt', 'alarm', 'alarms', 'squareWave',
+    'oscStopped', 'refresh_shadow',
+)
+
+
+def _coroutine_method(name):
+    method = getattr(SDL_DS3231.SDL_DS3231, name)
+
+    @functools.wraps(method)
+    async def call(self, *args, **kwargs):
+        return await self._run(getattr(self.rtc, name), *args, **kwargs)
+    return call
+
+
+class AsyncDS3231(object):
+    """Coroutine versions of the SDL_DS3231 methods.
+
+    Either wraps an existing SDL_DS3231 (rtc) or creates one from the
+    SDL_DS3231 constructor arguments. The wrapped driver must only be used
+    through this object from then on.
+
+        async with AsyncDS3231(twi=1) as rtc:
+            now = await rtc.read_datetime()
+            await rtc.eeprom.write(0x100, b'hello')
+    """
+
+    def __init__(self, rtc=None, **kwargs):
+        self.rtc = rtc if rtc is not None else SDL_DS3231.SDL_DS3231(**kwargs)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='DS3231')
+        self.eeprom = AsyncAT24C32(self)
+
+    async def _run(self, function, *args, **kwargs):
+        """Run function on the bus thread and return its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(function, *args, **kwargs))
+
+    def alarm_events(self, source, alarmNumbers=(
+            SDL_DS3231.SDL_DS3231.ALARM_1, SDL_DS3231.SDL_DS3231.ALARM_2)):
+        """Return an async iterator of the alarm numbers in alarmNumbers as
+        they fire. source is a SDL_DS3231_dispatcher edge source."""
+        return AlarmEvents(self, source, alarmNumbers)
+
+    async def aclose(self):
+        """Wait for the pending bus transfers and stop the bus thread."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+for _name in _METHODS:
+    setattr(AsyncDS3231, _name, _coroutine_method(_name))
+del _name
+
+
+class AsyncAT24C32(object):
+    """The AT24C32 of an AsyncDS3231, available as its eeprom attribute.
+
+    Writes are split at the page boundaries. After each page the bus thread
+    is released and the write cycle is ACK polled from the event loop, every
+    AT24C32_POLL_INTERVAL seconds. EEPROM operations run one at a time.
+    """
+
+    def __init__(self, owner):
+        self._owner = owner
+        self._rtc = owner.rtc
+        self._lock = None
+
+    def _get_lock(self):
+        # Created on first use so that it belongs to the running loop.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def read(self, address, length):
+        """Return length bytes starting at address, as a bytearray."""
+        async with self._get_lock():
+            return await self._owner._run(
+                self._rtc.read_AT24C32_block, address, length)
+
+    async def read_byte(self, address):
+        async with self._get_lock():
+            return await self._owner._run(self._rtc.read_AT24C32_byte, address)
+
+    async def write(self, address, data):
+        """Write data (bytes, bytearray or list of ints) starting at
+        address."""
+        rtc = self._rtc
+        loop = asyncio.get_running_loop()
+        async with self._get_lock():
+            for page_address, chunk in rtc._AT24C32_pages(address, data):
+                await self._owner._run(
+                    rtc._AT24C32_write_page, page_address, chunk)
+                deadline = loop.time() + rtc.AT24C32_WRITE_TIMEOUT
+                while True:
+                    await asyncio.sleep(AT24C32_POLL_INTERVAL)
+                    last = loop.time() > deadline
+                    if await self._owner._run(rtc._AT24C32_ready, last):
+                        break
+
+    async def write_byte(self, address, value):
+        await self.write(address, [value])
+
+
+class AlarmEvents(object):
+    """Async iterator returned by AsyncDS3231.alarm_events().
+
+    Waits for an edge of source on the loop's default executor, so the bus
+    thread stays free, then resets the fired alarm flags on the bus thread.
+    The flags are checked once at the start since INT may already be
+    asserted. aclose() ends the iteration.
+    """
+
+    def __init__(self, owner, source, alarmNumbers):
+        self._owner = owner
+        self._source = source
+        self._alarms = tuple(alarmNumbers)
+        self._pending = []
+        self._started = False
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        while not self._pending:
+            if self._closed:
+                raise StopAsyncIteration
+            if self._started:
+                try:
+                    edge = await loop.run_in_executor(None, self._source.wait)
+                except asyncio.CancelledError:
+                    # Don't leave the executor thread blocked in wait().
+                    self._source.wake()
+                    raise
+                if not edge or self._closed:
+                    continue
+            self._started = True
+            self._pending.extend(await self._owner._run(self._check))
+        return self._pending.pop(0)
+
+    def _check(self):
+        # On the bus thread, like every other use of the driver.
+        rtc = self._owner.rtc
+        rtc.invalidate_shadow(control=False)
+        return rtc.alarms(self._alarms)
+
+    async def aclose(self):
+        self._closed = True
+        self._source.wake()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_bus.py
+# Shared, thread-safe I2C bus handles.
+#
+# Every device on a bus should use the same SharedBus: get_bus(n) opens
+# smbus.SMBus(n) (or SDL_DS3231_i2cdev.I2CDevBus(n)) once and hands out
+# the same object afterwards. Each
+# transaction holds the bus lock, so two threads can't interleave the
+# slave address selection and transfer of python-smbus. Sequences that
+# must not be interleaved with other users of the same device (register
+# read-modify-write, EEPROM address set and read) hold that device's lock,
+# which leaves the bus free for the other devices in between.
+
+from __future__ import print_function
+
+import threading
+
+try:
+    import smbus
+except ImportError:
+    # Only needed by get_bus().
+    smbus = None
+
+# Methods of smbus.SMBus that SharedBus passes through under its lock,
+# and transfer() of the buses that can do combined write/read
+# transactions (SDL_DS3231_i2cdev.I2CDevBus, SDL_DS3231_sim.SimulatedBus).
+_SMBUS_METHODS = (
+    'write_quick', 'read_byte', 'write_byte', 'read_byte_data',
+    'write_byte_data', 'read_word_data', 'write_word_data',
+    'process_call', 'read_block_data', 'write_block_data',
+    'block_process_call', 'read_i2c_block_data', 'write_i2c_block_data',
+    'transfer',
+)
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def get_bus(twi, backend=None):
+    """Return the SharedBus of I2C bus number twi, opening it on first
+    use. backend is 'smbus' (smbus.SMBus) or 'i2cdev'
+    (SDL_DS3231_i2cdev.I2CDevBus); by default smbus if it is installed.
+    Once a bus is open, backend is ignored."""
+    with _buses_lock:
+        bus = _buses.get(twi)
+        if bus is None:
+            if backend is None:
+                backend = 'smbus' if smbus is not None else 'i2cdev'
+            if backend == 'smbus':
+                if smbus is None:
+                    raise ImportError('The smbus module is required for '
+                                      "the 'smbus' backend.")
+                raw = smbus.SMBus(twi)
+            elif backend == 'i2cdev':
+                import SDL_DS3231_i2cdev
+                raw = SDL_DS3231_i2cdev.I2CDevBus(twi)
+            else:
+                raise ValueError('Unknown I2C backend %r.' % (backend,))
+            bus = _buses[twi] = SharedBus(raw)
+        return bus
+
+
+def _locked_method(name):
+    def call(self, *args):
+        with self.lock:
+            return getattr(self._bus, name)(*args)
+    call.__name__ = name
+    return call
+
+
+class SharedBus(object):
+    """Wraps an smbus.SMBus-like bus for use from several threads and by
+    several drivers. The smbus methods are available unchanged."""
+
+    def __init__(self, bus):
+        self._bus = bus
+        self.lock = threading.RLock()
+        self._device_locks = {}
+        # Only if the wrapped bus has it, so that probing for it fails
+        # right here.
+        if hasattr(bus, 'transfer'):
+            self.transfer = _locked_method('transfer').__get__(self)
+
+    def __getattr__(self, name):
+        # Anything else the wrapped bus has (close, pec, ...).
+        return getattr(self._bus, name)
+
+    def device_lock(self, addr):
+        """Return the lock serializing multi-transaction sequences on the
+        device at addr. It is reentrant."""
+        with self.lock:
+            lock = self._device_locks.get(addr)
+            if lock is None:
+                lock = self._device_locks[addr] = threading.RLock()
+            return lock
+
+    def modify_byte_data(self, addr, cmd, clear=0, set=0):
+        """Atomically clear and then set bits of register cmd of the device
+        at addr. The register is only written if it changes. Return the old
+        value."""
+        with self.device_lock(addr):
+            old = self.read_byte_data(addr, cmd)
+            new = (old & ~clear | set) & 0xFF
+            if new != old:
+                self.write_byte_data(addr, cmd, new)
+            return old
+
+    def batch(self, addr=None):
+        """Return a Batch of operations to run under one lock acquisition.
+        """
+        return Batch(self, addr)
+
+
+for _name in _SMBUS_METHODS:
+    if _name != 'transfer':
+        setattr(SharedBus, _name, _locked_method(_name))
+del _name
+
+
+class Batch(object):
+    """Queued bus operations, run back to back by run() while holding the
+    device lock of addr (if given) and the bus lock. Other threads'
+    transactions can't get in between.
+
+        batch = bus.batch(0x68)
+        batch.read_byte_data(0x68, 0x0E)
+        batch.write_byte_data(0x68, 0x0B, 0x30)
+        control, _ = batch.run()
+
+    The queueing methods are those of smbus.SMBus plus modify_byte_data().
+    run() returns their results in order.
+    """
+
+    def __init__(self, bus, addr=None):
+        self._bus = bus
+        self._addr = addr
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def __getattr__(self, name):
+        if name not in _SMBUS_METHODS:
+            raise AttributeError(name)
+
+        def queue(*args):
+            self._ops.append((getattr(self._bus._bus, name), args))
+        return queue
+
+    def modify_byte_data(self, addr, cmd, clear=0, set=0):
+        raw = self._bus._bus
+
+        def modify():
+            old = raw.read_byte_data(addr, cmd)
+            new = (old & ~clear | set) & 0xFF
+            if new != old:
+                raw.write_byte_data(addr, cmd, new)
+            return old
+        self._ops.append((modify, ()))
+
+    def run(self):
+        """Run and clear the queued operations. Return their results."""
+        ops, self._ops = self._ops, []
+        bus = self._bus
+        if self._addr is None:
+            with bus.lock:
+                return [function(*args) for function, args in ops]
+        with bus.device_lock(self._addr):
+            with bus.lock:
+                return [function(*args) for function, args in ops]
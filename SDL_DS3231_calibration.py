@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_calibration.py
+# Aging offset calibration of the DS3231 oscillator.
+#
+# The rate of the RTC is measured against a reference: the host's
+# monotonic clock, timestamped SQW edges, or a stream of reference
+# timestamps of the SQW edges. The aging register is then moved by
+# drift / AGING_PPM_PER_LSB steps (positive values slow the clock), and
+# every calibration is appended to a history log on the AT24C32.
+
+from __future__ import print_function
+
+from collections import namedtuple
+from datetime import datetime
+import errno
+import struct
+import time
+
+import SDL_DS3231
+import SDL_DS3231_discipline
+import SDL_DS3231_eventlog
+
+AGING_MIN = -128
+AGING_MAX = 127
+
+# EEPROM region of the default CalibrationHistory: the last 512 bytes,
+# which a default EventLog leaves free.
+HISTORY_START = SDL_DS3231_eventlog.DEFAULT_END
+HISTORY_SIZE = SDL_DS3231.SDL_DS3231.AT24C32_SIZE - HISTORY_START
+
+Calibration = namedtuple('Calibration', (
+    'time',         # seconds since the epoch
+    'drift_ppm',    # measured rate error, positive when the RTC ran fast
+    'old_aging', 'new_aging',
+    'duration',     # length of the measurement in seconds
+    'temperature',  # degrees C
+))
+
+# time, drift_ppm, old_aging, new_aging, duration, temperature * 4
+_RECORD = struct.Struct('<IfbbIh')
+
+
+def optimal_aging(current, drift_ppm,
+        ppm_per_lsb=SDL_DS3231.SDL_DS3231.AGING_PPM_PER_LSB):
+    """Return the aging offset that cancels drift_ppm, measured with the
+    offset current, clamped to [-128,127]."""
+    aging = int(round(current + drift_ppm / ppm_per_lsb))
+    return max(AGING_MIN, min(AGING_MAX, aging))
+
+
+def _second_boundary(rtc, clock, sleep, poll, timeout=10.0):
+    """Wait for the seconds register to change. Return the new time (as
+    read_all() returns it) and the host time of the change, which is known
+    to within poll plus one read. Raise IOError(ETIMEDOUT) if no change is
+    caught within timeout seconds (e.g. the oscillator is stopped)."""
+    # Find the boundary roughly, then wait for the next one and find it
+    # finely: that costs about 1/coarse + 3 * coarse/poll reads.
+    coarse = 0.02
+    deadline = clock() + timeout
+    old = rtc.read_all()
+    while clock() < deadline:
+        sleep(coarse)
+        new = rtc.read_all()
+        if new == old:
+            continue
+        rough = clock()
+        sleep(max(0.0, 1.0 - 2 * coarse))
+        old = new
+        last = None
+        while clock() < deadline:
+            before = clock()
+            new = rtc.read_all()
+            if new != old:
+                if last is not None:
+                    return new, (last + clock()) / 2.0
+                # Woke up too late (the host was busy), start over.
+                break
+            last = before
+            if before - rough > 1.0 + 2 * coarse:
+                break
+            sleep(poll)
+        old = new
+    raise IOError(errno.ETIMEDOUT, 'DS3231 second boundary not found.')
+
+
+def _seconds(values, century=21):
+    year, month, date, _, hours, minutes, seconds = values
+    return (datetime(100 * (century - 1) + year, month, date,
+                     hours, minutes, seconds)
+            - datetime(2000, 1, 1)).total_seconds()
+
+
+def measure_drift(rtc, duration, source=None,
+        clock=SDL_DS3231._monotonic, sleep=time.sleep, poll=0.001):
+    """Measure the RTC's rate error against clock over duration seconds.
+    Return it in ppm, positive when the RTC runs fast.
+
+    With source, a SDL_DS3231_dispatcher edge source on the INT/SQW pin,
+    the 1 Hz square wave is turned on, every edge is timestamped and a line
+    is fitted through them; the pin is set back as it was afterwards.
+    Otherwise the seconds register is polled for
+    its change at the start and at the end of the window, which gives
+    about poll / duration accuracy.
+    """
+    if source is not None:
+        # Put the INT/SQW pin and the alarm interrupts back afterwards, or
+        # INT alarms stay off.
+        saved = rtc.read_alarm_config()._replace(alarm1=None, alarm2=None)
+        rtc.squareWave(rtc.SQWAVE_1_HZ)
+        try:
+            timestamps = []
+            start = clock()
+            while clock() - start < duration:
+                if source.wait(2.0):
+                    timestamps.append(clock())
+        finally:
+            rtc.apply(saved)
+        return drift_from_timestamps(timestamps)
+    first, start = _second_boundary(rtc, clock, sleep, poll)
+    sleep(max(0.0, duration - 1.5))
+    last, end = _second_boundary(rtc, clock, sleep, poll)
+    rtc_elapsed = _seconds(last) - _seconds(first)
+    return (rtc_elapsed / (end - start) - 1.0) * 1e6
+
+
+def drift_from_timestamps(timestamps):
+    """Return the RTC's rate error in ppm from reference timestamps (in
+    seconds) of SQW edges, e.g. captured against GPS PPS. Edges may be
+    missing; late timestamps are dropped as outliers."""
+    timestamps = list(timestamps)
+    if len(timestamps) < 8:
+        raise ValueError('Too few SQW edges for a rate estimate.')
+    samples = [(timestamps[0], 0)]
+    for timestamp in timestamps[1:]:
+        last, second = samples[-1]
+        samples.append((timestamp, second + int(round(timestamp - last))))
+    (_, b, _), _, _ = SDL_DS3231_discipline.fit_edges(samples)
+    # b is reference seconds per RTC second.
+    return (1.0 / b - 1.0) * 1e6
+
+
+class CalibrationHistory(object):
+    """Calibration records in an EventLog on the AT24C32."""
+
+    def __init__(self, rtc, start=HISTORY_START, size=HISTORY_SIZE):
+        self._log = SDL_DS3231_eventlog.EventLog(
+            rtc, start, size, record_size=32)
+
+    def append(self, calibration):
+        c = calibration
+        self._log.append(_RECORD.pack(
+            int(c.time), c.drift_ppm, c.old_aging, c.new_aging,
+            int(round(c.duration)), int(round(c.temperature * 4))))
+        self._log.flush()
+
+    def _decode(self, payload):
+        t, drift, old, new, duration, quarter = _RECORD.unpack(
+            payload[:_RECORD.size])
+        return Calibration(t, drift, old, new, duration, quarter / 4.0)
+
+    def __iter__(self):
+        """Yield the Calibrations, oldest first."""
+        for _, payload in self._log:
+            yield self._decode(payload)
+
+    def __len__(self):
+        return len(self._log)
+
+    def latest(self):
+        record = self._log.latest()
+        return None if record is None else self._decode(record[1])
+
+    def format(self):
+        self._log.format()
+
+
+def calibrate(rtc, duration=3 * 3600.0, source=None, timestamps=None,
+        history=None, apply=True, clock=SDL_DS3231._monotonic,
+        sleep=time.sleep, now=time.time):
+    """Measure the drift (see measure_drift(), or drift_from_timestamps()
+    if timestamps is given), compute the optimal aging offset and, with
+    apply, write it. The result is appended to history (a
+    CalibrationHistory) if given. Return the Calibration.
+
+    The aging register has 0.1 ppm steps, so the window should be long
+    enough to measure that: about three hours when polling, minutes with
+    SQW edges.
+    """
+    old = rtc.read_aging()
+    if timestamps is not None:
+        timestamps = list(timestamps)
+        drift = drift_from_timestamps(timestamps)
+        duration = timestamps[-1] - timestamps[0]
+    else:
+        drift = measure_drift(rtc, duration, source, clock, sleep)
+    new = optimal_aging(old, drift)
+    if apply and new != old:
+        rtc.write_aging(new)
+    calibration = Calibration(
+        now(), drift, old, new, duration, rtc.snapshot().temperature)
+    if history is not None:
+        history.append(calibration)
+    return calibration
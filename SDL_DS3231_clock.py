@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_clock.py
+# RTC time without an I2C transaction per read.
+#
+# CachedClock keeps the offset between the RTC and the host's monotonic
+# clock and answers now() by adding it to the monotonic time. The RTC only
+# counts whole seconds, so a read only tells that the offset lies in a one
+# second wide interval. Every check intersects the interval kept so far
+# with the new one, and the checks are timed to land on the predicted
+# second boundary, which halves the interval each time. With an edge
+# source on the 1 Hz SQW output, the offset is taken at the edge that
+# increments the seconds register and is exact from the start.
+
+from __future__ import print_function
+
+from datetime import timedelta
+import math
+import threading
+
+import SDL_DS3231
+
+
+class CachedClock(object):
+    """Extrapolated RTC time.
+
+    now() reads the RTC only when resync_interval seconds (None: never)
+    have passed since the last check. A check costs one read. Between
+    checks the offset is allowed to drift by rate_tolerance (RTC and host
+    together, 100 ppm by default). A read that disagrees with the offset by
+    more than max_drift seconds re-anchors the clock with sync(). Smaller
+    disagreements are corrected.
+
+    source is an optional SDL_DS3231_dispatcher edge source on the INT/SQW
+    pin, with the RTC set to rtc.squareWave(rtc.SQWAVE_1_HZ). sync() then
+    waits for the falling edge (up to a second). clock is the host's
+    monotonic clock.
+    """
+
+    def __init__(self, rtc, resync_interval=60.0, max_drift=0.05,
+            century=21, source=None, clock=SDL_DS3231._monotonic,
+            rate_tolerance=100e-6):
+        self._rtc = rtc
+        self.resync_interval = resync_interval
+        self.max_drift = max_drift
+        self.rate_tolerance = rate_tolerance
+        self._century = century
+        self._source = source
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._base = None       # RTC datetime the offsets are relative to
+        self._lo = self._hi = None
+        self._offset = None     # RTC seconds since _base minus monotonic
+        self._checked = None
+        self._due_at = None
+        self.syncs = 0
+        self.checks = 0
+
+    @property
+    def uncertainty(self):
+        """Width in seconds of the interval the offset is known to lie in.
+        """
+        if self._lo is None:
+            return None
+        return self._hi - self._lo
+
+    def sync(self):
+        """Re-anchor to the RTC, at the next SQW edge if there is a source.
+        """
+        with self._lock:
+            self._sync()
+
+    def _read(self):
+        """Read the RTC. Return the offset interval (lo, hi) it implies and
+        the monotonic time of the read."""
+        before = self._clock()
+        dt = self._rtc.read_datetime(self._century)
+        after = self._clock()
+        if self._base is None:
+            self._base = dt
+        seconds = (dt - self._base).total_seconds()
+        # The RTC showed dt at some point between before and after, so the
+        # RTC time was >= dt at after and < dt + 1 s at before.
+        return seconds - after, seconds + 1.0 - before, after
+
+    def _sync(self):
+        self.syncs += 1
+        if self._source is not None:
+            # The seconds register increments on the falling edge.
+            self._source.wait(0)
+            if self._source.wait(1.5):
+                edge = self._clock()
+                lo, _, now = self._read()
+                lo = hi = lo + (now - edge)
+                self._set(lo, hi, now)
+                return
+        lo, hi, now = self._read()
+        self._set(lo, hi, now)
+
+    def _set(self, lo, hi, now):
+        self._lo, self._hi = lo, hi
+        self._offset = (lo + hi) / 2.0
+        self._checked = now
+        if self.resync_interval is None:
+            self._due_at = None
+            return
+        # Land the next check on the predicted second boundary, where the
+        # read splits the interval in two.
+        due = now + self.resync_interval
+        self._due_at = math.ceil(due + self._offset) - self._offset
+
+    def check(self):
+        """Read the RTC once and narrow or correct the offset. Return the
+        change of the offset in seconds."""
+        with self._lock:
+            return self._check()
+
+    def _check(self):
+        if self._offset is None:
+            self._sync()
+            return 0.0
+        self.checks += 1
+        old = self._offset
+        lo, hi, now = self._read()
+        widen = self.rate_tolerance * (now - self._checked)
+        cur_lo = self._lo - widen
+        cur_hi = self._hi + widen
+        if cur_lo > hi + self.max_drift or cur_hi < lo - self.max_drift:
+            self._sync()
+            return self._offset - old
+        if cur_lo > hi:
+            cur_lo = cur_hi = hi
+        elif cur_hi < lo:
+            cur_lo = cur_hi = lo
+        self._set(max(cur_lo, lo), min(cur_hi, hi), now)
+        return self._offset - old
+
+    def _due(self, mono):
+        return (self._offset is None or
+                self._due_at is not None and mono >= self._due_at)
+
+    def now(self):
+        """Return the current RTC time as a datetime, extrapolated with the
+        monotonic clock."""
+        mono = self._clock()
+        if self._due(mono):
+            with self._lock:
+                if self._due(mono):
+                    self._check()
+        return self.at(mono)
+
+    def at(self, mono):
+        """Return the RTC time at monotonic time mono, e.g. to timestamp an
+        event recorded with the monotonic clock."""
+        if self._offset is None:
+            self.sync()
+        return self._base + timedelta(seconds=mono + self._offset)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_discipline.py
+# Host clock discipline from the DS3231's 1 Hz square wave, like a PPS
+# input for sites without NTP.
+#
+# Every falling edge of the SQW output is the start of an RTC second.
+# ClockDiscipline timestamps the edges with the host's raw monotonic clock,
+# numbers them with the RTC time read at the first edge, and fits a line
+# through the last window edges. The fit gives the RTC time at any host
+# instant (the offset) and the host's rate error against the RTC (the
+# frequency). Late timestamps from scheduling delays are dropped as
+# outliers. Optionally the system clock is slewed, or stepped if it is far
+# off, towards the RTC.
+
+from __future__ import print_function
+
+import calendar
+from collections import deque
+import ctypes
+import ctypes.util
+import datetime
+import math
+import os
+import threading
+import time
+
+import SDL_DS3231
+
+# CLOCK_MONOTONIC is slewed by adjtime(), which would feed the corrections
+# back into the measurement. CLOCK_MONOTONIC_RAW isn't.
+if hasattr(time, 'CLOCK_MONOTONIC_RAW'):
+    def _raw_monotonic():
+        return time.clock_gettime(time.CLOCK_MONOTONIC_RAW)
+else:
+    _raw_monotonic = SDL_DS3231._monotonic
+
+
+class _timeval(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_usec', ctypes.c_long)]
+
+
+def adjtime(delta):
+    """Slew the system clock by delta seconds with adjtime(3). Needs root.
+    Replaces any adjustment still in progress."""
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    seconds = math.floor(delta)
+    tv = _timeval(int(seconds), int(round((delta - seconds) * 1e6)))
+    if libc.adjtime(ctypes.byref(tv), None) != 0:
+        e = ctypes.get_errno()
+        raise OSError(e, 'adjtime: ' + os.strerror(e))
+
+
+class ClockDiscipline(object):
+    """Offset and frequency of the host clock against the RTC.
+
+    The RTC must output the 1 Hz square wave (rtc.squareWave(
+    rtc.SQWAVE_1_HZ)). Edges come from source (a SDL_DS3231_dispatcher
+    edge source on the INT/SQW pin) when run() is used, or are passed to
+    edge() by the caller. utc tells whether the RTC keeps UTC or local
+    time.
+
+    With slew=True, run() slews the system clock towards the RTC every
+    slew_interval edges, and steps it when it is more than step_threshold
+    seconds off.
+    """
+
+    def __init__(self, rtc, source=None, window=64, century=21, utc=False,
+            slew=False, step_threshold=0.128, slew_interval=16,
+            verify_interval=3600, clock=_raw_monotonic, realtime=time.time):
+        self._rtc = rtc
+        self._source = source
+        self._century = century
+        self._utc = utc
+        self.slew = slew
+        self.step_threshold = step_threshold
+        self.slew_interval = slew_interval
+        self.verify_interval = verify_interval
+        self._clock = clock
+        self._realtime = realtime
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self._fit = None
+        self._running = False
+        self.edges = 0
+        self.outliers = 0
+        self.resets = 0
+        self.jitter = None
+
+    def _epoch(self, dt):
+        if self._utc:
+            return calendar.timegm(dt.timetuple())
+        return time.mktime(dt.timetuple())
+
+    def reset(self):
+        """Drop the samples, e.g. after the RTC was set."""
+        with self._lock:
+            self._samples.clear()
+            self._fit = None
+            self.resets += 1
+
+    def edge(self, timestamp=None):
+        """Record a falling edge of the SQW output at host raw monotonic
+        time timestamp (default: now). Reads the RTC on the first edge and
+        every verify_interval edges."""
+        if timestamp is None:
+            timestamp = self._clock()
+        with self._lock:
+            self.edges += 1
+            if self._samples:
+                last_m, last_t = self._samples[-1]
+                rate = self._fit[1] if self._fit is not None else 1.0
+                second = last_t + int(round((timestamp - last_m) / rate))
+                if self.edges % self.verify_interval == 0:
+                    if self._read_rtc() != second:
+                        # Set or stopped meanwhile, start over.
+                        self._samples.clear()
+                        self._fit = None
+                        self.resets += 1
+                        second = self._read_rtc()
+            else:
+                second = self._read_rtc()
+            self._samples.append((timestamp, second))
+            self._update_fit()
+
+    def _read_rtc(self):
+        # Just after an edge, so the register is the second that started.
+        return self._epoch(self._rtc.read_datetime(self._century))
+
+    def _update_fit(self):
+        samples = list(self._samples)
+        if len(samples) < 2:
+            self._fit = None
+            self.jitter = None
+            return
+        self._fit, kept, self.jitter = fit_edges(samples)
+        if len(kept) < len(samples):
+            self.outliers += len(samples) - len(kept)
+            # Keep late edges out of the window for good.
+            self._samples = deque(kept, maxlen=self._samples.maxlen)
+
+    @property
+    def locked(self):
+        """True once there are enough samples for a frequency estimate."""
+        return self._fit is not None and len(self._samples) >= 8
+
+    @property
+    def frequency(self):
+        """Rate error of the host's raw clock against the RTC in ppm,
+        positive when the host runs fast."""
+        if self._fit is None:
+            return None
+        return (self._fit[1] - 1.0) * 1e6
+
+    def rtc_time(self, mono=None):
+        """Return the RTC time (seconds since the epoch, with fraction) at
+        host raw monotonic time mono (default: now)."""
+        if mono is None:
+            mono = self._clock()
+        fit = self._fit
+        if fit is None:
+            raise ValueError('No SQW edges recorded yet.')
+        a, b, t0 = fit
+        return t0 + (mono - a) / b
+
+    def now(self):
+        """Return the RTC time as a datetime (naive, in the RTC's
+        timescale)."""
+        t = self.rtc_time()
+        if self._utc:
+            return datetime.datetime.utcfromtimestamp(t)
+        return datetime.datetime.fromtimestamp(t)
+
+    @property
+    def offset(self):
+        """System clock minus RTC in seconds."""
+        mono = self._clock()
+        return self._realtime() - self.rtc_time(mono)
+
+    def stats(self):
+        """Return a dict of the discipline's state."""
+        return {
+            'edges': self.edges,
+            'samples': len(self._samples),
+            'locked': self.locked,
+            'offset': self.offset if self._fit is not None else None,
+            'frequency_ppm': self.frequency,
+            'jitter': self.jitter,
+            'outliers': self.outliers,
+            'resets': self.resets,
+        }
+
+    def discipline(self):
+        """Slew or step the system clock to the RTC. Return the offset
+        corrected."""
+        offset = self.offset
+        if abs(offset) > self.step_threshold:
+            time.clock_settime(time.CLOCK_REALTIME,
+                               self._realtime() - offset)
+        else:
+            adjtime(-offset)
+        return offset
+
+    def run(self):
+        """Record the edges of source until stop() is called."""
+        self._running = True
+        while self._running:
+            if not self._source.wait(2.0):
+                continue
+            timestamp = self._clock()
+            if not self._running:
+                break
+            self.edge(timestamp)
+            if (self.slew and self.locked and
+                    self.edges % self.slew_interval == 0):
+                self.discipline()
+
+    def stop(self):
+        self._running = False
+        self._source.wake()
+
+
+def fit_edges(samples):
+    """Fit host time m = a + b * (t - t0) through (m, t) edge samples,
+    twice: the second time without the outliers of the first. Return the
+    fit (a, b, t0), the samples kept and the rms residual (the jitter)."""
+    fit = _line(samples)
+    residuals = [m - fit[0] - fit[1] * (t - fit[2]) for m, t in samples]
+    spread = sorted(abs(r) for r in residuals)[len(residuals) // 2]
+    limit = max(5 * spread, 200e-6)
+    kept = [s for s, r in zip(samples, residuals) if abs(r) <= limit]
+    if 2 <= len(kept) < len(samples):
+        fit = _line(kept)
+    else:
+        kept = samples
+    residuals = [m - fit[0] - fit[1] * (t - fit[2]) for m, t in kept]
+    jitter = math.sqrt(sum(r * r for r in residuals) / len(residuals))
+    return fit, kept, jitter
+
+
+def _line(samples):
+    """Least squares line m = a + b * (t - t0) through (m, t) samples."""
+    t0 = samples[0][1]
+    n = float(len(samples))
+    mean_t = sum(t - t0 for _, t in samples) / n
+    mean_m = sum(m for m, _ in samples) / n
+    stt = sum((t - t0 - mean_t) ** 2 for _, t in samples)
+    if not stt:
+        return mean_m, 1.0, t0 + mean_t
+    stm = sum((t - t0 - mean_t) * (m - mean_m) for m, t in samples)
+    b = stm / stt
+    return mean_m - b * mean_t, b, t0
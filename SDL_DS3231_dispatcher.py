@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_dispatcher.py
+# Interrupt driven alarm handling for the DS3231.
+#
+# AlarmDispatcher blocks on the falling edge of the INT/SQW pin, reads the
+# status register once, clears only the flags of the alarms that fired and
+# calls the callbacks registered for them. Where the pin comes from is up
+# to the edge source: GPIOEdgeSource (RPi.GPIO), FakeEdgeSource (tests and
+# SDL_DS3231_sim) or PollingSource (no INT wire, checks the flags
+# periodically).
+
+from __future__ import print_function
+
+import threading
+
+
+class EdgeSource(object):
+    """Base class of the edge sources. trigger() records an edge, wait()
+    blocks until one has been recorded."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def trigger(self, *args):
+        """Record an edge. Takes any arguments so it can be used directly as
+        a GPIO or simulator callback."""
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """Block until an edge (or wake()) or for timeout seconds. Return
+        True if there was an edge."""
+        if not self._event.wait(timeout):
+            return False
+        self._event.clear()
+        return True
+
+    def wake(self):
+        """Make a pending wait() return."""
+        self._event.set()
+
+    def close(self):
+        pass
+
+
+class FakeEdgeSource(EdgeSource):
+    """Edge source driven by hand with trigger(), or by the INT/SQW pin of
+    a SDL_DS3231_sim.SimulatedBus when one is given: alarm interrupts, or
+    the 1 Hz square wave's falling edges."""
+
+    def __init__(self, sim_bus=None):
+        EdgeSource.__init__(self)
+        self._sim_bus = sim_bus
+        if sim_bus is not None:
+            sim_bus.rtc.listeners.append(self._on_sim_edge)
+
+    def _on_sim_edge(self, edge, when):
+        if edge in ('int', 'sqw'):
+            self.trigger()
+
+    def close(self):
+        if self._sim_bus is not None:
+            self._sim_bus.rtc.listeners.remove(self._on_sim_edge)
+            self._sim_bus = None
+
+
+class GPIOEdgeSource(EdgeSource):
+    """Falling edges on a Raspberry Pi pin (BOARD numbering by default)
+    through RPi.GPIO. The edge is caught by the GPIO library's thread, so
+    waiting costs no CPU."""
+
+    def __init__(self, pin, board_numbering=True, bouncetime=None):
+        EdgeSource.__init__(self)
+        import RPi.GPIO as GPIO
+
+        self._gpio = GPIO
+        self._pin = pin
+        GPIO.setmode(GPIO.BOARD if board_numbering else GPIO.BCM)
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        options = {'callback': self.trigger}
+        if bouncetime is not None:
+            options['bouncetime'] = bouncetime
+        GPIO.add_event_detect(pin, GPIO.FALLING, **options)
+
+    def close(self):
+        self._gpio.remove_event_detect(self._pin)
+
+
+class PollingSource(EdgeSource):
+    """For boards without the INT/SQW pin wired: reports an edge every
+    interval seconds so the dispatcher checks the alarm flags."""
+
+    def __init__(self, interval=1.0):
+        EdgeSource.__init__(self)
+        self.interval = interval
+
+    def wait(self, timeout=None):
+        delay = self.interval if timeout is None else min(self.interval, timeout)
+        self._event.wait(delay)
+        self._event.clear()
+        return True
+
+
+class AlarmDispatcher(object):
+    """Calls callback(alarmNumber) for every alarm that fires.
+
+    run() services the alarms once (INT may already be asserted, in which
+    case its edge was missed) and then blocks on the edge source until
+    stop() is called.
+    """
+
+    def __init__(self, rtc, source):
+        self._rtc = rtc
+        self._source = source
+        self._callbacks = {rtc.ALARM_1: [], rtc.ALARM_2: []}
+        self._running = False
+
+    def register(self, alarmNumber, callback):
+        self._callbacks[alarmNumber].append(callback)
+
+    def unregister(self, alarmNumber, callback):
+        self._callbacks[alarmNumber].remove(callback)
+
+    def service(self):
+        """Read the alarm flags once, clear the ones that fired and have
+        callbacks, and dispatch. Return the list of alarms that fired."""
+        watched = tuple(n for n in sorted(self._callbacks)
+                        if self._callbacks[n])
+        if not watched:
+            return []
+        # A cached status register would hide the flags that just fired.
+        self._rtc.invalidate_shadow(control=False)
+        fired = self._rtc.alarms(watched)
+        for alarmNumber in fired:
+            for callback in list(self._callbacks[alarmNumber]):
+                callback(alarmNumber)
+        return fired
+
+    def run_once(self, timeout=None):
+        """Wait for one edge and service it. Return the alarms that fired.
+        """
+        if self._source.wait(timeout):
+            return self.service()
+        return []
+
+    def run(self):
+        self._running = True
+        self.service()
+        while self._running:
+            self.run_once()
+
+    def stop(self):
+        """Make run() return. Safe to call from another thread or from a
+        callback."""
+        self._running = False
+        self._source.wake()
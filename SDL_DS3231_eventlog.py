@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_eventlog.py
+# Wear-leveled, append-only record log on the AT24C32 EEPROM of the
+# DS3231 / AT24C32 module.
+#
+# The log region is divided into fixed size slots. Record number seq always
+# goes to slot seq % slots, so every slot is written once per lap and wear
+# is spread evenly over the region. Each record carries its sequence number
+# and a CRC32, so a torn or stale slot is detected and skipped.
+#
+# Slot layout (little endian):
+#   seq     4 bytes
+#   length  1 byte
+#   payload record_size - 9 bytes (zero padded)
+#   crc32   4 bytes over all of the above
+
+from __future__ import print_function
+
+import struct
+import time
+import zlib
+
+# End of the default region of a log: the AT24C32 is split into the logs
+# from address 0 up to here and the calibration history
+# (SDL_DS3231_calibration.CalibrationHistory) in the last 512 bytes.
+DEFAULT_END = 0x0E00
+
+_HEADER = struct.Struct('<IB')
+_CRC = struct.Struct('<I')
+
+
+class EventLog(object):
+    """Ring buffer of sequence numbered, CRC protected records.
+
+    append() buffers records and writes them to the EEPROM a page at a time.
+    flush() writes out a partly filled page. Mounting (the constructor)
+    finds the newest record with a binary search over the slots, i.e.
+    O(log n) record reads. size defaults to the rest of the region below
+    DEFAULT_END, or of the chip if start is beyond it.
+    """
+
+    def __init__(self, rtc, start=0, size=None, record_size=16):
+        page = rtc.AT24C32_PAGE_SIZE
+        if size is None:
+            end = DEFAULT_END if start < DEFAULT_END else rtc.AT24C32_SIZE
+            size = end - start
+        if record_size < _HEADER.size + _CRC.size + 1 or page % record_size:
+            raise ValueError(
+                'record_size must divide the %i byte page and hold at least '
+                'one byte of payload.' % page)
+        if start % page or size % page or size <= 0 or \
+                start + size > rtc.AT24C32_SIZE:
+            raise ValueError('Log region must be whole pages of the AT24C32.')
+        self._rtc = rtc
+        self._start = start
+        self._record_size = record_size
+        self._slots = size // record_size
+        self._pending = []          # encoded records not written yet
+        self._next_seq = self._mount()
+
+    @property
+    def max_payload(self):
+        return self._record_size - _HEADER.size - _CRC.size
+
+    @property
+    def slots(self):
+        return self._slots
+
+    def _address(self, slot):
+        return self._start + slot * self._record_size
+
+    def _encode(self, seq, payload):
+        payload = bytes(bytearray(payload))
+        if len(payload) > self.max_payload:
+            raise ValueError(
+                'Payload is %i bytes, this log holds at most %i.'
+                % (len(payload), self.max_payload))
+        body = (_HEADER.pack(seq & 0xFFFFFFFF, len(payload)) +
+                payload.ljust(self.max_payload, b'\0'))
+        return body + _CRC.pack(zlib.crc32(body) & 0xFFFFFFFF)
+
+    def _decode(self, slot, record):
+        """Return (seq, payload) or None if the slot holds no valid record.
+        """
+        body = record[:-_CRC.size]
+        crc, = _CRC.unpack(record[-_CRC.size:])
+        if zlib.crc32(body) & 0xFFFFFFFF != crc:
+            return None
+        seq, length = _HEADER.unpack(body[:_HEADER.size])
+        if seq % self._slots != slot or length > self.max_payload:
+            return None
+        return seq, bytes(body[_HEADER.size:_HEADER.size + length])
+
+    def _read_slot(self, slot):
+        return self._decode(slot, self._rtc.read_AT24C32_block(
+            self._address(slot), self._record_size))
+
+    def _mount(self):
+        """Return the next sequence number to write."""
+        n = self._slots
+        first = self._read_slot(0)
+        if first is None:
+            # Empty log, or the write that wrapped around to slot 0 was torn
+            # and the rest of the slots still hold the previous lap.
+            last = self._read_slot(n - 1)
+            return 0 if last is None else last[0] + 1
+        lap = first[0] // n
+        # Slots [0, lo) are known to be in the current lap, [hi, n) are not.
+        lo, hi = 1, n
+        latest = first[0]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self._read_slot(mid)
+            if record is not None and record[0] // n == lap:
+                latest = record[0]
+                lo = mid + 1
+            else:
+                hi = mid
+        return latest + 1
+
+    def append(self, payload):
+        """Queue payload (bytes) as the next record and return its sequence
+        number. Records are written when their page is full or on flush().
+        """
+        seq = self._next_seq
+        self._pending.append(self._encode(seq, payload))
+        self._next_seq += 1
+        if self._next_seq % self._records_per_page() == 0:
+            self.flush()
+        return seq
+
+    def _records_per_page(self):
+        return self._rtc.AT24C32_PAGE_SIZE // self._record_size
+
+    def flush(self):
+        """Write all queued records. Records that share a page go out in one
+        block write."""
+        if not self._pending:
+            return
+        seq = self._next_seq - len(self._pending)
+        per_page = self._records_per_page()
+        while self._pending:
+            slot = seq % self._slots
+            count = min(per_page - slot % per_page, self._slots - slot,
+                        len(self._pending))
+            self._rtc.write_AT24C32_block(
+                self._address(slot), b''.join(self._pending[:count]))
+            del self._pending[:count]
+            seq += count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def __len__(self):
+        return min(self._next_seq, self._slots)
+
+    def __iter__(self):
+        """Yield (seq, payload) for every record, oldest first, including
+        records not flushed yet. Invalid slots are skipped."""
+        n = self._slots
+        pending = list(self._pending)
+        first_pending = self._next_seq - len(pending)
+        oldest = max(self._next_seq - n, 0)
+        if oldest < first_pending:
+            region = self._rtc.read_AT24C32_block(
+                self._start, n * self._record_size)
+            rs = self._record_size
+            for seq in range(oldest, first_pending):
+                slot = seq % n
+                record = self._decode(slot, region[slot * rs:(slot + 1) * rs])
+                if record is not None and record[0] == seq:
+                    yield record
+        for i, encoded in enumerate(pending):
+            if first_pending + i >= oldest:
+                yield self._decode((first_pending + i) % n, encoded)
+
+    def latest(self):
+        """Return (seq, payload) of the newest record, or None if the log is
+        empty."""
+        if self._pending:
+            seq = self._next_seq - 1
+            return self._decode(seq % self._slots, self._pending[-1])
+        if not self._next_seq:
+            return None
+        seq = self._next_seq - 1
+        return self._read_slot(seq % self._slots)
+
+    def format(self):
+        """Erase the log region and start again at sequence number 0."""
+        self._pending = []
+        self._rtc.write_AT24C32_block(
+            self._start, b'\xff' * (self._slots * self._record_size))
+        self._next_seq = 0
+
+
+def benchmark(rtc, count=256, record_size=16, clock=time.time):
+    """Format a log over the whole AT24C32, append count records and mount
+    it again. Return a dict of append throughput and mount time.
+    clock is the time source, e.g. SimulatedBus.monotonic."""
+    log = EventLog(rtc, record_size=record_size)
+    log.format()
+    payload = b'\xa5' * log.max_payload
+    start = clock()
+    for _ in range(count):
+        log.append(payload)
+    log.flush()
+    append_time = clock() - start
+    start = clock()
+    mounted = EventLog(rtc, record_size=record_size)
+    mount_time = clock() - start
+    assert mounted.latest() == (count - 1, payload)
+    return {
+        'records': count,
+        'record_size': record_size,
+        'appends_per_second': count / append_time,
+        'mount_seconds': mount_time,
+    }
+
+
+if __name__ == '__main__':
+    import sys
+
+    import SDL_DS3231
+
+    if '--sim' in sys.argv[1:]:
+        import SDL_DS3231_sim
+
+        bus = SDL_DS3231_sim.SimulatedBus()
+        result = benchmark(SDL_DS3231.SDL_DS3231(bus=bus), clock=bus.monotonic)
+    else:
+        result = benchmark(SDL_DS3231.SDL_DS3231(1, 0x68))
+    for key in sorted(result):
+        print('%s = %s' % (key, result[key]))
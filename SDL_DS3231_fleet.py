@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_fleet.py
+# Read many DS3231s at once, e.g. on a qualification rig.
+#
+# The devices are grouped by I2C bus and every bus gets its own worker
+# thread, so the buses are read in parallel and a read of the whole fleet
+# takes as long as the busiest bus. Each device costs one snapshot() block
+# read, which carries both the time and the temperature. Devices behind a
+# TCA9548A style mux are read through a SDL_DS3231_mux.MuxBatch, grouped
+# by channel, so the mux is written once per channel and read, not once
+# per device.
+
+from __future__ import print_function
+
+from collections import namedtuple
+import concurrent.futures
+
+import SDL_DS3231
+import SDL_DS3231_bus
+import SDL_DS3231_mux
+
+DeviceSpec = namedtuple('DeviceSpec', ('bus', 'addr', 'channel'))
+DeviceSpec.__new__.__defaults__ = (0x68, None)
+
+MUX_ADDR = SDL_DS3231_mux.MUX_ADDR
+
+
+class FleetResult(object):
+    """The result of one FleetReader.read(), in columns: one list per
+    field, one entry per device in spec order. A device that failed has
+    None as its datetime and temperature and the exception as its error.
+    """
+
+    COLUMNS = ('spec', 'datetime', 'temperature', 'latency', 'error')
+
+    def __init__(self, count):
+        for name in self.COLUMNS:
+            setattr(self, name, [None] * count)
+        self.wall_time = None
+
+    def __len__(self):
+        return len(self.spec)
+
+    def columns(self):
+        """Return {column name: list}."""
+        return dict((name, getattr(self, name)) for name in self.COLUMNS)
+
+    def rows(self):
+        """Yield one dict per device."""
+        for i in range(len(self)):
+            yield dict((name, getattr(self, name)[i])
+                       for name in self.COLUMNS)
+
+    @property
+    def errors(self):
+        return sum(1 for error in self.error if error is not None)
+
+
+class DeviceStats(object):
+    """Running statistics of one device over FleetReader.read() calls."""
+
+    __slots__ = ('reads', 'errors', 'total_latency', 'max_latency',
+                 'last_error')
+
+    def __init__(self):
+        self.reads = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_error = None
+
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.reads if self.reads else None
+
+    def __repr__(self):
+        return ('DeviceStats(reads=%i, errors=%i, mean_latency=%r, '
+                'max_latency=%r)' % (self.reads, self.errors,
+                                     self.mean_latency, self.max_latency))
+
+
+class FleetReader(object):
+    """Reads the time and temperature of every device in specs.
+
+    specs are DeviceSpec(bus, addr=0x68, channel=None) or plain tuples of
+    the same fields. bus is a bus number, opened with open_bus (by default
+    SDL_DS3231_bus.get_bus), or a bus object. channel is the mux channel
+    (0-7) of the device, behind the mux at mux_addr, which is shared
+    through SDL_DS3231_mux.get_mux() with the rest of the program.
+    """
+
+    def __init__(self, specs, open_bus=SDL_DS3231_bus.get_bus,
+            mux_addr=MUX_ADDR, century=21, clock=SDL_DS3231._monotonic):
+        self.specs = [DeviceSpec(*spec) for spec in specs]
+        self._century = century
+        self._clock = clock
+        buses = {}
+        self._muxes = {}    # bus key -> Mux
+        self._groups = {}   # bus key -> [(index, spec, rtc)]
+        for index, spec in enumerate(self.specs):
+            key = spec.bus if isinstance(spec.bus, int) else id(spec.bus)
+            if key not in buses:
+                bus = spec.bus
+                if isinstance(bus, int):
+                    bus = open_bus(bus)
+                buses[key] = bus
+                self._groups[key] = []
+            bus = buses[key]
+            if spec.channel is not None:
+                mux = self._muxes.get(key)
+                if mux is None:
+                    mux = self._muxes[key] = SDL_DS3231_mux.get_mux(
+                        bus, mux_addr)
+                bus = mux.channel(spec.channel)
+            rtc = SDL_DS3231.SDL_DS3231(bus=bus, addr=spec.addr)
+            self._groups[key].append((index, spec, rtc))
+        self._buses = buses
+        self.stats = [DeviceStats() for _ in self.specs]
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, len(buses)))
+
+    def mux(self, bus):
+        """Return the SDL_DS3231_mux.Mux of bus (a spec's bus), or None."""
+        key = bus if isinstance(bus, int) else id(bus)
+        return self._muxes.get(key)
+
+    def read(self):
+        """Read every device once. Return a FleetResult."""
+        result = FleetResult(len(self.specs))
+        start = self._clock()
+        futures = [self._executor.submit(self._read_bus, key, result)
+                   for key in self._groups]
+        for future in futures:
+            future.result()
+        result.wall_time = self._clock() - start
+        return result
+
+    def _read_bus(self, key, result):
+        mux = self._muxes.get(key)
+        batch = mux.batch() if mux is not None else None
+        queued = []
+        for index, spec, rtc in self._groups[key]:
+            if spec.channel is None:
+                self._read_device(index, spec, rtc, result)
+            else:
+                batch.call(spec.channel, self._read_device,
+                           index, spec, rtc, result)
+                queued.append((index, spec))
+        if batch is None:
+            return
+        # The errors left are those of the channel selection.
+        for (index, spec), error in zip(
+                queued, batch.run(return_exceptions=True)):
+            if error is not None:
+                self._record(index, spec, result, 0.0, error)
+
+    def _read_device(self, index, spec, rtc, result):
+        clock = self._clock
+        start = clock()
+        error = None
+        try:
+            snapshot = rtc.snapshot()
+            result.datetime[index] = snapshot.datetime(self._century)
+            result.temperature[index] = snapshot.temperature
+        except (IOError, ValueError) as e:
+            # ValueError: garbage in the time registers.
+            error = e
+        self._record(index, spec, result, clock() - start, error)
+
+    def _record(self, index, spec, result, latency, error):
+        result.spec[index] = spec
+        result.latency[index] = latency
+        result.error[index] = error
+        stats = self.stats[index]
+        stats.reads += 1
+        stats.total_latency += latency
+        stats.max_latency = max(stats.max_latency, latency)
+        if error is not None:
+            stats.errors += 1
+            stats.last_error = error
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_i2cdev.py
+# Pure Python I2C bus on /dev/i2c-N, without the smbus extension.
+#
+# I2CDevBus talks to the kernel with the I2C_RDWR ioctl, which runs a list
+# of messages as one combined transaction (repeated START between them,
+# one STOP at the end). That lifts the 32 byte limit of the SMBus block
+# calls, and a register or EEPROM random read (address write, then read)
+# is one syscall and one transaction. The smbus.SMBus methods the driver
+# uses are provided on top of transfer(), so the bus can be passed as
+# SDL_DS3231.SDL_DS3231(bus=I2CDevBus(1)) or opened with
+# SDL_DS3231_bus.get_bus(1, 'i2cdev').
+#
+# The message structures of transfer() are allocated once per bus. The
+# ioctl function is a parameter: FakeIoctl runs the messages on a
+# SDL_DS3231_sim.SimulatedBus instead of a kernel.
+
+from __future__ import print_function
+
+import ctypes
+import errno
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows. Only needed for a real /dev/i2c-N.
+    fcntl = None
+
+# linux/i2c-dev.h and linux/i2c.h
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+
+# Kernel limit on the length of one message.
+MAX_MESSAGE = 8192
+
+
+class i2c_msg(ctypes.Structure):
+    _fields_ = [
+        ('addr', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('len', ctypes.c_uint16),
+        ('buf', ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+class i2c_rdwr_ioctl_data(ctypes.Structure):
+    _fields_ = [
+        ('msgs', ctypes.POINTER(i2c_msg)),
+        ('nmsgs', ctypes.c_uint32),
+    ]
+
+
+def _check_length(length):
+    if not 0 <= length <= MAX_MESSAGE:
+        raise OverflowError(
+            'Message length must be between 0 and %i.' % MAX_MESSAGE)
+
+
+class I2CDevBus(object):
+    """I2C bus number twi through /dev/i2c-twi.
+
+    ioctl is called as ioctl(fd, I2C_RDWR, data) for every transaction;
+    by default it is fcntl.ioctl on the opened device file. If another
+    ioctl is given (e.g. FakeIoctl) no file is opened.
+    """
+
+    # Longest write_i2c_block_data(): the command byte shares the message.
+    max_block = MAX_MESSAGE - 1
+
+    def __init__(self, twi=1, ioctl=None):
+        self.twi = twi
+        if ioctl is None:
+            if fcntl is None:
+                raise ImportError('The fcntl module is required for '
+                                  '/dev/i2c-N.')
+            self._fd = os.open('/dev/i2c-%d' % twi, os.O_RDWR)
+            self._ioctl = fcntl.ioctl
+        else:
+            self._fd = None
+            self._ioctl = ioctl
+            if hasattr(ioctl, 'sleep'):
+                # Simulated time, see FakeIoctl.
+                self.sleep = ioctl.sleep
+        self._lock = threading.Lock()
+        # transfer(): a write and a read message, and their buffers, which
+        # are grown as needed.
+        self._msgs = (i2c_msg * 2)()
+        self._data = i2c_rdwr_ioctl_data(
+            ctypes.cast(self._msgs, ctypes.POINTER(i2c_msg)), 0)
+        self._write_buf = (ctypes.c_uint8 * 32)()
+        self._read_buf = (ctypes.c_uint8 * 32)()
+
+    def _buffer(self, name, length):
+        buf = getattr(self, name)
+        if len(buf) < length:
+            buf = (ctypes.c_uint8 * max(length, 2 * len(buf)))()
+            setattr(self, name, buf)
+        return buf
+
+    def transfer(self, addr, write=b'', read=0):
+        """Write the bytes in write to the device at addr and then, after a
+        repeated START, read read bytes, in one transaction. Return the
+        bytes read as a bytearray."""
+        write = bytearray(write)
+        _check_length(len(write))
+        _check_length(read)
+        with self._lock:
+            msgs = self._msgs
+            n = 0
+            if write or not read:
+                buf = self._buffer('_write_buf', len(write))
+                ctypes.memmove(buf, bytes(write), len(write))
+                msgs[n].addr, msgs[n].flags, msgs[n].len = addr, 0, len(write)
+                msgs[n].buf = buf
+                n += 1
+            if read:
+                buf = self._buffer('_read_buf', read)
+                msgs[n].addr, msgs[n].flags, msgs[n].len = addr, I2C_M_RD, read
+                msgs[n].buf = buf
+                n += 1
+            self._data.nmsgs = n
+            self._ioctl(self._fd, I2C_RDWR, self._data)
+            return bytearray(self._read_buf[:read]) if read else bytearray()
+
+    def rdwr(self, *messages):
+        """Run messages as one combined transaction. Each message is
+        (addr, data) to write or (addr, length) to read. Return the list
+        of bytearrays read."""
+        count = len(messages)
+        msgs = (i2c_msg * count)()
+        reads = []
+        for msg, (addr, payload) in zip(msgs, messages):
+            msg.addr = addr
+            if isinstance(payload, int):
+                _check_length(payload)
+                buf = (ctypes.c_uint8 * payload)()
+                msg.flags = I2C_M_RD
+                msg.len = payload
+                reads.append(buf)
+            else:
+                payload = bytes(bytearray(payload))
+                _check_length(len(payload))
+                buf = (ctypes.c_uint8 * len(payload)).from_buffer_copy(
+                    payload)
+                msg.len = len(payload)
+            msg.buf = buf
+        data = i2c_rdwr_ioctl_data(
+            ctypes.cast(msgs, ctypes.POINTER(i2c_msg)), count)
+        self._ioctl(self._fd, I2C_RDWR, data)
+        return [bytearray(buf) for buf in reads]
+
+    #  smbus.SMBus interface
+    def write_quick(self, addr):
+        self.transfer(addr)
+
+    def read_byte(self, addr):
+        return self.transfer(addr, read=1)[0]
+
+    def write_byte(self, addr, value):
+        self.transfer(addr, [value])
+
+    def read_byte_data(self, addr, cmd):
+        return self.transfer(addr, [cmd], 1)[0]
+
+    def write_byte_data(self, addr, cmd, value):
+        self.transfer(addr, [cmd, value])
+
+    def read_word_data(self, addr, cmd):
+        low, high = self.transfer(addr, [cmd], 2)
+        return low | high << 8
+
+    def write_word_data(self, addr, cmd, value):
+        self.transfer(addr, [cmd, value & 0xFF, value >> 8])
+
+    def read_i2c_block_data(self, addr, cmd, length=32):
+        return list(self.transfer(addr, [cmd], length))
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self.transfer(addr, [cmd] + list(vals))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeIoctl(object):
+    """I2C_RDWR on a SDL_DS3231_sim.SimulatedBus, for I2CDevBus(ioctl=...).
+    A write message followed by a read of the same address is one
+    simulated transaction with a repeated START, like on the wire.
+    calls counts the ioctl calls. sleep lets simulated time pass; the
+    I2CDevBus offers it to the driver like SimulatedBus.sleep."""
+
+    def __init__(self, sim_bus):
+        self._sim_bus = sim_bus
+        self.sleep = sim_bus.sleep
+        self.calls = 0
+
+    def __call__(self, fd, request, arg):
+        if request != I2C_RDWR:
+            raise IOError(errno.ENOTTY, os.strerror(errno.ENOTTY))
+        self.calls += 1
+        msgs = [arg.msgs[i] for i in range(arg.nmsgs)]
+        i = 0
+        while i < len(msgs):
+            msg = msgs[i]
+            if msg.flags & I2C_M_RD:
+                write, read = b'', msg
+            else:
+                write = bytes(bytearray(msg.buf[:msg.len]))
+                read = None
+                if (i + 1 < len(msgs) and msgs[i + 1].flags & I2C_M_RD and
+                        msgs[i + 1].addr == msg.addr):
+                    i += 1
+                    read = msgs[i]
+            data = self._sim_bus.transfer(
+                msg.addr, write, read.len if read is not None else 0,
+                op='i2c_rdwr')
+            if read is not None:
+                ctypes.memmove(read.buf, bytes(data), len(data))
+            i += 1
+        return 0
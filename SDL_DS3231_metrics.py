@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_metrics.py
+# Bus traffic metrics and tracing of a SDL_DS3231 driver.
+#
+# Metrics.attach(rtc) swaps the driver's bus for an InstrumentedBus, which
+# times every transaction, and shadows the driver's public methods with
+# instance attributes that count the calls and note the caller.
+# detach(rtc) deletes them again, so a driver without metrics runs the
+# plain class methods on the plain bus and pays nothing.
+#
+# Every transaction is charged to the outermost driver method running in
+# its thread (e.g. read_AT24C32_all, not the readinto_AT24C32 it calls),
+# or to None for direct bus calls. transactions and bus_time by caller
+# show who keeps the bus busy. With a trace callback every transaction is
+# also passed on as a TraceEvent; print_trace prints them like the old
+# debug prints of the driver did.
+
+from __future__ import print_function
+
+from collections import Counter, namedtuple
+import threading
+
+import SDL_DS3231
+import SDL_DS3231_bus
+
+TraceEvent = namedtuple('TraceEvent', (
+    'time',      # clock() at the start
+    'caller',    # outermost driver method, or None
+    'op',        # bus method, e.g. 'read_byte_data'
+    'addr',      # I2C address
+    'register',  # first DS3231 register or AT24C32 address, or None
+    'length',    # bytes read or written after the register/address
+    'data',      # bytes read or written (bytearray), or None
+    'latency',   # seconds
+    'error',     # the exception, or None
+))
+
+
+class Histogram(object):
+    """Latencies in power of two buckets of microseconds: bucket n counts
+    the values below 2**n us (and at least 2**(n-1) us)."""
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[int(seconds * 1e6).bit_length()] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """Return the upper bound in seconds of the bucket holding the q
+        quantile (0-1), or None if empty."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return (1 << bucket) * 1e-6
+        return self.max
+
+    def __repr__(self):
+        return ('Histogram(count=%i, mean=%r, p99=%r, max=%r)'
+                % (self.count, self.mean, self.quantile(0.99), self.max))
+
+
+class Metrics(object):
+    """Counters and latency histograms of the drivers attached to it.
+
+    register_reads and register_writes count the DS3231 registers moved,
+    by register; calls the calls of the driver methods; transactions,
+    bus_time and errors the transactions, their total latency and the
+    failed ones by caller; latency a Histogram per bus method;
+    eeprom_wait a Histogram of the AT24C32 write cycle waits and
+    eeprom_polls the ACK polls they took (their NACKs are no errors). clock times
+    the transactions (SimulatedBus.monotonic gives wire times). trace,
+    if set, is called with a TraceEvent per transaction.
+    """
+
+    def __init__(self, trace=None, clock=SDL_DS3231._monotonic):
+        self.trace = trace
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.register_reads = Counter()
+            self.register_writes = Counter()
+            self.calls = Counter()
+            self.transactions = Counter()
+            self.bus_time = Counter()
+            self.errors = Counter()
+            self.latency = {}
+            self.eeprom_wait = Histogram()
+            self.eeprom_polls = 0
+
+    @property
+    def caller(self):
+        """The outermost driver method running in this thread, or None."""
+        return getattr(self._local, 'caller', None)
+
+    def attach(self, rtc):
+        """Instrument rtc, a SDL_DS3231. Return rtc."""
+        if isinstance(rtc._bus, InstrumentedBus):
+            raise ValueError('The driver already has metrics attached.')
+        rtc._bus = InstrumentedBus(rtc._bus, self, rtc._addr,
+                                   rtc._at24c32_addr)
+        for name in dir(type(rtc)):
+            if name.startswith('_'):
+                continue
+            method = getattr(rtc, name)
+            if callable(method):
+                setattr(rtc, name, self._wrap_call(name, method))
+        rtc._AT24C32_wait_ready = self._wrap_wait(rtc._AT24C32_wait_ready)
+        return rtc
+
+    def detach(self, rtc):
+        """Undo attach()."""
+        bus = rtc._bus
+        if not isinstance(bus, InstrumentedBus) or bus.metrics is not self:
+            raise ValueError('The driver has no metrics of this object.')
+        rtc._bus = bus.bus
+        for name, value in list(vars(rtc).items()):
+            if name == '_AT24C32_wait_ready' or (
+                    not name.startswith('_') and callable(value)):
+                delattr(rtc, name)
+
+    def _wrap_call(self, name, method):
+        local = self._local
+
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            if getattr(local, 'caller', None) is not None:
+                return method(*args, **kwargs)
+            local.caller = name
+            try:
+                return method(*args, **kwargs)
+            finally:
+                local.caller = None
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def _wrap_wait(self, method):
+        clock = self._clock
+        local = self._local
+
+        def wait():
+            start = clock()
+            local.polling = True
+            try:
+                return method()
+            finally:
+                local.polling = False
+                self.eeprom_wait.add(clock() - start)
+        return wait
+
+    def record(self, op, addr, register, length, data, read, start,
+            latency, error, rtc_addr):
+        """Account for one transaction (called by InstrumentedBus)."""
+        caller = getattr(self._local, 'caller', None)
+        with self._lock:
+            self.transactions[caller] += 1
+            self.bus_time[caller] += latency
+            histogram = self.latency.get(op)
+            if histogram is None:
+                histogram = self.latency[op] = Histogram()
+            histogram.add(latency)
+            if getattr(self._local, 'polling', False):
+                self.eeprom_polls += 1
+            elif error is not None:
+                self.errors[caller] += 1
+            elif addr == rtc_addr and register is not None:
+                counter = (self.register_reads if read
+                           else self.register_writes)
+                for r in range(register, register + length):
+                    counter[r] += 1
+        if self.trace is not None:
+            self.trace(TraceEvent(start, caller, op, addr, register, length,
+                                  data, latency, error))
+
+    def top_callers(self, n=None):
+        """Return [(caller, transactions, bus_time)], busiest first."""
+        return [(caller, self.transactions[caller], bus_time)
+                for caller, bus_time in self.bus_time.most_common(n)]
+
+    def report(self):
+        """Return a printable summary."""
+        lines = ['%-28s %8s %8s %10s %6s'
+                 % ('caller', 'calls', 'trans.', 'bus time', 'errors')]
+        for caller, transactions, bus_time in self.top_callers():
+            lines.append('%-28s %8s %8i %9.3fs %6i' % (
+                caller, self.calls.get(caller, ''), transactions, bus_time,
+                self.errors[caller]))
+        for op in sorted(self.latency):
+            lines.append('%-28s %r' % (op, self.latency[op]))
+        if self.eeprom_wait.count:
+            lines.append('%-28s %r' % ('AT24C32 write cycle wait',
+                                       self.eeprom_wait))
+        for title, counter in (('registers read: ', self.register_reads),
+                               ('registers written: ', self.register_writes)):
+            if counter:
+                lines.append(title + ' '.join(
+                    '%02x:%i' % item for item in sorted(counter.items())))
+        return '\n'.join(lines)
+
+
+def _decode(op, addr, args, result, eeprom_addr):
+    """Return register, length, data and whether it was a read, of a
+    transaction."""
+    if op in ('read_byte_data', 'read_word_data', 'read_i2c_block_data'):
+        length = {'read_byte_data': 1, 'read_word_data': 2}.get(
+            op, args[1] if len(args) > 1 else 32)
+        data = result if isinstance(result, list) else [result]
+        return args[0], length, data, True
+    if op in ('write_byte_data', 'write_word_data', 'write_i2c_block_data'):
+        register, values = args[0], args[1]
+        values = list(values) if op == 'write_i2c_block_data' else [values]
+        if addr == eeprom_addr and values:
+            return (register << 8 | values[0], len(values) - 1, values[1:],
+                    False)
+        return register, len(values), values, False
+    if op == 'transfer':
+        write = bytearray(args[0]) if args else bytearray()
+        read = args[1] if len(args) > 1 else 0
+        if addr == eeprom_addr and len(write) >= 2:
+            register, write = write[0] << 8 | write[1], write[2:]
+        elif write:
+            register, write = write[0], write[1:]
+        else:
+            register = None
+        if read:
+            return register, read, result, True
+        return register, len(write), write, False
+    if op == 'write_byte':
+        return None, 1, [args[0]], False
+    if op == 'read_byte':
+        return None, 1, [result], True
+    return None, 0, None, op.startswith('read')
+
+
+def _instrumented_method(name):
+    def call(self, addr, *args):
+        # An AttributeError here (the bus has no such method) is no
+        # transaction.
+        method = getattr(self.bus, name)
+        metrics = self.metrics
+        clock = metrics._clock
+        start = clock()
+        result = error = None
+        try:
+            result = method(addr, *args)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # A capability probe of the driver is no transaction either.
+            if error is None or not SDL_DS3231._block_unsupported(error):
+                latency = clock() - start
+                register, length, data, read = _decode(
+                    name, addr, args, result, self._eeprom_addr)
+                if error is not None:
+                    data = None
+                metrics.record(name, addr, register, length, data, read,
+                               start, latency, error, self._addr)
+    call.__name__ = name
+    return call
+
+
+class InstrumentedBus(object):
+    """Bus wrapper that reports every transaction to metrics. Anything
+    else (locks, max_block, ...) is passed through to bus."""
+
+    def __init__(self, bus, metrics, addr=0x68, eeprom_addr=0x56):
+        self.bus = bus
+        self.metrics = metrics
+        self._addr = addr
+        self._eeprom_addr = eeprom_addr
+        # Resolved once: the driver's probe of a bus without it is no
+        # transaction.
+        if hasattr(bus, 'transfer'):
+            self.transfer = _instrumented_method('transfer').__get__(self)
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+
+for _name in SDL_DS3231_bus._SMBUS_METHODS:
+    if _name != 'transfer':
+        setattr(InstrumentedBus, _name, _instrumented_method(_name))
+del _name
+
+
+def print_trace(event):
+    """A trace callback printing one line per transaction."""
+    e = event
+    data = e.data
+    if data is not None:
+        data = ' '.join('%02x' % b for b in data[:16]) + (
+            ' ...' if len(data) > 16 else '')
+    print('%-12s %-20s addr=0x%02x register=%s length=%i data=%s %.6fs%s' % (
+        e.caller, e.op, e.addr,
+        '0x%x' % e.register if e.register is not None else '-', e.length,
+        data if data is not None else '-',
+        e.latency, ' error=%s' % (e.error,) if e.error is not None else ''))
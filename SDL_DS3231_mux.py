@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_mux.py
+# DS3231s behind a TCA9548A (or PCA9548A) I2C multiplexer.
+#
+# All DS3231s answer at 0x68, so several of them on one bus need a mux.
+# The mux has a single control register: bit n connects downstream
+# channel n. Mux remembers the value it last wrote there and only writes
+# it again when a transaction is for another channel. Mux.channel(n) is a bus object for SDL_DS3231.SDL_DS3231(bus=...)
+# that selects its channel before every transaction. MuxBatch queues
+# operations for many channels and runs them grouped by channel, so that
+# polling n clocks costs n channel switches at most, whatever order they
+# were queued in.
+#
+# The cache assumes that Mux is the only writer of the control register:
+# get_mux() hands out one Mux per bus and address, so every user in the
+# process shares it. Call invalidate() if something else (another
+# process, a reset of the mux) may have changed it.
+
+from __future__ import print_function
+
+import itertools
+import threading
+
+import SDL_DS3231_bus
+
+# Default address of the TCA9548A (A2..A0 low).
+MUX_ADDR = 0x70
+
+CHANNELS = 8
+
+_muxes = {}     # (id(bus), addr) -> (bus, Mux); bus keeps the id in use
+_muxes_lock = threading.Lock()
+
+
+def get_mux(bus, addr=MUX_ADDR):
+    """Return the Mux at addr on bus, creating it on first use. All
+    callers get the same object, so they share its cached selection."""
+    with _muxes_lock:
+        entry = _muxes.get((id(bus), addr))
+        if entry is None:
+            entry = _muxes[id(bus), addr] = (bus, Mux(bus, addr))
+        return entry[1]
+
+
+class Mux(object):
+    """The mux at addr on bus, which is a SDL_DS3231_bus.SharedBus or any
+    object with the smbus.SMBus methods.
+
+    switches counts the writes of the control register, selects the
+    channel selections asked for: their difference is the traffic the
+    cache saved.
+    """
+
+    def __init__(self, bus, addr=MUX_ADDR):
+        self._bus = bus
+        self.addr = addr
+        # Held from the selection through the transaction, so that no other
+        # thread can switch the channel in between.
+        self.lock = getattr(bus, 'lock', None) or threading.RLock()
+        self._control = None    # unknown
+        self._channels = {}
+        self._device_locks = {}
+        self.switches = 0
+        self.selects = 0
+
+    @property
+    def bus(self):
+        return self._bus
+
+    @property
+    def selected(self):
+        """The selected channel, None if none or unknown."""
+        control = self._control
+        if not control or control & (control - 1):
+            return None
+        return control.bit_length() - 1
+
+    def _set(self, control):
+        with self.lock:
+            self.selects += 1
+            if control == self._control:
+                return
+            self._control = None
+            self._bus.write_byte(self.addr, control)
+            self._control = control
+            self.switches += 1
+
+    def select(self, channel):
+        """Connect channel (0-7) alone, unless it is already."""
+        if not 0 <= channel < CHANNELS:
+            raise ValueError('Mux channel must be between 0 and %i.'
+                             % (CHANNELS - 1))
+        self._set(1 << channel)
+
+    def disable(self):
+        """Disconnect all channels."""
+        self._set(0)
+
+    def invalidate(self):
+        """Forget the cached selection: the next one writes the mux."""
+        with self.lock:
+            self._control = None
+
+    def read_control(self):
+        """Read the control register back and cache it."""
+        with self.lock:
+            self._control = self._bus.read_byte(self.addr)
+            return self._control
+
+    def channel(self, channel):
+        """Return the MuxChannel of channel, the same object every time."""
+        with self.lock:
+            handle = self._channels.get(channel)
+            if handle is None:
+                if not 0 <= channel < CHANNELS:
+                    raise ValueError('Mux channel must be between 0 and %i.'
+                                     % (CHANNELS - 1))
+                handle = self._channels[channel] = MuxChannel(self, channel)
+            return handle
+
+    def _device_lock(self, channel, addr):
+        with self.lock:
+            lock = self._device_locks.get((channel, addr))
+            if lock is None:
+                lock = self._device_locks[channel, addr] = threading.RLock()
+            return lock
+
+    def batch(self):
+        """Return a MuxBatch of operations on this mux's channels."""
+        return MuxBatch(self)
+
+
+def _channel_method(name):
+    def call(self, *args):
+        mux = self._mux
+        with mux.lock:
+            mux.select(self.channel)
+            return getattr(mux.bus, name)(*args)
+    call.__name__ = name
+    return call
+
+
+class MuxChannel(object):
+    """Downstream channel of a Mux, used like a SharedBus. The smbus
+    methods select the channel first. Devices with the same address on
+    different channels get different device locks."""
+
+    def __init__(self, mux, channel):
+        self._mux = mux
+        self.channel = channel
+
+    def __getattr__(self, name):
+        # Anything else the upstream bus has (max_block, sleep, ...).
+        return getattr(self._mux.bus, name)
+
+    @property
+    def mux(self):
+        return self._mux
+
+    @property
+    def lock(self):
+        return self._mux.lock
+
+    def device_lock(self, addr):
+        return self._mux._device_lock(self.channel, addr)
+
+    def modify_byte_data(self, addr, cmd, clear=0, set=0):
+        """As SharedBus.modify_byte_data()."""
+        with self.device_lock(addr):
+            with self.lock:
+                old = self.read_byte_data(addr, cmd)
+                new = (old & ~clear | set) & 0xFF
+                if new != old:
+                    self.write_byte_data(addr, cmd, new)
+                return old
+
+    def __repr__(self):
+        return 'MuxChannel(0x%02x, %i)' % (self._mux.addr, self.channel)
+
+
+for _name in SDL_DS3231_bus._SMBUS_METHODS:
+    setattr(MuxChannel, _name, _channel_method(_name))
+del _name
+
+
+class MuxBatch(object):
+    """Queued operations on the channels of a Mux, run by run() grouped by
+    channel: first those of the selected channel, then the others in
+    ascending order, each group after one selection. The order within a
+    channel is kept.
+
+    The bus lock is not held across the operations: they take their own
+    locks, in the driver's order (device lock, then bus lock), and every
+    transaction selects its channel again, which costs nothing while no
+    other thread switched it.
+
+        batch = mux.batch()
+        for channel, rtc in clocks:
+            batch.call(channel, rtc.snapshot)
+        snapshots = batch.run()
+
+    batch.channel(n) queues smbus methods on channel n, batch.call(n,
+    function, *args) any function (e.g. a driver method of a device on
+    mux.channel(n)). run() returns their results in the order they were
+    queued.
+    """
+
+    def __init__(self, mux):
+        self._mux = mux
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def call(self, channel, function, *args):
+        if not 0 <= channel < CHANNELS:
+            raise ValueError('Mux channel must be between 0 and %i.'
+                             % (CHANNELS - 1))
+        self._ops.append((channel, function, args))
+
+    def channel(self, channel):
+        return _BatchChannel(self, channel)
+
+    def order(self):
+        """Return the indices of the queued operations in run order."""
+        first = self._mux.selected
+        return sorted(range(len(self._ops)), key=lambda i: (
+            self._ops[i][0] != first, self._ops[i][0], i))
+
+    def run(self, return_exceptions=False):
+        """Run and clear the queued operations. Return their results.
+
+        With return_exceptions, an IOError or ValueError of an operation
+        is returned as its result and the others still run; otherwise it
+        is raised and the rest are dropped.
+        """
+        mux = self._mux
+        order = self.order()
+        ops, self._ops = self._ops, []
+        results = [None] * len(ops)
+        for channel, group in itertools.groupby(order, lambda i: ops[i][0]):
+            for i in group:
+                _, function, args = ops[i]
+                try:
+                    mux.select(channel)
+                    results[i] = function(*args)
+                except (IOError, ValueError) as e:
+                    if not return_exceptions:
+                        raise
+                    results[i] = e
+        return results
+
+
+class _BatchChannel(object):
+
+    def __init__(self, batch, channel):
+        self._batch = batch
+        self._channel = channel
+
+    def __getattr__(self, name):
+        if name not in SDL_DS3231_bus._SMBUS_METHODS:
+            raise AttributeError(name)
+        method = getattr(self._batch._mux.channel(self._channel), name)
+
+        def queue(*args):
+            self._batch.call(self._channel, method, *args)
+        return queue
@@ -0,0 +1,478 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_record.py
+# Record and replay of I2C bus traffic, for looking at a field unit's
+# workload off-device.
+#
+# RecordingBus wraps the bus of a SDL_DS3231 and appends every transaction
+# to a binary file: a 16 byte file header, then per transaction a fixed
+# _RECORD header (start time, duration, op, address, first byte written,
+# lengths, errno) followed by the bytes written and the bytes read. The
+# file is only ever appended to, so a crash loses at most the records
+# still buffered, and Recording scans it through mmap, reading just the
+# fixed headers when the payloads aren't needed. ReplayBus feeds the
+# recorded responses back to a driver in order, so a workload can be rerun
+# deterministically, and analyze() summarizes a recording.
+#
+#     python SDL_DS3231_record.py trace.bin
+
+from __future__ import print_function
+
+from collections import Counter, namedtuple
+import errno
+import mmap
+import os
+import struct
+import sys
+import threading
+
+import SDL_DS3231
+
+MAGIC = b'DS3231TR'
+VERSION = 1
+
+# magic, version, max_block of the recorded bus, reserved
+_FILE_HEADER = struct.Struct('<8sHHI')
+# start, duration, op, addr, register (first byte written or NO_REGISTER),
+# bytes written, bytes read, errno (0: no error)
+_RECORD = struct.Struct('<dfBBHHHh')
+
+NO_REGISTER = 0xFFFF
+
+# The recorded bus methods, by op code. The others of smbus.SMBus are
+# passed through without recording.
+OPS = (
+    'write_quick', 'read_byte', 'write_byte', 'read_byte_data',
+    'write_byte_data', 'read_word_data', 'write_word_data',
+    'read_i2c_block_data', 'write_i2c_block_data', 'transfer',
+)
+_OP_CODES = dict((name, code) for code, name in enumerate(OPS))
+
+Transaction = namedtuple('Transaction', (
+    'time',       # monotonic start, seconds
+    'duration',   # seconds
+    'op',         # bus method name
+    'addr',       # I2C address
+    'register',   # first byte written, or None
+    'written',    # bytes
+    'read',       # bytes
+    'errno',      # of the IOError, or 0
+))
+
+
+def _wire(op, args):
+    """Return the bytes written and the number of bytes read by the bus
+    call op(addr, *args)."""
+    if op in ('write_quick', 'read_byte'):
+        return b'', 1 if op == 'read_byte' else 0
+    if op == 'write_byte':
+        return bytearray([args[0]]), 0
+    if op == 'read_byte_data':
+        return bytearray([args[0]]), 1
+    if op == 'write_byte_data':
+        return bytearray(args[:2]), 0
+    if op == 'read_word_data':
+        return bytearray([args[0]]), 2
+    if op == 'write_word_data':
+        return bytearray([args[0], args[1] & 0xFF, args[1] >> 8]), 0
+    if op == 'read_i2c_block_data':
+        return bytearray([args[0]]), args[1] if len(args) > 1 else 32
+    if op == 'write_i2c_block_data':
+        return bytearray([args[0]]) + bytearray(args[1]), 0
+    # transfer
+    return (bytearray(args[0]) if args else bytearray(),
+            args[1] if len(args) > 1 else 0)
+
+
+def _read_bytes(op, result):
+    if op in ('read_byte', 'read_byte_data'):
+        return bytearray([result])
+    if op == 'read_word_data':
+        return bytearray([result & 0xFF, result >> 8])
+    if op in ('read_i2c_block_data', 'transfer'):
+        return bytearray(result)
+    return bytearray()
+
+
+def _result(op, data):
+    """Inverse of _read_bytes()."""
+    if op in ('read_byte', 'read_byte_data'):
+        return data[0]
+    if op == 'read_word_data':
+        return data[0] | data[1] << 8
+    if op == 'read_i2c_block_data':
+        return list(data)
+    if op == 'transfer':
+        return bytearray(data)
+    return None
+
+
+def _recorded_method(name):
+    code = _OP_CODES[name]
+
+    def call(self, addr, *args):
+        # An AttributeError here (the bus has no such method) is no
+        # transaction.
+        method = getattr(self._bus, name)
+        written, length = _wire(name, args)
+        clock = self._clock
+        start = clock()
+        try:
+            result = method(addr, *args)
+        except IOError as e:
+            self._append(start, clock() - start, code, addr, written,
+                         bytearray(), e.errno or errno.EIO, length)
+            raise
+        self._append(start, clock() - start, code, addr, written,
+                     _read_bytes(name, result), 0, length)
+        return result
+    call.__name__ = name
+    return call
+
+
+class RecordingBus(object):
+    """Bus wrapper that appends every transaction on bus to the file at
+    path, e.g. SDL_DS3231.SDL_DS3231(bus=RecordingBus(bus, 'trace.bin')).
+    An existing recording is appended to, after cutting off a record
+    torn by a crash at its end. clock timestamps the transactions.
+    Anything else (locks, max_block, ...) is passed through to bus.
+    """
+
+    def __init__(self, bus, path, clock=SDL_DS3231._monotonic,
+            buffering=-1):
+        self._bus = bus
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with Recording(path) as recording:
+                end = recording.complete_size()
+            if end < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+        self._file = open(path, 'ab', buffering)
+        if not exists:
+            self._file.write(_FILE_HEADER.pack(
+                MAGIC, VERSION, getattr(bus, 'max_block', 32), 0))
+            # A Recording can map the file right away.
+            self._file.flush()
+        self.records = 0
+
+    def __getattr__(self, name):
+        return getattr(self._bus, name)
+
+    def _append(self, start, duration, code, addr, written, read, error,
+            length):
+        # A failed read keeps the length asked for, without payload.
+        record = _RECORD.pack(start, duration, code, addr,
+                              written[0] if written else NO_REGISTER,
+                              len(written), length if error else len(read),
+                              error)
+        # One write() per record, so that with buffering=0 a crash can
+        # only tear the record being written.
+        record += bytes(written) + bytes(read)
+        with self._lock:
+            self._file.write(record)
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+for _name in OPS:
+    setattr(RecordingBus, _name, _recorded_method(_name))
+del _name
+
+
+def _record_size(header):
+    """Return the size of a record, fixed header and payload."""
+    size = _RECORD.size + header[5]
+    if not header[7]:
+        size += header[6]
+    return size
+
+
+def _read_header(data):
+    """Return max_block of a file header."""
+    if len(data) < _FILE_HEADER.size:
+        raise ValueError('Not an I2C recording: file too short.')
+    magic, version, max_block, _ = _FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not an I2C recording: bad magic.')
+    if version != VERSION:
+        raise ValueError('Unsupported I2C recording version %i.' % version)
+    return max_block
+
+
+class Recording(object):
+    """A recording file, memory-mapped. Iterating yields Transactions;
+    headers() yields the fixed headers only, without copying payloads.
+    A record cut short at the end of the file (by a crash while writing)
+    is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.max_block = _read_header(self._map[:_FILE_HEADER.size])
+        self._offsets = None
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _scan(self):
+        """Yield (offset, header tuple) of every complete record."""
+        data = self._map
+        end = len(data)
+        offset = _FILE_HEADER.size
+        unpack_from = _RECORD.unpack_from
+        size = _RECORD.size
+        while offset + size <= end:
+            header = unpack_from(data, offset)
+            stop = offset + _record_size(header)
+            if stop > end:
+                break
+            yield offset, header
+            offset = stop
+
+    def headers(self):
+        """Yield (time, duration, op, addr, register, written length,
+        read length, errno) per record; op is the name, register None if
+        nothing was written."""
+        for _, (start, duration, code, addr, register, nw, nr,
+                error) in self._scan():
+            yield (start, duration, OPS[code], addr,
+                   None if register == NO_REGISTER else register, nw, nr,
+                   error)
+
+    def complete_size(self):
+        """Return the size of the file up to the end of its last complete
+        record."""
+        end = _FILE_HEADER.size
+        for offset, header in self._scan():
+            end = offset + _record_size(header)
+        return end
+
+    def offsets(self):
+        """Return the list of the record offsets, scanned once."""
+        if self._offsets is None:
+            self._offsets = [offset for offset, _ in self._scan()]
+        return self._offsets
+
+    def __len__(self):
+        return len(self.offsets())
+
+    def _transaction(self, offset):
+        data = self._map
+        (start, duration, code, addr, register, nw, nr,
+         error) = _RECORD.unpack_from(data, offset)
+        payload = offset + _RECORD.size
+        written = data[payload:payload + nw]
+        read = b'' if error else data[payload + nw:payload + nw + nr]
+        return Transaction(start, duration, OPS[code], addr,
+                           None if register == NO_REGISTER else register,
+                           written, read, error)
+
+    def __getitem__(self, index):
+        return self._transaction(self.offsets()[index])
+
+    def __iter__(self):
+        for offset, _ in self._scan():
+            yield self._transaction(offset)
+
+
+class ReplayBus(object):
+    """smbus.SMBus stand-in that answers the driver's calls from a
+    Recording (or the path of one), in order. Every call must match the
+    next record's op, address and bytes written, else ValueError is
+    raised. Recorded errors are raised again as IOError. max_block is
+    the recorded bus's, and transfer() is hidden unless the recording has
+    transfers, so the driver takes the same paths. monotonic() is the recorded time, for the clock
+    parameters of the other modules.
+    """
+
+    def __init__(self, recording):
+        self._owned = not isinstance(recording, Recording)
+        if self._owned:
+            recording = Recording(recording)
+        self._recording = recording
+        self._offsets = recording.offsets()
+        self._transfer = any(header[2] == 'transfer'
+                             for header in recording.headers())
+        self.max_block = recording.max_block
+        self.position = 0
+        self._time = 0.0
+
+    def __len__(self):
+        return len(self._offsets)
+
+    @property
+    def remaining(self):
+        return len(self._offsets) - self.position
+
+    def monotonic(self):
+        return self._time
+
+    def _replay(self, op, addr, args):
+        if self.position >= len(self._offsets):
+            raise ValueError('Replay is past the end of the recording.')
+        record = self._recording._transaction(self._offsets[self.position])
+        written, length = _wire(op, args)
+        if (record.op, record.addr, bytes(record.written)) != (
+                op, addr, bytes(written)):
+            raise ValueError(
+                'Replay diverged at record %i: recorded %s(0x%02x, %r), '
+                'called %s(0x%02x, %r).' % (
+                    self.position, record.op, record.addr,
+                    bytes(record.written), op, addr, bytes(written)))
+        self.position += 1
+        self._time = record.time + record.duration
+        if record.errno:
+            raise IOError(record.errno, os.strerror(record.errno))
+        return _result(op, record.read)
+
+    def close(self):
+        if self._owned:
+            self._recording.close()
+
+
+def _replayed_method(name):
+    def call(self, addr, *args):
+        return self._replay(name, addr, args)
+    call.__name__ = name
+    return call
+
+
+class _ReplayTransfer(object):
+    """ReplayBus.transfer, hidden if the recording has no transfers."""
+
+    _call = _replayed_method('transfer')
+
+    def __get__(self, bus, owner):
+        if bus is None:
+            return self._call
+        if not bus._transfer:
+            raise AttributeError('transfer')
+        return self._call.__get__(bus, owner)
+
+
+for _name in OPS[:-1]:
+    setattr(ReplayBus, _name, _replayed_method(_name))
+del _name
+ReplayBus.transfer = _ReplayTransfer()
+
+
+def analyze(recording, idle_threshold=0.01, top=10):
+    """Summarize a Recording (or the path of one). Return a dict:
+    transactions, span (first start to last end, seconds), busy (fraction
+    of the span with a transaction running), rate (mean transactions per
+    second) and peak_rate (most in one whole second), ops and errors
+    (Counters by op and errno), hot_registers ([((addr, register),
+    transactions, bytes)], busiest first), idle_gaps (count and total
+    of the gaps between transactions longer than idle_threshold) and
+    longest_gaps ([(start, length)]).
+    """
+    if not isinstance(recording, Recording):
+        with Recording(recording) as recording:
+            return analyze(recording, idle_threshold, top)
+    count = 0
+    busy = 0.0
+    first = last_end = None
+    per_second = Counter()
+    ops = Counter()
+    errors = Counter()
+    registers = Counter()
+    register_bytes = Counter()
+    gaps = []
+    idle_count = 0
+    idle_total = 0.0
+    for (start, duration, op, addr, register, nw, nr,
+         error) in recording.headers():
+        count += 1
+        busy += duration
+        if first is None:
+            first = start
+        else:
+            gap = start - last_end
+            if gap > idle_threshold:
+                idle_count += 1
+                idle_total += gap
+                gaps.append((gap, last_end))
+        last_end = max(last_end, start + duration) \
+            if last_end is not None else start + duration
+        per_second[int(start)] += 1
+        ops[op] += 1
+        if error:
+            errors[error] += 1
+        if register is not None:
+            registers[addr, register] += 1
+            register_bytes[addr, register] += nw + (0 if error else nr)
+    span = (last_end - first) if count else 0.0
+    gaps.sort(reverse=True)
+    return {
+        'transactions': count,
+        'span': span,
+        'busy': busy / span if span else None,
+        'rate': count / span if span else None,
+        'peak_rate': max(per_second.values()) if per_second else 0,
+        'ops': ops,
+        'errors': errors,
+        'hot_registers': [(key, n, register_bytes[key])
+                          for key, n in registers.most_common(top)],
+        'idle_gaps': (idle_count, idle_total),
+        'longest_gaps': [(start, gap) for gap, start in gaps[:top]],
+    }
+
+
+def format_analysis(summary):
+    """Return analyze()'s summary as printable text."""
+    s = summary
+    lines = [
+        'transactions   %i in %.3f s' % (s['transactions'], s['span']),
+        'rate           %s /s mean, %i /s peak' % (
+            '%.1f' % s['rate'] if s['rate'] is not None else '-',
+            s['peak_rate']),
+        'bus busy       %s' % (
+            '%.1f %%' % (100 * s['busy']) if s['busy'] is not None else '-'),
+        'idle gaps      %i, %.3f s in total' % s['idle_gaps'],
+        'ops            ' + ', '.join(
+            '%s %i' % item for item in s['ops'].most_common()),
+    ]
+    if s['errors']:
+        lines.append('errors         ' + ', '.join(
+            '%s %i' % (errno.errorcode.get(e, e), n)
+            for e, n in s['errors'].most_common()))
+    lines.append('hot registers')
+    for (addr, register), n, size in s['hot_registers']:
+        lines.append('  0x%02x 0x%02x  %8i transactions %10i bytes'
+                     % (addr, register, n, size))
+    lines.append('longest gaps')
+    for start, gap in s['longest_gaps']:
+        lines.append('  at %.6f  %.6f s' % (start, gap))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('usage: %s RECORDING' % sys.argv[0])
+        sys.exit(2)
+    print(format_analysis(analyze(sys.argv[1])))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_scheduler.py
+# Any number of one-shot and recurring alarms multiplexed onto one DS3231
+# hardware alarm.
+#
+# The pending alarms are kept in a heap ordered by deadline. Only the
+# nearest deadline is programmed into the RTC. When the RTC asserts INT,
+# call service(): it runs every callback that is due, reschedules the
+# recurring ones and programs the next deadline. Nothing polls in between.
+
+from __future__ import print_function
+
+from datetime import timedelta
+import heapq
+import itertools
+
+import SDL_DS3231
+
+# The DS3231 date match repeats every month, so deadlines further away than
+# this are reached through intermediate wake-ups.
+MAX_ALARM_DISTANCE = timedelta(days=27)
+
+
+class ScheduledAlarm(object):
+    """Handle returned by AlarmScheduler.schedule()."""
+
+    __slots__ = ('deadline', 'callback', 'interval', 'cancelled')
+
+    def __init__(self, deadline, callback, interval):
+        self.deadline = deadline
+        self.callback = callback
+        self.interval = interval
+        self.cancelled = False
+
+    def __repr__(self):
+        return 'ScheduledAlarm(%s, %r, interval=%r%s)' % (
+            self.deadline, self.callback, self.interval,
+            ', cancelled' if self.cancelled else '')
+
+
+class AlarmScheduler(object):
+    """Multiplex scheduled alarms onto hardware alarm alarmNumber.
+
+    Alarm 1 has one second resolution. Alarm 2 has no seconds register, so
+    its deadlines fire at the start of the following minute.
+    Callbacks are called as callback(alarm) with the ScheduledAlarm.
+    """
+
+    def __init__(self, rtc, alarmNumber=SDL_DS3231.SDL_DS3231.ALARM_1,
+            century=21):
+        self._rtc = rtc
+        self._alarm = alarmNumber
+        self._century = century
+        self._heap = []
+        self._counter = itertools.count()
+        self._programmed = None
+        self._started = False
+
+    def __len__(self):
+        return sum(1 for _, _, alarm in self._heap if not alarm.cancelled)
+
+    @property
+    def next_deadline(self):
+        """The nearest pending deadline, or None."""
+        self._drop_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    def now(self):
+        return self._rtc.read_datetime(self._century)
+
+    def schedule(self, when, callback, interval=None):
+        """Call callback at datetime when, and then every interval (a
+        timedelta) if given. Return a ScheduledAlarm handle for cancel().
+        """
+        if interval is not None and interval <= timedelta(0):
+            raise ValueError('interval must be positive.')
+        alarm = ScheduledAlarm(when, callback, interval)
+        first = not self._heap or when < self._heap[0][0]
+        self._push(alarm)
+        if first:
+            self._arm()
+        return alarm
+
+    def schedule_in(self, delay, callback, interval=None):
+        """Like schedule(), with the deadline delay (a timedelta or seconds)
+        from the RTC's current time."""
+        if not isinstance(delay, timedelta):
+            delay = timedelta(seconds=delay)
+        return self.schedule(self.now() + delay, callback, interval)
+
+    def cancel(self, alarm):
+        """Cancel a scheduled alarm. It is dropped from the heap lazily."""
+        alarm.cancelled = True
+        if self._heap and self._heap[0][2] is alarm:
+            self._arm()
+
+    def service(self):
+        """Run every due callback and program the next deadline. Call this
+        when the RTC asserts INT. Return the number of callbacks run."""
+        fired = 0
+        self._rtc.alarm(self._alarm)          # clear the flag
+        now = self.now()
+        while True:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, alarm = heapq.heappop(self._heap)
+                if alarm.cancelled:
+                    continue
+                if alarm.interval is not None:
+                    # Skip occurrences missed while the host was away.
+                    missed = (now - alarm.deadline) // alarm.interval
+                    alarm.deadline += alarm.interval * (missed + 1)
+                    self._push(alarm)
+                alarm.callback(alarm)
+                fired += 1
+            self._arm(now)
+            # A callback may have run past the next deadline. The RTC would
+            # then only match a month later, so catch up here.
+            now = self.now()
+            if not self._heap or self._heap[0][0] > now:
+                return fired
+
+    def _push(self, alarm):
+        heapq.heappush(self._heap, (alarm.deadline, next(self._counter), alarm))
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+
+    def _arm(self, now=None):
+        """Program the nearest deadline into the hardware alarm."""
+        rtc = self._rtc
+        self._drop_cancelled()
+        if not self._heap:
+            if self._programmed is not None:
+                rtc.alarmInterrupt(self._alarm, False)
+                self._programmed = None
+            return
+        if not self._started:
+            rtc.squareWave(rtc.SQWAVE_NONE)   # INT/SQW pin in INT mode
+            self._started = True
+        if now is None:
+            now = self.now()
+        # Something already due fires on the next second.
+        deadline = max(self._heap[0][0], now + timedelta(seconds=1))
+        if deadline - now > MAX_ALARM_DISTANCE:
+            deadline = now + MAX_ALARM_DISTANCE
+        setting = self._alarm_setting(deadline, now)
+        if setting != self._programmed:
+            rtc.setAlarm(*setting)
+            rtc.alarm(self._alarm)
+            if self._programmed is None:
+                rtc.alarmInterrupt(self._alarm, True)
+            self._programmed = setting
+
+    def _alarm_setting(self, deadline, now):
+        """Return the setAlarm() arguments matching deadline next, using the
+        least specific mask that is unambiguous."""
+        rtc = self._rtc
+        # The RTC counts whole seconds, so round the deadline up.
+        if deadline.microsecond:
+            deadline += timedelta(microseconds=1000000 - deadline.microsecond)
+        if self._alarm == rtc.ALARM_1:
+            masks = (rtc.ALM1_MATCH_SECONDS, rtc.ALM1_MATCH_MINUTES,
+                     rtc.ALM1_MATCH_HOURS, rtc.ALM1_MATCH_DATE)
+        else:
+            if deadline.second:
+                deadline += timedelta(seconds=60 - deadline.second)
+            masks = (rtc.ALM2_MATCH_MINUTES, rtc.ALM2_MATCH_MINUTES,
+                     rtc.ALM2_MATCH_HOURS, rtc.ALM2_MATCH_DATE)
+        delta = deadline - now
+        if delta < timedelta(minutes=1):
+            mask = masks[0]
+        elif delta < timedelta(hours=1):
+            mask = masks[1]
+        elif delta < timedelta(days=1):
+            mask = masks[2]
+        else:
+            mask = masks[3]
+        return (mask, deadline.second, deadline.minute, deadline.hour,
+                deadline.day)
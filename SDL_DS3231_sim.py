@@ -0,0 +1,526 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_sim.py
+# In-memory model of the DS3231 RTC and the AT24C32 EEPROM on an I2C bus.
+#
+# SimulatedBus has the smbus.SMBus methods the driver uses, so it can be
+# passed as SDL_DS3231.SDL_DS3231(bus=SimulatedBus()) on any machine.
+# Time is simulated: every transaction advances the bus clock by the time
+# it would take on the wire, so results are deterministic and the bus
+# statistics can be used to benchmark the driver.
+
+from __future__ import print_function
+
+from datetime import datetime
+import errno
+import time
+
+import SDL_DS3231
+from SDL_DS3231 import (
+    RTC_SECONDS, RTC_MINUTES, RTC_HOURS, RTC_DAY, RTC_DATE, RTC_MONTH,
+    RTC_YEAR, ALM1_SECONDS, ALM2_MINUTES, RTC_CONTROL, RTC_STATUS,
+    RTC_AGING, RTC_TEMP_MSB, RTC_TEMP_LSB, CENTURY, DYDT, INTCN, CONV,
+    RS1, A1IE, A2IE, OSF, EN32KHZ, BSY, A1F, A2F, bv)
+
+
+def _nack():
+    return IOError(errno.EREMOTEIO, 'Remote I/O error')
+
+
+def _from_bcd(b):
+    return (b >> 4) * 10 + (b & 0x0F)
+
+
+def _to_bcd(x):
+    return ((x // 10) << 4) | (x % 10)
+
+
+def wire_bits(written, read):
+    """Bits on the wire for a transaction writing and then reading the
+    given number of bytes: 9 bits per byte incl. ACK, plus START/STOP and
+    a repeated START before the read phase."""
+    bits = 2 + 9 * (1 + written)
+    if read:
+        bits += 1 + 9 * (1 + read)
+    return bits
+
+
+def _days_in_month(month, year):
+    if month == 2:
+        return 29 if year % 4 == 0 else 28   # DS3231 is valid 2000-2099
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
+class I2CDevice(object):
+    """Base class of the simulated devices. A transaction is a START, an
+    optional write phase and an optional read phase."""
+
+    def start(self, now):
+        """Called at the START of every transaction addressed to the device.
+        Raise an IOError to NACK the address."""
+
+    def write(self, data, now):
+        pass
+
+    def read(self, length, now):
+        return bytearray(length)
+
+    def stop(self, now):
+        """Called at the STOP of every transaction the device took part in.
+        """
+
+
+class DS3231Model(I2CDevice):
+    """Register level model of the DS3231.
+
+    Covers the time registers ticking with rollover (and the time buffer
+    latched on START), alarm 1/2 matching with the A1Mx/A2Mx mask bits,
+    the status flags and their clear-only semantics, the INT/SQW pin,
+    temperature conversions (every 64 s and on CONV, with BSY), and the
+    aging register, which trims the oscillator rate.
+
+    drift_ppm is the oscillator error before aging; each aging LSB slows
+    the clock by aging_ppm. temperature is the die temperature in degrees C.
+    """
+
+    CONVERSION_TIME = 0.125     # tCONV, seconds
+    CONVERSION_PERIOD = 64      # automatic conversions, seconds
+
+    def __init__(self, start=None, drift_ppm=0.0, temperature=25.0,
+            aging_ppm=0.1):
+        if start is None:
+            start = datetime(2000, 1, 1)
+        self.registers = bytearray(RTC_TEMP_LSB + 1)
+        self.registers[RTC_CONTROL] = bv(INTCN) | 0x18   # power-on state
+        self.registers[RTC_STATUS] = bv(OSF) | bv(EN32KHZ)
+        self.set_datetime(start)
+        self.drift_ppm = drift_ppm
+        self.aging_ppm = aging_ppm
+        self.temperature = temperature
+        self.listeners = []
+        self._pointer = 0
+        self._latched = None
+        self._now = 0.0
+        self._phase = 0.0
+        self._conversion_end = None
+        self._next_auto_conversion = 0.0
+        self._int_asserted = False
+        self._convert(0.0)
+        self._finish_conversion()
+
+    def set_datetime(self, dt):
+        """Load the time registers directly, bypassing the bus."""
+        r = self.registers
+        r[RTC_SECONDS] = _to_bcd(dt.second)
+        r[RTC_MINUTES] = _to_bcd(dt.minute)
+        r[RTC_HOURS] = _to_bcd(dt.hour)
+        r[RTC_DAY] = dt.isoweekday()
+        r[RTC_DATE] = _to_bcd(dt.day)
+        r[RTC_MONTH] = _to_bcd(dt.month)
+        r[RTC_YEAR] = _to_bcd(dt.year % 100)
+
+    def datetime(self, century=21):
+        """Return the current time registers as a datetime."""
+        r = self.registers
+        return datetime(
+            100 * (century - 1) + _from_bcd(r[RTC_YEAR]),
+            _from_bcd(r[RTC_MONTH] & 0x1F), _from_bcd(r[RTC_DATE]),
+            _from_bcd(r[RTC_HOURS] & 0x3F), _from_bcd(r[RTC_MINUTES]),
+            _from_bcd(r[RTC_SECONDS] & 0x7F))
+
+    @property
+    def rate(self):
+        """Oscillator rate relative to true time."""
+        aging = self.registers[RTC_AGING]
+        if aging & 0x80:
+            aging -= 0x100
+        return 1.0 + (self.drift_ppm - self.aging_ppm * aging) * 1e-6
+
+    @property
+    def int_asserted(self):
+        """True while the INT pin is driven low by an enabled alarm."""
+        control = self.registers[RTC_CONTROL]
+        status = self.registers[RTC_STATUS]
+        if not control & bv(INTCN):
+            return False
+        return bool(control & status & (bv(A1IE) | bv(A2IE)))
+
+    def power_cycle(self):
+        """Simulate a loss of power: the oscillator stop flag gets set."""
+        self.registers[RTC_STATUS] |= bv(OSF)
+
+    def _notify(self, edge, when):
+        for listener in list(self.listeners):
+            listener(edge, when)
+
+    def _convert(self, now):
+        self.registers[RTC_STATUS] |= bv(BSY)
+        self._conversion_end = now + self.CONVERSION_TIME
+        self._next_auto_conversion = now + self.CONVERSION_PERIOD
+
+    def _finish_conversion(self):
+        t4 = int(round(self.temperature * 4))
+        self.registers[RTC_TEMP_MSB] = (t4 >> 2) & 0xFF
+        self.registers[RTC_TEMP_LSB] = (t4 & 0x03) << 6
+        self.registers[RTC_STATUS] &= ~bv(BSY) & 0xFF
+        self.registers[RTC_CONTROL] &= ~bv(CONV) & 0xFF
+        self._conversion_end = None
+
+    def advance(self, now):
+        """Run the oscillator up to simulated time now."""
+        if now <= self._now:
+            return
+        if self._conversion_end is not None and now >= self._conversion_end:
+            self._finish_conversion()
+        if self._conversion_end is None and now >= self._next_auto_conversion:
+            self._convert(self._next_auto_conversion)
+            if now >= self._conversion_end:
+                self._finish_conversion()
+        self._phase += (now - self._now) * self.rate
+        self._now = now
+        while self._phase >= 1.0:
+            self._phase -= 1.0
+            self._tick()
+            when = now - self._phase / self.rate
+            control = self.registers[RTC_CONTROL]
+            if not control & bv(INTCN) and not (control >> RS1) & 0x03:
+                self._notify('sqw', when)
+            self._update_int(when)
+
+    def _update_int(self, when):
+        asserted = self.int_asserted
+        if asserted and not self._int_asserted:
+            self._notify('int', when)
+        self._int_asserted = asserted
+
+    def _tick(self):
+        """Advance the time registers by one second and match the alarms."""
+        r = self.registers
+        seconds = _from_bcd(r[RTC_SECONDS] & 0x7F) + 1
+        if seconds >= 60:
+            seconds = 0
+            minutes = _from_bcd(r[RTC_MINUTES]) + 1
+            if minutes >= 60:
+                minutes = 0
+                hours = _from_bcd(r[RTC_HOURS] & 0x3F) + 1
+                if hours >= 24:
+                    hours = 0
+                    self._next_day()
+                r[RTC_HOURS] = _to_bcd(hours)
+            r[RTC_MINUTES] = _to_bcd(minutes)
+        r[RTC_SECONDS] = _to_bcd(seconds)
+        if self._alarm_matches(ALM1_SECONDS, True):
+            r[RTC_STATUS] |= bv(A1F)
+        if seconds == 0 and self._alarm_matches(ALM2_MINUTES, False):
+            r[RTC_STATUS] |= bv(A2F)
+
+    def _next_day(self):
+        r = self.registers
+        r[RTC_DAY] = r[RTC_DAY] % 7 + 1
+        century = r[RTC_MONTH] & bv(CENTURY)
+        month = _from_bcd(r[RTC_MONTH] & 0x1F)
+        year = _from_bcd(r[RTC_YEAR])
+        date = _from_bcd(r[RTC_DATE]) + 1
+        if date > _days_in_month(month, year):
+            date = 1
+            month += 1
+            if month > 12:
+                month = 1
+                year += 1
+                if year > 99:
+                    year = 0
+                    century ^= bv(CENTURY)
+        r[RTC_DATE] = _to_bcd(date)
+        r[RTC_MONTH] = _to_bcd(month) | century
+        r[RTC_YEAR] = _to_bcd(year)
+
+    def _alarm_matches(self, register, has_seconds):
+        """Compare an alarm against the time. A field takes part in the
+        match only if its mask bit (bit 7) is clear."""
+        r = self.registers
+        alarm = list(r[register:register + (4 if has_seconds else 3)])
+        if not has_seconds:
+            alarm.insert(0, 0)     # alarm 2 matches at seconds == 00
+        seconds, minutes, hours, daydate = alarm
+        if not seconds & 0x80 and (seconds & 0x7F) != r[RTC_SECONDS]:
+            return False
+        if not minutes & 0x80 and (minutes & 0x7F) != r[RTC_MINUTES]:
+            return False
+        if not hours & 0x80 and (hours & 0x3F) != r[RTC_HOURS] & 0x3F:
+            return False
+        if not daydate & 0x80:
+            if daydate & bv(DYDT):
+                return (daydate & 0x0F) == r[RTC_DAY]
+            return (daydate & 0x3F) == r[RTC_DATE]
+        return True
+
+    def start(self, now):
+        self.advance(now)
+        self._latched = None
+
+    def write(self, data, now):
+        if not data:
+            return
+        self._pointer = data[0]
+        for value in data[1:]:
+            self._write_register(self._pointer, value, now)
+            self._pointer = (self._pointer + 1) % len(self.registers)
+        self._update_int(now)
+
+    def _write_register(self, register, value, now):
+        r = self.registers
+        if register == RTC_STATUS:
+            flags = bv(OSF) | bv(A2F) | bv(A1F)
+            r[register] = ((r[register] & bv(BSY)) | (value & bv(EN32KHZ)) |
+                           (r[register] & value & flags))
+        elif register == RTC_CONTROL:
+            start = value & bv(CONV) and not r[RTC_STATUS] & bv(BSY)
+            r[register] = value | (r[register] & bv(CONV))
+            if start:
+                self._convert(now)
+        elif register in (RTC_TEMP_MSB, RTC_TEMP_LSB):
+            pass      # read only
+        else:
+            r[register] = value
+            if register == RTC_SECONDS:
+                # Writing the seconds register resets the countdown chain.
+                self._phase = 0.0
+
+    def read(self, length, now):
+        if self._latched is None:
+            # The time registers are copied to a buffer on START.
+            self._latched = bytearray(self.registers)
+        data = bytearray()
+        for _ in range(length):
+            if self._pointer <= RTC_YEAR:
+                data.append(self._latched[self._pointer])
+            else:
+                data.append(self.registers[self._pointer])
+            self._pointer = (self._pointer + 1) % len(self.registers)
+        return data
+
+
+class AT24C32Model(I2CDevice):
+    """Model of the AT24C32 4 KB EEPROM: two byte addressing, 32 byte page
+    writes that wrap within the page, a self-timed write cycle during
+    which the chip NACKs, and sequential reads across the whole array.
+    page_writes counts the write cycles of every page."""
+
+    SIZE = 4096
+    PAGE_SIZE = 32
+
+    def __init__(self, write_cycle=0.010):
+        self.memory = bytearray(b'\xff' * self.SIZE)
+        self.write_cycle = write_cycle
+        self.page_writes = [0] * (self.SIZE // self.PAGE_SIZE)
+        self._pointer = 0
+        self._busy_until = 0.0
+        self._writing = False
+
+    def start(self, now):
+        if now < self._busy_until:
+            raise _nack()
+
+    def write(self, data, now):
+        if len(data) < 2:
+            return        # incomplete address, nothing changes
+        address = ((data[0] << 8) | data[1]) % self.SIZE
+        self._pointer = address
+        payload = data[2:]
+        if not payload:
+            return
+        base = address - address % self.PAGE_SIZE
+        offset = address % self.PAGE_SIZE
+        for value in payload:
+            self.memory[base + offset] = value
+            offset = (offset + 1) % self.PAGE_SIZE
+        self._pointer = base + offset
+        self.page_writes[base // self.PAGE_SIZE] += 1
+        self._writing = True
+
+    def stop(self, now):
+        # The write cycle starts at the STOP.
+        if self._writing:
+            self._writing = False
+            self._busy_until = now + self.write_cycle
+
+    def read(self, length, now):
+        data = bytearray()
+        for _ in range(length):
+            data.append(self.memory[self._pointer])
+            self._pointer = (self._pointer + 1) % self.SIZE
+        return data
+
+
+class TCA9548AModel(I2CDevice):
+    """Model of the TCA9548A 8 channel I2C mux. The control register
+    connects the channels of its set bits; the devices on them, in
+    channels[n] as {addr: device}, then answer on the upstream bus.
+    writes counts the writes of the control register."""
+
+    def __init__(self):
+        self.control = 0
+        self.channels = [{} for _ in range(8)]
+        self.writes = 0
+
+    def write(self, data, now):
+        if data:
+            self.control = data[-1]
+            self.writes += 1
+
+    def read(self, length, now):
+        return bytearray([self.control] * length)
+
+    def devices(self):
+        """Yield every device on every channel."""
+        for channel in self.channels:
+            for device in channel.values():
+                yield device
+
+    def route(self, addr):
+        """Return the device at addr on a connected channel, or None."""
+        for n, channel in enumerate(self.channels):
+            if self.control & (1 << n) and addr in channel:
+                return channel[addr]
+        return None
+
+
+class SimulatedBus(object):
+    """smbus.SMBus stand-in carrying a DS3231Model and an AT24C32Model.
+
+    Every transaction advances the simulated clock (self.time, seconds) by
+    its wire time at bus_hz plus overhead seconds, and is counted in
+    transactions, bytes_written, bytes_read, bus_time, nacks and the
+    per-method counts in ops. With realtime=True the caller is also put to
+    sleep for that long. A TCA9548AModel in devices puts the devices of its
+    connected channels on the bus.
+    """
+
+    def __init__(self, bus_hz=100000, overhead=0.0, start=None,
+            addr=0x68, at24c32_addr=0x56, max_block=32, realtime=False,
+            **ds3231_options):
+        self.bus_hz = bus_hz
+        self.overhead = overhead
+        self.max_block = max_block
+        self.realtime = realtime
+        self.time = 0.0
+        self.rtc = DS3231Model(start, **ds3231_options)
+        self.eeprom = AT24C32Model()
+        self.devices = {addr: self.rtc, at24c32_addr: self.eeprom}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.transactions = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.bus_time = 0.0
+        self.nacks = 0
+        self.ops = {}
+
+    def transaction_time(self, written, read):
+        """Wire time of a transaction writing and then reading the given
+        number of bytes."""
+        return wire_bits(written, read) / float(self.bus_hz) + self.overhead
+
+    def advance(self, seconds):
+        """Let simulated time pass without bus traffic."""
+        self.time += seconds
+        for device in self._all_devices():
+            if hasattr(device, 'advance'):
+                device.advance(self.time)
+
+    def _all_devices(self):
+        for device in self.devices.values():
+            yield device
+            if isinstance(device, TCA9548AModel):
+                for downstream in device.devices():
+                    yield downstream
+
+    def _route(self, addr):
+        device = self.devices.get(addr)
+        if device is not None:
+            return device
+        for mux in self.devices.values():
+            if isinstance(mux, TCA9548AModel):
+                device = mux.route(addr)
+                if device is not None:
+                    return device
+        return None
+
+    sleep = advance
+
+    def monotonic(self):
+        return self.time
+
+    def transfer(self, addr, write=b'', read=0, op='transfer'):
+        """Run one I2C transaction: write the bytes in write, then (after
+        a repeated START) read read bytes. Return the bytes read."""
+        write = bytearray(write)
+        self.transactions += 1
+        self.ops[op] = self.ops.get(op, 0) + 1
+        device = self._route(addr)
+        try:
+            if device is None:
+                raise _nack()
+            device.start(self.time)
+        except IOError:
+            # The transaction ends after the address byte.
+            self.nacks += 1
+            duration = self.transaction_time(0, 0)
+            self.bus_time += duration
+            self.advance(duration)
+            raise
+        duration = self.transaction_time(len(write), read)
+        self.bus_time += duration
+        device.write(write, self.time)
+        data = device.read(read, self.time) if read else bytearray()
+        self.bytes_written += len(write)
+        self.bytes_read += len(data)
+        if self.realtime:
+            time.sleep(duration)
+        self.advance(duration)
+        device.stop(self.time)
+        return data
+
+    def _check_block(self, length):
+        if not 0 < length <= self.max_block:
+            raise OverflowError(
+                'Block length must be between 1 and %i.' % self.max_block)
+
+    #  smbus.SMBus interface
+    def write_quick(self, addr):
+        self.transfer(addr, op='write_quick')
+
+    def read_byte(self, addr):
+        return self.transfer(addr, read=1, op='read_byte')[0]
+
+    def write_byte(self, addr, value):
+        self.transfer(addr, [value], op='write_byte')
+
+    def read_byte_data(self, addr, cmd):
+        return self.transfer(addr, [cmd], 1, op='read_byte_data')[0]
+
+    def write_byte_data(self, addr, cmd, value):
+        self.transfer(addr, [cmd, value], op='write_byte_data')
+
+    def read_i2c_block_data(self, addr, cmd, length=32):
+        self._check_block(length)
+        return list(self.transfer(
+            addr, [cmd], length, op='read_i2c_block_data'))
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self._check_block(len(vals))
+        self.transfer(addr, [cmd] + list(vals), op='write_i2c_block_data')
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    bus = SimulatedBus(start=datetime(2017, 9, 16, 6, 29, 50))
+    rtc = SDL_DS3231.SDL_DS3231(bus=bus)
+    print('DS3231 = %s  Temp = %s' % (rtc.read_datetime(), rtc.getTemp()))
+    bus.advance(15)
+    print('DS3231 = %s after 15 s' % rtc.read_datetime())
+    print('%i transactions, %.3f ms on the bus'
+          % (bus.transactions, bus.bus_time * 1000))
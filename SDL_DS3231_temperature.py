@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+# SDL_DS3231_temperature.py
+# The DS3231 as an enclosure temperature sensor.
+#
+# TemperatureSampler keeps the last capacity samples in preallocated
+# array('f') / array('d') ring buffers, so sampling allocates nothing and
+# the statistics run over the arrays with the C-level builtins (min, max,
+# sum, map) instead of Python loops.
+
+from __future__ import print_function
+
+from array import array
+import operator
+import time
+
+
+class TemperatureSampler(object):
+    """Ring buffer of (time, degrees C) samples of one DS3231.
+
+    With convert=True every sample forces a conversion and waits for it
+    (about 125 ms); otherwise it returns the result of the last automatic
+    conversion, which the DS3231 does every 64 s. clock gives the sample
+    times, sleep is used while waiting for a conversion.
+    """
+
+    def __init__(self, rtc, capacity=1024, convert=False, clock=time.time,
+            sleep=time.sleep):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1.')
+        self._rtc = rtc
+        self.convert = convert
+        self._clock = clock
+        self._sleep = sleep
+        self._values = array('f', bytes(4 * capacity))
+        # Times relative to an early sample keep the sums exact enough.
+        self._times = array('d', bytes(8 * capacity))
+        self._t0 = None
+        self._next = 0
+        self._count = 0
+
+    @property
+    def capacity(self):
+        return len(self._values)
+
+    def __len__(self):
+        return self._count
+
+    def sample(self):
+        """Read the temperature and store it. Return it."""
+        value = self._rtc.getTemp(self.convert, self._sleep)
+        self.add(self._clock(), value)
+        return value
+
+    def add(self, timestamp, value):
+        """Store a sample taken elsewhere."""
+        if self._t0 is None:
+            self._t0 = timestamp
+        i = self._next
+        self._values[i] = value
+        self._times[i] = timestamp - self._t0
+        self._next = (i + 1) % len(self._values)
+        if self._count < len(self._values):
+            self._count += 1
+        elif not self._next:
+            self._rebase()
+
+    def _rebase(self):
+        """Make the times relative to the oldest sample again, once per lap,
+        so that they stay small for slope()."""
+        times = self._times
+        offset = times[0]
+        for i in range(len(times)):
+            times[i] -= offset
+        self._t0 += offset
+
+    def clear(self):
+        self._t0 = None
+        self._next = 0
+        self._count = 0
+
+    def run(self, interval, count=None):
+        """Sample every interval seconds, count times or forever."""
+        n = 0
+        deadline = self._clock()
+        while count is None or n < count:
+            self.sample()
+            n += 1
+            deadline += interval
+            delay = deadline - self._clock()
+            if delay > 0:
+                self._sleep(delay)
+
+    def _filled(self, buffer):
+        if self._count < len(buffer):
+            return buffer[:self._count]
+        return buffer
+
+    def values(self):
+        """Return the samples, oldest first, as an array('f')."""
+        if self._count < len(self._values):
+            return self._values[:self._count]
+        return self._values[self._next:] + self._values[:self._next]
+
+    def times(self):
+        """Return the sample times, oldest first, as a list."""
+        if self._count < len(self._times):
+            times = self._times[:self._count]
+        else:
+            times = self._times[self._next:] + self._times[:self._next]
+        return [t + self._t0 for t in times]
+
+    def latest(self):
+        """Return the newest sample, or None."""
+        if not self._count:
+            return None
+        return self._values[self._next - 1]
+
+    def min(self):
+        return min(self._filled(self._values)) if self._count else None
+
+    def max(self):
+        return max(self._filled(self._values)) if self._count else None
+
+    def mean(self):
+        if not self._count:
+            return None
+        return sum(self._filled(self._values)) / self._count
+
+    def slope(self):
+        """Return the least squares trend in degrees C per second, or None
+        with fewer than two samples at different times."""
+        n = self._count
+        if n < 2:
+            return None
+        values = self._filled(self._values)
+        times = self._filled(self._times)
+        st = sum(times)
+        sv = sum(values)
+        stt = sum(map(operator.mul, times, times))
+        stv = sum(map(operator.mul, times, values))
+        d = n * stt - st * st
+        if not d:
+            return None
+        return (n * stv - st * sv) / d
+
+    def stats(self):
+        """Return a dict with count, latest, min, max, mean and slope."""
+        return {
+            'count': self._count,
+            'latest': self.latest(),
+            'min': self.min(),
+            'max': self.max(),
+            'mean': self.mean(),
+            'slope': self.slope(),
+        }
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#
+# Benchmark SDL_DS3231
+#
+# Runs every public driver method against the simulated bus (default) or a
+# real I2C bus and reports, per call: I2C transactions, bytes moved, modeled
+# bus time at 100 kHz and 400 kHz, and Python CPU time. Results are written
+# as JSON so two versions of the driver can be compared:
+#
+#   python benchmarkSDL_DS3231.py -o before.json
+#   ... change the driver ...
+#   python benchmarkSDL_DS3231.py -o after.json --compare before.json
+#
+# With --bus N the real bus N is used. EEPROM writes are skipped on real
+# hardware unless --eeprom-writes is given, since they overwrite its
+# contents. On the simulated bus the CPU time includes the simulator.
+
+from __future__ import print_function
+
+import argparse
+from datetime import datetime
+import json
+import platform
+import sys
+import time
+
+import SDL_DS3231
+import SDL_DS3231_sim
+
+FORMAT_VERSION = 1
+
+
+class CountingBus(object):
+    """Wraps an smbus.SMBus-like bus and counts transactions, bytes and
+    wire bits. NACKed transactions count as an address byte only.
+    transfer(), max_block and sleep are there if bus has them, so the
+    driver takes the same paths as on bus itself."""
+
+    def __init__(self, bus):
+        self._bus = bus
+        for name in ('max_block', 'sleep'):
+            if hasattr(bus, name):
+                setattr(self, name, getattr(bus, name))
+        if hasattr(bus, 'transfer'):
+            self.transfer = self._transfer
+        self.reset()
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.bits = 0
+
+    def _call(self, method, written, read, *args):
+        self.transactions += 1
+        try:
+            result = getattr(self._bus, method)(*args)
+        except IOError:
+            self.bits += SDL_DS3231_sim.wire_bits(0, 0)
+            raise
+        self.bytes_written += written
+        self.bytes_read += read
+        self.bits += SDL_DS3231_sim.wire_bits(written, read)
+        return result
+
+    def write_quick(self, addr):
+        return self._call('write_quick', 0, 0, addr)
+
+    def read_byte(self, addr):
+        return self._call('read_byte', 0, 1, addr)
+
+    def write_byte(self, addr, value):
+        return self._call('write_byte', 1, 0, addr, value)
+
+    def read_byte_data(self, addr, cmd):
+        return self._call('read_byte_data', 1, 1, addr, cmd)
+
+    def write_byte_data(self, addr, cmd, value):
+        return self._call('write_byte_data', 2, 0, addr, cmd, value)
+
+    def read_i2c_block_data(self, addr, cmd, length=32):
+        return self._call(
+            'read_i2c_block_data', 1, length, addr, cmd, length)
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        return self._call(
+            'write_i2c_block_data', 1 + len(vals), 0, addr, cmd, vals)
+
+    def _transfer(self, addr, write=b'', read=0):
+        write = bytearray(write)
+        return self._call('transfer', len(write), read, addr, write, read)
+
+
+def _cases(rtc, eeprom_writes):
+    """Return a list of (name, iterations, function)."""
+    dt = datetime(2017, 9, 16, 6, 29, 50)
+    page = bytearray(range(32))
+    chip = bytearray(i & 0xFF for i in range(rtc.AT24C32_SIZE))
+    cases = [
+        ('read_all', 100, rtc.read_all),
+        ('read_datetime', 100, rtc.read_datetime),
+        ('snapshot', 100, rtc.snapshot),
+        ('write_datetime', 100, lambda: rtc.write_datetime(dt)),
+        ('getTemp', 100, rtc.getTemp),
+        ('setAlarm', 100,
+         lambda: rtc.setAlarm(rtc.ALM1_MATCH_HOURS, 0, 30, 6, 0)),
+        ('alarm', 100, lambda: rtc.alarm(rtc.ALARM_1)),
+        ('alarmInterrupt', 100, lambda: rtc.alarmInterrupt(rtc.ALARM_1, True)),
+        ('squareWave', 100, lambda: rtc.squareWave(rtc.SQWAVE_NONE)),
+        ('oscStopped', 100, lambda: rtc.oscStopped(False)),
+        ('read_AT24C32_byte', 100, lambda: rtc.read_AT24C32_byte(0x100)),
+        ('read_AT24C32_block_32', 20, lambda: rtc.read_AT24C32_block(0, 32)),
+        ('read_AT24C32_all', 1, rtc.read_AT24C32_all),
+    ]
+    if eeprom_writes:
+        cases += [
+            ('write_AT24C32_byte', 20,
+             lambda: rtc.write_AT24C32_byte(0x100, 0x5A)),
+            ('write_AT24C32_block_32', 20,
+             lambda: rtc.write_AT24C32_block(0, page)),
+            ('write_AT24C32_block_4096', 1,
+             lambda: rtc.write_AT24C32_block(0, chip)),
+        ]
+    return cases
+
+
+def run(rtc, counter, eeprom_writes=True, sim=None):
+    """Run every case and return {name: per call metrics}."""
+    results = {}
+    process_time = getattr(time, 'process_time', time.time)
+    for name, iterations, function in _cases(rtc, eeprom_writes):
+        counter.reset()
+        sim_start = sim.time if sim is not None else None
+        cpu = process_time()
+        for _ in range(iterations):
+            function()
+        cpu = process_time() - cpu
+        result = {
+            'calls': iterations,
+            'transactions': counter.transactions / float(iterations),
+            'bytes_written': counter.bytes_written / float(iterations),
+            'bytes_read': counter.bytes_read / float(iterations),
+            'bus_ms_100khz': counter.bits / 100.0 / iterations,
+            'bus_ms_400khz': counter.bits / 400.0 / iterations,
+            'cpu_us': cpu * 1e6 / iterations,
+        }
+        if sim is not None:
+            # Includes EEPROM write cycles spent ACK polling.
+            result['sim_ms'] = (sim.time - sim_start) * 1000 / iterations
+        results[name] = result
+    return results
+
+
+def compare(old, new):
+    """Print the change of the main metrics between two result files."""
+    metrics = ('transactions', 'bus_ms_100khz', 'cpu_us')
+    print('%-26s' % 'method' + ''.join('%28s' % m for m in metrics))
+    for name in sorted(new['results']):
+        if name not in old['results']:
+            continue
+        a = old['results'][name]
+        b = new['results'][name]
+        cells = []
+        for metric in metrics:
+            cell = '%.4g -> %.4g' % (a[metric], b[metric])
+            if a[metric]:
+                cell += ' (%+.0f%%)' % (100.0 * (b[metric] / a[metric] - 1))
+            cells.append('%28s' % cell)
+        print('%-26s' % name + ''.join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the SDL_DS3231 driver.')
+    parser.add_argument('--bus', type=int,
+                        help='benchmark the real I2C bus N instead of the '
+                             'simulated bus')
+    parser.add_argument('--eeprom-writes', action='store_true',
+                        help='also benchmark EEPROM writes on a real bus')
+    parser.add_argument('-o', '--output', help='write JSON results here')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    args = parser.parse_args(argv)
+
+    sim = None
+    if args.bus is None:
+        sim = SDL_DS3231_sim.SimulatedBus(
+            start=datetime(2017, 9, 16, 6, 29, 50))
+        counter = CountingBus(sim)
+        eeprom_writes = True
+    else:
+        import smbus
+        counter = CountingBus(smbus.SMBus(args.bus))
+        eeprom_writes = args.eeprom_writes
+    rtc = SDL_DS3231.SDL_DS3231(bus=counter)
+
+    report = {
+        'format': FORMAT_VERSION,
+        'bus': 'simulated' if sim is not None else 'i2c-%i' % args.bus,
+        'python': platform.python_version(),
+        'results': run(rtc, counter, eeprom_writes, sim),
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,7 @@
 # *                                                                             *
 # * Set Alarm 1 to occur once a minute at 5 seconds after the minute.           *
 # * Configure the RTC INT/SQW pin to be asserted when alarm match occurs.       *
-# * Detect the alarm by polling the INT/SQW pin.                                *
+# * Wait for the alarm on the INT/SQW pin with an AlarmDispatcher.              *
 # *                                                                             *
 # * Hardware:                                                                   *
 # * Raspberry Pi, DS3231 RTC.                                                   *
@@ -26,14 +26,16 @@ import sys
 import time
 
 import SDL_DS3231
+import SDL_DS3231_dispatcher
 
 ALARM_PIN = 7
 _rtc = None
+_source = None
 
 # Handle ctrl-c from user and clean up
 def sig_handler(signum, frame):
     global _rtc
-    GPIO.remove_event_detect(ALARM_PIN)
+    _source.close()
     GPIO.cleanup()
     clearRTCAlarms(_rtc)
     print("Quitting...")
@@ -50,17 +52,18 @@ def clearRTCAlarms(rtc):
     rtc.squareWave(rtc.SQWAVE_NONE)
 
 
+def on_alarm(alarmNumber):
+    print("%s ALARM_%i %s" % (time.time(), alarmNumber, _rtc.read_str()))
+
+
 def main():
     global _rtc
+    global _source
 
     signal.signal(signal.SIGINT, sig_handler)
 
-    # Setup the GPIO pins
-    GPIO.setmode(GPIO.BOARD)
-    GPIO.setup(ALARM_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-    # Add event handler to trigger when INT/SQW pin goes low
-    GPIO.add_event_detect(ALARM_PIN, GPIO.FALLING)
+    # Setup the GPIO pin, the dispatcher wakes up when INT/SQW goes low
+    _source = SDL_DS3231_dispatcher.GPIOEdgeSource(ALARM_PIN)
 
     _rtc = SDL_DS3231.SDL_DS3231(1, 0x68)
     clearRTCAlarms(_rtc)
@@ -79,11 +82,10 @@ def main():
 
     print("%s Start %s" % (time.time(), _rtc.read_str()))
 
-    while True:
-        if GPIO.event_detected(ALARM_PIN):  # check to see if the INT/SQW pin triggered, i.e. an alarm has occurred
-            print("Event Detected on Pin %s" % ALARM_PIN)
-            if ( _rtc.alarm(_rtc.ALARM_1) ): # reset the alarm flag
-                print("%s ALARM_1 %s" % (time.time(), _rtc.read_str()))
+    # sleep until the INT/SQW pin goes low, then reset the alarm flag and call on_alarm
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(_rtc, _source)
+    dispatcher.register(_rtc.ALARM_1, on_alarm)
+    dispatcher.run()
 
 
 if __name__ == "__main__":
@@ -4,7 +4,7 @@
 # * DS3231/DS3232 Alarm Example #3                                              *
 # *                                                                             *
 # * Set Alarm 1 to occur every 10 seconds.                                      *
-# * Detect the alarm by polling the RTC alarm flag.                             *
+# * Detect the alarm by checking the RTC alarm flag once a second.              *
 # * Note that the RTC does not have an alarm mode for every 10 seconds, so      *
 # * after an alarm occurs, we reset the alarm register to the current           *
 # * time plus ten seconds.                                                      *
@@ -24,6 +24,7 @@ import sys
 import time
 
 import SDL_DS3231
+import SDL_DS3231_dispatcher
 
 ALARM_PIN = 7
 _rtc = None
@@ -48,6 +49,17 @@ def clearRTCAlarms(rtc):
     rtc.squareWave(rtc.SQWAVE_NONE)
 
 
+def on_alarm(alarmNumber):
+    # get the current time
+    t = _rtc.read_datetime()
+    # calculate the next alarm time
+    alarmTime = t + datetime.timedelta(seconds=ALARM_INTERVAL)
+    # set the alarm
+    _rtc.setAlarm(_rtc.ALM1_MATCH_HOURS, alarmTime.second, alarmTime.minute,
+                    alarmTime.hour, 0)
+    print("%s ALARM_1 %s" % (time.time(), _rtc.read_str()))
+
+
 def main():
     global _rtc
 
@@ -69,17 +81,11 @@ def main():
 
     print("%s Start %s" % (time.time(), _rtc.read_str()))
 
-    while True:
-        # check to see if the alarm flag is set (also resets the flag if set)
-        if ( _rtc.alarm(_rtc.ALARM_1) ):
-            # get the current time
-            t = _rtc.read_datetime()
-            # calculate the next alarm time
-            alarmTime = t + datetime.timedelta(seconds=ALARM_INTERVAL)
-            # set the alarm
-            _rtc.setAlarm(_rtc.ALM1_MATCH_HOURS, alarmTime.second, alarmTime.minute,
-                            alarmTime.hour, 0)
-            print("%s ALARM_1 %s" % (time.time(), _rtc.read_str()))
+    # check the alarm flag once a second (also resets the flag if set)
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(
+        _rtc, SDL_DS3231_dispatcher.PollingSource(1.0))
+    dispatcher.register(_rtc.ALARM_1, on_alarm)
+    dispatcher.run()
 
 
 if __name__ == "__main__":
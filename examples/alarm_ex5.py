@@ -4,7 +4,7 @@
 # * DS3231/DS3232 Alarm Example #5                                              *
 # *                                                                             *
 # * Set Alarm 2 to occur once per minute.                                       *
-# * Detect the alarm by polling the RTC alarm flag.                             *
+# * Detect the alarm by checking the RTC alarm flag once a second.              *
 # *                                                                             *
 # * Hardware:                                                                   *
 # * Raspberry Pi, DS3231 RTC.                                                   *
@@ -21,6 +21,7 @@ import sys
 import time
 
 import SDL_DS3231
+import SDL_DS3231_dispatcher
 
 _rtc = None
 
@@ -42,6 +43,10 @@ def clearRTCAlarms(rtc):
     rtc.squareWave(rtc.SQWAVE_NONE)
 
 
+def on_alarm(alarmNumber):
+    print("%s ALARM_%i %s" % (time.time(), alarmNumber, _rtc.read_str()))
+
+
 def main():
     global _rtc
 
@@ -60,10 +65,11 @@ def main():
 
     print("%s Start %s" % (time.time(), _rtc.read_str()))
 
-    while True:
-        # check to see if the alarm flag is set (also resets the flag if set)
-        if ( _rtc.alarm(_rtc.ALARM_2) ):
-            print("%s ALARM_2 %s" % (time.time(), _rtc.read_str()))
+    # check the alarm flag every second (also resets the flag if set)
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(
+        _rtc, SDL_DS3231_dispatcher.PollingSource(1.0))
+    dispatcher.register(_rtc.ALARM_2, on_alarm)
+    dispatcher.run()
 
 
 if __name__ == "__main__":
@@ -41,20 +41,20 @@ import sys
 import time
 
 import SDL_DS3231
+import SDL_DS3231_dispatcher
 
 ALARM_PIN = 7
 _rtc = None
-_is_interrupt_triggered = False
+_source = None
 
-# Code when interrupt happens this method is called
-def interrupt_handler(pin):
-    global _is_interrupt_triggered
-    _is_interrupt_triggered = True
+# Code when an alarm happens this method is called
+def alarm_handler(alarmNumber):
+    print("%s ALARM_%i %s" % (time.time(), alarmNumber, _rtc.read_str()))
 
 # Handle ctrl-c from user and clean up
 def sig_handler(signum, frame):
     global _rtc
-    GPIO.remove_event_detect(ALARM_PIN)
+    _source.close()
     GPIO.cleanup()
     clearRTCAlarms(_rtc)
     print("Quitting...")
@@ -78,8 +78,8 @@ def raspberryPiTimeSet(rtc):
 
 
 def main():
-    global _is_interrupt_triggered
     global _rtc
+    global _source
 
     signal.signal(signal.SIGINT, sig_handler)
 
@@ -87,14 +87,8 @@ def main():
     clearRTCAlarms(_rtc)
     raspberryPiTimeSet(_rtc)
 
-    # Setup the GPIO pins
-    GPIO.setmode(GPIO.BOARD)
-    GPIO.setup(ALARM_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-    # Add event handler to trigger when INT/SQW pin goes low
-    GPIO.add_event_detect(ALARM_PIN, GPIO.FALLING)
-    # Add event call back, when pin goes low call interrupt_handler method
-    GPIO.add_event_callback(ALARM_PIN, interrupt_handler)
+    # Setup the GPIO pin, the dispatcher wakes up when INT/SQW goes low
+    _source = SDL_DS3231_dispatcher.GPIOEdgeSource(ALARM_PIN)
 
     # set alarm 1 for 20 seconds after every minute
     _rtc.setAlarm(_rtc.ALM1_MATCH_SECONDS, 20, 0, 0, 1) #  daydate parameter should be between 1 and 7
@@ -108,14 +102,12 @@ def main():
 
     print("%s Start %s" % (time.time(), _rtc.read_str()))
 
-    while True:
-        if (_is_interrupt_triggered):
-            if ( _rtc.alarm(_rtc.ALARM_1) ):
-                print("%s ALARM_1 %s" % (time.time(), _rtc.read_str()))
-            if ( _rtc.alarm(_rtc.ALARM_2) ):
-                print("%s ALARM_2 %s" % (time.time(), _rtc.read_str()))
-
-            _is_interrupt_triggered = False
+    # sleep until the INT/SQW pin goes low, then reset the flags of the
+    # alarms that fired and call alarm_handler for each of them
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(_rtc, _source)
+    dispatcher.register(_rtc.ALARM_1, alarm_handler)
+    dispatcher.register(_rtc.ALARM_2, alarm_handler)
+    dispatcher.run()
 
 
 if __name__ == "__main__":
@@ -5,7 +5,8 @@
 # *                                                                             *
 # * Set Alarm 2 to occur at a given time hh:mm.                                 *
 # * Configure the RTC INT/SQW pin to be asserted when alarm match occurs.       *
-# * Detect the alarm by polling the INT/SQW pin.                                *
+# * Wait for the alarm on the INT/SQW pin with an AlarmDispatcher.              *
+# * Alarm 1 fires every second to print the time.                               *
 # *                                                                             *
 # * Hardware:                                                                   *
 # * Raspberry Pi, DS3231 RTC.                                                   *
@@ -24,15 +25,16 @@ import sys
 import time
 
 import SDL_DS3231
+import SDL_DS3231_dispatcher
 
 ALARM_PIN = 7
 _rtc = None
-_tLast = None
+_source = None
 
 # Handle ctrl-c from user and clean up
 def sig_handler(signum, frame):
     global _rtc
-    GPIO.remove_event_detect(ALARM_PIN)
+    _source.close()
     GPIO.cleanup()
     clearRTCAlarms(_rtc)
     print("Quitting...")
@@ -49,27 +51,33 @@ def clearRTCAlarms(rtc):
     rtc.squareWave(rtc.SQWAVE_NONE)
 
 
+# print the time, called every second by Alarm 1
+def on_tick(alarmNumber):
+    print(_rtc.read_str())
+
+def on_alarm(alarmNumber):
+    print("%s ALARM_2 %s" % (time.time(), _rtc.read_str()))
+
+
 def main():
     global _rtc
-    global _tLast
+    global _source
 
     signal.signal(signal.SIGINT, sig_handler)
 
     _rtc = SDL_DS3231.SDL_DS3231(1, 0x68)
     clearRTCAlarms(_rtc)
 
-    # Setup the GPIO pins
-    GPIO.setmode(GPIO.BOARD)
-    GPIO.setup(ALARM_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-    # Add event handler to trigger when INT/SQW pin goes low
-    GPIO.add_event_detect(ALARM_PIN, GPIO.FALLING)
+    # Setup the GPIO pin, the dispatcher wakes up when INT/SQW goes low
+    _source = SDL_DS3231_dispatcher.GPIOEdgeSource(ALARM_PIN)
 
     # set the RTC time to 06:29:50
     _rtc.write_all(seconds=50, minutes=29, hours=6, date=16, month=9, year=(2017-1970), save_as_24h=True)
 
     # set Alarm 2 for 06:30:00
     _rtc.setAlarm(_rtc.ALM2_MATCH_HOURS, 0, 30, 6, 0)
+    # set Alarm 1 to occur once per second
+    _rtc.setAlarm(_rtc.ALM1_EVERY_SECOND, 0, 0, 0, 0)
     # clear the alarm flags
     _rtc.alarm(_rtc.ALARM_1)
     _rtc.alarm(_rtc.ALARM_2)
@@ -77,27 +85,18 @@ def main():
     # configure the INT/SQW pin for "interrupt" operation (disable square wave output)
     _rtc.squareWave(_rtc.SQWAVE_NONE)
 
-    # enable interrupt output for Alarm 2 only
-    _rtc.alarmInterrupt(_rtc.ALARM_1, False)
+    # enable interrupt output for both alarms
+    _rtc.alarmInterrupt(_rtc.ALARM_1, True)
     _rtc.alarmInterrupt(_rtc.ALARM_2, True)
 
     print("%s Start %s" % (time.time(), _rtc.read_str()))
 
-    while True:
-        # check to see if the INT/SQW pin is low, i.e. an alarm has occurred
-        if GPIO.event_detected(ALARM_PIN):
-            # check to see if the alarm flag is set (also resets the flag if set)
-            if ( _rtc.alarm(_rtc.ALARM_2) ):
-                print("%s ALARM_2 %s" % (time.time(), _rtc.read_str()))
-
-        # print the time when it changes
-        now = _rtc.read_datetime()
-        if _tLast is None:
-            _tLast = now
-        if ( now != _tLast ):
-            _tLast = now
-            print(_rtc.read_str())
-
+    # sleep until the INT/SQW pin goes low, i.e. an alarm has occurred,
+    # then reset the alarm flags that are set and call the handlers
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(_rtc, _source)
+    dispatcher.register(_rtc.ALARM_1, on_tick)
+    dispatcher.register(_rtc.ALARM_2, on_alarm)
+    dispatcher.run()
 
 
 if __name__ == "__main__":
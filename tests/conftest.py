@@ -0,0 +1,24 @@
+# Shared fixtures of the tests. They run on SDL_DS3231_sim.SimulatedBus and
+# the other fakes, so no I2C hardware is needed.
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import SDL_DS3231
+import SDL_DS3231_sim
+
+
+@pytest.fixture
+def sim():
+    return SDL_DS3231_sim.SimulatedBus(start=datetime(2017, 9, 16, 6, 29, 50))
+
+
+@pytest.fixture
+def rtc(sim):
+    return SDL_DS3231.SDL_DS3231(bus=sim)
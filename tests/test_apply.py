@@ -0,0 +1,29 @@
+import SDL_DS3231
+
+
+def test_apply_writes_only_changes(rtc, sim):
+    config = SDL_DS3231.AlarmConfig(
+        alarm1=(rtc.ALM1_MATCH_HOURS, 30, 15, 6, 1),
+        alarm2=(rtc.ALM2_MATCH_MINUTES, 0, 45, 0, 1),
+        alarm1_interrupt=True, alarm2_interrupt=False,
+        square_wave=rtc.SQWAVE_NONE)
+    assert rtc.apply(config)
+    assert rtc.read_alarm_config() == config
+
+    sim.reset_stats()
+    assert rtc.apply(config) == []
+    assert sim.transactions == 1
+
+    sim.reset_stats()
+    written = rtc.apply(SDL_DS3231.AlarmConfig(
+        alarm2=(rtc.ALM2_MATCH_MINUTES, 0, 50, 0, 1)))
+    assert written == [(SDL_DS3231.ALM2_MINUTES, 1)]
+    assert sim.transactions == 2
+    assert rtc.read_alarm_config().alarm1 == config.alarm1
+
+
+def test_apply_leaves_none_fields(rtc):
+    rtc.alarmInterrupt(rtc.ALARM_2, True)
+    rtc.apply(SDL_DS3231.AlarmConfig(alarm1_interrupt=True))
+    config = rtc.read_alarm_config()
+    assert config.alarm1_interrupt and config.alarm2_interrupt
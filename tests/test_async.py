@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+import SDL_DS3231_async
+import SDL_DS3231_dispatcher
+
+
+def test_alarm_events_use_the_bus_thread(rtc, sim):
+    threads = set()
+    invalidate = rtc.invalidate_shadow
+
+    def record(*args, **kwargs):
+        threads.add(threading.current_thread().name)
+        return invalidate(*args, **kwargs)
+    rtc.invalidate_shadow = record
+
+    async def main():
+        source = SDL_DS3231_dispatcher.FakeEdgeSource(sim)
+        async with SDL_DS3231_async.AsyncDS3231(rtc) as arc:
+            await arc.setAlarm(rtc.ALM1_EVERY_SECOND, 0, 0, 0, 0)
+            await arc.alarmInterrupt(rtc.ALARM_1, True)
+            await arc.alarm(rtc.ALARM_1)
+            events = arc.alarm_events(source, (rtc.ALARM_1,))
+            await arc._run(sim.advance, 1.0)
+            fired = await events.__anext__()
+            await events.aclose()
+        source.close()
+        return fired
+
+    assert asyncio.run(main()) == rtc.ALARM_1
+    assert threads and all(name.startswith('DS3231') for name in threads)
+
+
+def test_eeprom_write_and_read(rtc, sim):
+    # The polls sleep in real time, which the simulator doesn't see.
+    sim.eeprom.write_cycle = 0.0
+
+    async def main():
+        async with SDL_DS3231_async.AsyncDS3231(rtc) as arc:
+            await arc.eeprom.write(30, b'across a page')
+            return await arc.eeprom.read(30, 13)
+
+    assert bytes(asyncio.run(main())) == b'across a page'
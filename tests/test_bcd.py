@@ -0,0 +1,59 @@
+import pytest
+
+import SDL_DS3231
+
+
+def _decode(b):
+    # Arithmetic decoding, and the string based codec it replaced.
+    tens, ones = b >> 4, b & 0x0F
+    if tens > 9 or ones > 9:
+        return None
+    assert int('%x' % b) == tens * 10 + ones
+    return tens * 10 + ones
+
+
+def _encode(x):
+    assert int(str(x), 0x10) == (x // 10) * 16 + x % 10
+    return (x // 10) * 16 + x % 10
+
+
+def test_tables_match_arithmetic():
+    for b in range(0x100):
+        assert SDL_DS3231._BCD_DECODE[b] == _decode(b)
+        if _decode(b) is not None:
+            assert SDL_DS3231.bcd_to_int(b) == _decode(b)
+    for x in range(100):
+        assert SDL_DS3231._BCD_ENCODE[x] == _encode(x)
+        assert SDL_DS3231.int_to_bcd(x) == _encode(x)
+        assert SDL_DS3231.bcd_to_int(SDL_DS3231.int_to_bcd(x)) == x
+
+
+def test_block_codec():
+    values = list(range(100))
+    data = SDL_DS3231.ints_to_bcd(values)
+    assert list(data) == [_encode(x) for x in values]
+    assert SDL_DS3231.bcd_to_ints(data) == values
+    assert SDL_DS3231.bcd_to_ints([0x59, 0x23]) == [59, 23]
+
+
+def test_multi_digit():
+    assert SDL_DS3231.int_to_bcd(2017, 0) == 0x2017
+    assert SDL_DS3231.int_to_bcd(2017, 3) == 0x017
+    assert SDL_DS3231.bcd_to_int(0x2017, 0) == 2017
+    assert SDL_DS3231.bcd_to_int(0x2017, 3) == 17
+
+
+@pytest.mark.parametrize('bcd', [0x1A, 0xA1, 0xFF, -1])
+def test_bad_bcd_raises(bcd):
+    with pytest.raises(ValueError):
+        SDL_DS3231.bcd_to_int(bcd)
+
+
+def test_bad_block_raises():
+    with pytest.raises(ValueError, match='offset 1'):
+        SDL_DS3231.bcd_to_ints([0x12, 0x1A])
+    for value in (100, -1):
+        with pytest.raises(ValueError):
+            SDL_DS3231.ints_to_bcd([1, value])
+    with pytest.raises(ValueError):
+        SDL_DS3231.int_to_bcd(-1)
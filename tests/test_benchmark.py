@@ -0,0 +1,19 @@
+import benchmarkSDL_DS3231
+import SDL_DS3231
+
+
+class _PlainBus(object):
+    def read_byte_data(self, addr, cmd):
+        return 0
+
+
+def test_counting_bus_passes_capabilities_through(sim):
+    counter = benchmarkSDL_DS3231.CountingBus(sim)
+    assert counter.max_block == sim.max_block
+    rtc = SDL_DS3231.SDL_DS3231(bus=counter)
+    rtc.read_AT24C32_all()
+    assert counter.transactions == 1
+
+    plain = benchmarkSDL_DS3231.CountingBus(_PlainBus())
+    assert not hasattr(plain, 'transfer')
+    assert not hasattr(plain, 'max_block')
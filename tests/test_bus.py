@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+import SDL_DS3231
+import SDL_DS3231_bus
+import SDL_DS3231_sim
+
+RTC = 0x68
+REGISTER = SDL_DS3231.ALM1_SECONDS
+
+
+class SlowBus(object):
+    """SimulatedBus whose byte reads give the other threads a chance to
+    run between a read and the write that follows it."""
+
+    def __init__(self, sim):
+        self._sim = sim
+        self.write_byte_data = sim.write_byte_data
+        self.on_read = None
+
+    def read_byte_data(self, addr, cmd):
+        value = self._sim.read_byte_data(addr, cmd)
+        if self.on_read is not None:
+            self.on_read()
+        time.sleep(0.0002)
+        return value
+
+
+@pytest.fixture
+def slow(sim):
+    return SlowBus(sim)
+
+
+def _run_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_modify_byte_data_loses_no_update(sim, slow):
+    bus = SDL_DS3231_bus.SharedBus(slow)
+    sim.rtc.registers[REGISTER] = 0
+
+    def toggle(bit):
+        def run():
+            for _ in range(20):
+                bus.modify_byte_data(RTC, REGISTER, set=1 << bit)
+                bus.modify_byte_data(RTC, REGISTER, clear=1 << bit)
+            bus.modify_byte_data(RTC, REGISTER, set=1 << bit)
+        return run
+    _run_threads([toggle(bit) for bit in range(8)])
+    assert sim.rtc.registers[REGISTER] == 0xFF
+
+
+def test_batch_runs_in_order_under_device_lock(sim, slow):
+    bus = SDL_DS3231_bus.SharedBus(slow)
+    held = []
+
+    def probe():
+        # Another thread can take neither lock while the batch runs.
+        def run():
+            device = bus.device_lock(RTC).acquire(False)
+            held.append(not device)
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    slow.on_read = probe
+
+    batch = bus.batch(RTC)
+    batch.write_byte_data(RTC, REGISTER, 0x12)
+    batch.read_byte_data(RTC, REGISTER)
+    batch.modify_byte_data(RTC, REGISTER, clear=0x0F, set=0x05)
+    batch.read_byte_data(RTC, REGISTER)
+    assert len(batch) == 4
+    assert batch.run() == [None, 0x12, 0x12, 0x15]
+    assert len(batch) == 0
+    assert held == [True, True, True]
+
+
+def test_batch_blocks_other_threads(sim, slow):
+    bus = SDL_DS3231_bus.SharedBus(slow)
+    sim.rtc.registers[REGISTER] = 0
+    results = []
+
+    def batches():
+        for _ in range(20):
+            batch = bus.batch(RTC)
+            batch.write_byte_data(RTC, REGISTER, 0x55)
+            batch.read_byte_data(RTC, REGISTER)
+            batch.write_byte_data(RTC, REGISTER, 0)
+            results.append(batch.run()[1])
+
+    def modifies():
+        for _ in range(20):
+            bus.modify_byte_data(RTC, REGISTER, set=0x80)
+            bus.modify_byte_data(RTC, REGISTER, clear=0x80)
+    _run_threads([batches, modifies])
+    assert results == [0x55] * 20
+
+
+def test_get_bus_returns_one_bus(monkeypatch):
+    opened = []
+
+    class FakeSMBus(object):
+        def SMBus(self, twi):
+            opened.append(twi)
+            time.sleep(0.001)
+            return SDL_DS3231_sim.SimulatedBus()
+    monkeypatch.setattr(SDL_DS3231_bus, 'smbus', FakeSMBus())
+    monkeypatch.setattr(SDL_DS3231_bus, '_buses', {})
+
+    buses = []
+    _run_threads([lambda: buses.append(SDL_DS3231_bus.get_bus(7))] * 8)
+    assert opened == [7]
+    assert all(bus is buses[0] for bus in buses)
+    assert isinstance(buses[0], SDL_DS3231_bus.SharedBus)
+    assert SDL_DS3231_bus.get_bus(8) is not buses[0]
+    assert opened == [7, 8]
@@ -0,0 +1,79 @@
+import errno
+from datetime import datetime
+
+import pytest
+
+import SDL_DS3231
+import SDL_DS3231_calibration
+import SDL_DS3231_eventlog
+import SDL_DS3231_sim
+
+
+class _Source(object):
+    """An edge every second of simulated time."""
+
+    def __init__(self, sim, fail_after=None):
+        self._sim = sim
+        self._fail_after = fail_after
+        self.edges = 0
+
+    def wait(self, timeout=None):
+        if self.edges == self._fail_after:
+            raise KeyboardInterrupt()
+        self._sim.advance(1.0)
+        self.edges += 1
+        return True
+
+
+def test_polling_drift():
+    sim = SDL_DS3231_sim.SimulatedBus(start=datetime(2020, 1, 1),
+                                      drift_ppm=50.0)
+    rtc = SDL_DS3231.SDL_DS3231(bus=sim)
+    drift = SDL_DS3231_calibration.measure_drift(
+        rtc, 1000, clock=sim.monotonic, sleep=sim.advance)
+    assert drift == pytest.approx(50.0, abs=2.0)
+
+
+@pytest.mark.parametrize('fail_after', [None, 3])
+def test_sqw_measurement_restores_interrupts(rtc, sim, fail_after):
+    rtc.squareWave(rtc.SQWAVE_NONE)
+    rtc.alarmInterrupt(rtc.ALARM_1, True)
+    before = rtc.read_alarm_config()
+    source = _Source(sim, fail_after)
+    if fail_after is None:
+        SDL_DS3231_calibration.measure_drift(rtc, 20, source=source,
+                                             clock=sim.monotonic)
+    else:
+        with pytest.raises(KeyboardInterrupt):
+            SDL_DS3231_calibration.measure_drift(rtc, 20, source=source,
+                                                 clock=sim.monotonic)
+    assert rtc.read_alarm_config() == before
+
+
+def test_second_boundary_times_out():
+    class StoppedRTC(object):
+        def read_all(self):
+            return (20, 1, 1, 1, 0, 0, 0)
+
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    with pytest.raises(IOError) as e:
+        SDL_DS3231_calibration._second_boundary(
+            StoppedRTC(), lambda: now[0], sleep, 0.001)
+    assert e.value.errno == errno.ETIMEDOUT
+
+
+def test_history_and_default_log_are_disjoint(rtc):
+    log = SDL_DS3231_eventlog.EventLog(rtc)
+    history = SDL_DS3231_calibration.CalibrationHistory(rtc)
+    calibration = SDL_DS3231_calibration.Calibration(
+        1500000000, 1.5, 0, 15, 600, 25.25)
+    history.append(calibration)
+    for i in range(log.slots + 5):
+        log.append(b'%i' % i)
+    log.flush()
+    assert list(SDL_DS3231_calibration.CalibrationHistory(rtc)) == [
+        calibration]
@@ -0,0 +1,45 @@
+import SDL_DS3231_dispatcher
+
+
+def test_dispatch_on_sim_edge(rtc, sim):
+    source = SDL_DS3231_dispatcher.FakeEdgeSource(sim)
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(rtc, source)
+    fired = []
+    dispatcher.register(rtc.ALARM_1, fired.append)
+    rtc.setAlarm(rtc.ALM1_EVERY_SECOND, 0, 0, 0, 0)
+    rtc.alarmInterrupt(rtc.ALARM_1, True)
+
+    assert dispatcher.run_once(timeout=0) == []
+    sim.advance(1.0)
+    assert sim.rtc.int_asserted
+    assert dispatcher.run_once(timeout=0) == [rtc.ALARM_1]
+    assert fired == [rtc.ALARM_1]
+    assert not sim.rtc.int_asserted
+
+    source.close()
+    sim.advance(1.0)
+    assert dispatcher.run_once(timeout=0) == []
+    assert fired == [rtc.ALARM_1]
+
+
+def test_unwatched_alarm_flag_is_kept(rtc, sim):
+    source = SDL_DS3231_dispatcher.FakeEdgeSource(sim)
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(rtc, source)
+    dispatcher.register(rtc.ALARM_1, lambda n: None)
+    rtc.setAlarm(rtc.ALM1_EVERY_SECOND, 0, 0, 0, 0)
+    rtc.setAlarm(rtc.ALM2_EVERY_MINUTE, 0, 0, 0, 0)
+    rtc.alarmInterrupt(rtc.ALARM_1, True)
+    sim.advance(10.0)
+    assert dispatcher.run_once(timeout=0) == [rtc.ALARM_1]
+    # Alarm 2 has no callback, so its flag is left for someone else.
+    assert rtc.alarm(rtc.ALARM_2)
+
+
+def test_stop_from_callback(rtc, sim):
+    source = SDL_DS3231_dispatcher.FakeEdgeSource(sim)
+    dispatcher = SDL_DS3231_dispatcher.AlarmDispatcher(rtc, source)
+    rtc.setAlarm(rtc.ALM1_EVERY_SECOND, 0, 0, 0, 0)
+    rtc.alarmInterrupt(rtc.ALARM_1, True)
+    sim.advance(1.0)
+    dispatcher.register(rtc.ALARM_1, lambda n: dispatcher.stop())
+    dispatcher.run()
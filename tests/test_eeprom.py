@@ -0,0 +1,39 @@
+import errno
+
+import pytest
+
+import SDL_DS3231
+
+
+def test_buffer_read_error_leaves_page_unloaded(rtc, sim, monkeypatch):
+    sim.eeprom.memory[0:4] = b'\x11\x22\x33\x44'
+    buf = SDL_DS3231.AT24C32Buffer(rtc)
+
+    def fail(length, now):
+        raise IOError(errno.EIO, 'injected')
+    monkeypatch.setattr(sim.eeprom, 'read', fail)
+    with pytest.raises(IOError):
+        buf[0:4]
+    monkeypatch.undo()
+
+    assert buf[0:4] == b'\x11\x22\x33\x44'
+    buf[0] = 0
+    assert buf.dirty_pages == [0]
+    buf.flush()
+    assert sim.eeprom.memory[0:4] == b'\x00\x22\x33\x44'
+
+
+def test_buffer_getbuffer(rtc, sim):
+    sim.eeprom.memory[100] = 0x5A
+    view = SDL_DS3231.AT24C32Buffer(rtc).getbuffer()
+    assert view.readonly
+    assert view[100] == 0x5A
+    assert len(view) == rtc.AT24C32_SIZE
+
+
+def test_write_polls_a_few_times_per_cycle(rtc, sim):
+    data = bytearray(range(256)) * 16
+    rtc.write_AT24C32_block(0, data)
+    cycles = sum(sim.eeprom.page_writes)
+    assert sim.ops['read_byte'] <= 3 * cycles
+    assert rtc.read_AT24C32_all() == bytes(data)
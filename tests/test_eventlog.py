@@ -0,0 +1,33 @@
+import SDL_DS3231_eventlog
+
+
+def _log(rtc):
+    return SDL_DS3231_eventlog.EventLog(rtc, start=0, size=256,
+                                        record_size=16)
+
+
+def test_wrap_and_mount(rtc):
+    log = _log(rtc)
+    log.format()
+    assert log.latest() is None
+    for i in range(40):
+        assert log.append(b'%i' % i) == i
+    log.flush()
+
+    mounted = _log(rtc)
+    assert mounted.slots == 16
+    assert mounted.latest() == (39, b'39')
+    assert [seq for seq, _ in mounted] == list(range(24, 40))
+    assert mounted.append(b'40') == 40
+
+
+def test_mount_skips_torn_record(rtc, sim):
+    log = _log(rtc)
+    log.format()
+    for i in range(20):
+        log.append(b'%i' % i)
+    log.flush()
+    # Record 19 is in slot 3; damage its payload.
+    sim.eeprom.memory[3 * 16 + 6] ^= 0xFF
+    mounted = _log(rtc)
+    assert mounted.latest() == (18, b'18')
@@ -0,0 +1,56 @@
+import pytest
+
+import SDL_DS3231
+import SDL_DS3231_i2cdev
+
+RTC_ADDR = 0x68
+EEPROM_ADDR = 0x56
+
+
+@pytest.fixture
+def ioctl(sim):
+    return SDL_DS3231_i2cdev.FakeIoctl(sim)
+
+
+@pytest.fixture
+def bus(ioctl):
+    return SDL_DS3231_i2cdev.I2CDevBus(ioctl=ioctl)
+
+
+def test_transfer_is_one_transaction(sim, ioctl, bus):
+    sim.eeprom.memory[0x100:0x104] = b'\x01\x02\x03\x04'
+    assert bus.transfer(EEPROM_ADDR, b'\x01\x00', 4) == \
+        bytearray(b'\x01\x02\x03\x04')
+    assert ioctl.calls == 1
+    assert sim.transactions == 1
+
+    seconds = bus.read_byte_data(RTC_ADDR, 0x00)
+    assert seconds == 0x50
+
+
+def test_rdwr_combined(sim, bus):
+    data, = bus.rdwr((RTC_ADDR, [0x00]),
+                     (RTC_ADDR, 3))
+    assert data == bytearray(b'\x50\x29\x06')
+
+
+def test_driver_uses_transfer(sim, ioctl, bus):
+    rtc = SDL_DS3231.SDL_DS3231(bus=bus)
+    sim.reset_stats()
+    ioctl.calls = 0
+    assert len(rtc.read_AT24C32_all()) == rtc.AT24C32_SIZE
+    assert ioctl.calls == 1
+    assert sim.transactions == 1
+
+    rtc.write_AT24C32_block(0x20, b'hello')
+    assert bytes(sim.eeprom.memory[0x20:0x25]) == b'hello'
+    assert rtc.read_datetime() == sim.rtc.datetime()
+
+
+def test_errors(bus):
+    with pytest.raises(OverflowError):
+        bus.transfer(EEPROM_ADDR, b'\x00\x00', 9000)
+    with pytest.raises(IOError):
+        bus.transfer(0x42, b'\x00', 1)
+    with pytest.raises(IOError):
+        bus._ioctl(None, 0x0703, None)
@@ -0,0 +1,36 @@
+import SDL_DS3231
+import SDL_DS3231_bus
+import SDL_DS3231_metrics
+
+
+class _NoTransfer(object):
+    """A bus like smbus.SMBus, without combined transactions."""
+
+    def __init__(self, bus):
+        self._bus = bus
+
+    def __getattr__(self, name):
+        if name == 'transfer':
+            raise AttributeError(name)
+        return getattr(self._bus, name)
+
+
+def test_transfer_probe_is_no_transaction(sim):
+    bus = SDL_DS3231_bus.SharedBus(_NoTransfer(sim))
+    rtc = SDL_DS3231.SDL_DS3231(bus=bus)
+    metrics = SDL_DS3231_metrics.Metrics(clock=sim.monotonic)
+    metrics.attach(rtc)
+    assert rtc.read_AT24C32_block(0, 4) == b'\xff' * 4
+    assert sum(metrics.errors.values()) == 0
+    assert 'transfer' not in metrics.latency
+    metrics.detach(rtc)
+
+
+def test_report_skips_empty_register_counters(rtc, sim):
+    metrics = SDL_DS3231_metrics.Metrics(clock=sim.monotonic)
+    metrics.attach(rtc)
+    rtc.read_datetime()
+    report = metrics.report()
+    assert 'registers read: ' in report
+    assert 'registers written' not in report
+    assert metrics.transactions['read_datetime'] == 1
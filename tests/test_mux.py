@@ -0,0 +1,75 @@
+import threading
+
+import SDL_DS3231
+import SDL_DS3231_bus
+import SDL_DS3231_mux
+import SDL_DS3231_sim
+
+
+def _muxed(sim):
+    model = SDL_DS3231_sim.TCA9548AModel()
+    model.channels[1][0x68] = sim.devices.pop(0x68)
+    sim.devices[SDL_DS3231_mux.MUX_ADDR] = model
+    bus = SDL_DS3231_bus.SharedBus(sim)
+    return SDL_DS3231_mux.Mux(bus), model
+
+
+def test_batch_groups_by_channel(sim):
+    mux, model = _muxed(sim)
+    model.channels[2][0x68] = SDL_DS3231_sim.DS3231Model()
+    batch = mux.batch()
+    for channel in (1, 2, 1, 2):
+        batch.channel(channel).read_byte_data(0x68, SDL_DS3231.RTC_CONTROL)
+    assert len(batch.run()) == 4
+    assert mux.switches == 2
+
+
+def test_batch_call_does_not_deadlock_with_driver_lock(sim):
+    # A driver method holds the device lock and then wants the bus lock;
+    # run() must not hold the bus lock while it waits for the device lock.
+    mux, _ = _muxed(sim)
+    rtc = SDL_DS3231.SDL_DS3231(bus=mux.channel(1))
+    in_call = threading.Event()
+    results = []
+
+    def snapshot():
+        in_call.set()
+        return rtc.snapshot()
+
+    def run_batch():
+        batch = mux.batch()
+        batch.call(1, snapshot)
+        results.extend(batch.run())
+
+    def interrupt():
+        with rtc._lock:
+            batch_thread.start()
+            in_call.wait(5)
+            rtc.alarmInterrupt(rtc.ALARM_1, True)
+        results.append('interrupt')
+
+    batch_thread = threading.Thread(target=run_batch)
+    batch_thread.daemon = True
+    interrupt_thread = threading.Thread(target=interrupt)
+    interrupt_thread.daemon = True
+    interrupt_thread.start()
+    interrupt_thread.join(5)
+    batch_thread.join(5)
+    assert not interrupt_thread.is_alive()
+    assert not batch_thread.is_alive()
+    assert len(results) == 2
+
+
+def test_fleet_shares_the_mux(sim):
+    import SDL_DS3231_fleet
+    mux, model = _muxed(sim)
+    model.channels[2][0x68] = SDL_DS3231_sim.DS3231Model()
+    shared = SDL_DS3231_mux.get_mux(mux.bus)
+    rtc = SDL_DS3231.SDL_DS3231(bus=shared.channel(2))
+    with SDL_DS3231_fleet.FleetReader([(mux.bus, 0x68, 1)]) as fleet:
+        assert fleet.mux(mux.bus) is shared
+        rtc.read_all()
+        assert fleet.read().errors == 0
+        rtc.write_aging(5, convert=False)
+    assert model.channels[2][0x68].registers[SDL_DS3231.RTC_AGING] == 5
+    assert model.channels[1][0x68].registers[SDL_DS3231.RTC_AGING] == 0
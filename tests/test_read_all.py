@@ -0,0 +1,51 @@
+import errno
+
+import pytest
+
+import SDL_DS3231
+
+
+class ByteBus(object):
+    """A bus adapter with byte transfers only."""
+
+    def __init__(self, sim):
+        self.read_byte_data = sim.read_byte_data
+        self.write_byte_data = sim.write_byte_data
+
+
+def _eopnotsupp(*args):
+    raise IOError(errno.EOPNOTSUPP, 'Operation not supported')
+
+
+def test_burst_read(sim, rtc):
+    assert rtc.read_all() == (17, 9, 16, 6, 6, 29, 50)
+    assert sim.transactions == 1
+    assert sim.ops == {'read_i2c_block_data': 1}
+    assert rtc.read_datetime() == sim.rtc.datetime()
+
+
+def test_fallback_on_eopnotsupp(sim, rtc, monkeypatch):
+    monkeypatch.setattr(sim, 'read_i2c_block_data', _eopnotsupp)
+    assert rtc.read_all() == (17, 9, 16, 6, 6, 29, 50)
+    # Two agreeing passes of seven byte reads.
+    assert sim.ops['read_byte_data'] == 14
+    assert not rtc._burst
+    sim.reset_stats()
+    rtc.read_all()
+    assert sim.ops == {'read_byte_data': 14}
+
+
+def test_fallback_without_block_reads(sim):
+    rtc = SDL_DS3231.SDL_DS3231(bus=ByteBus(sim))
+    assert rtc.read_datetime() == sim.rtc.datetime()
+    assert not rtc._burst
+
+
+def test_transient_error_is_raised(sim, rtc, monkeypatch):
+    def eio(*args):
+        raise IOError(errno.EIO, 'Input/output error')
+    monkeypatch.setattr(sim, 'read_i2c_block_data', eio)
+    with pytest.raises(IOError):
+        rtc.read_all()
+    assert rtc._burst
+
@@ -0,0 +1,72 @@
+import array
+import errno
+
+import pytest
+
+import SDL_DS3231
+
+
+class SMBusOnly(object):
+    """A bus adapter without combined transactions, like smbus.SMBus."""
+
+    def __init__(self, sim):
+        for name in ('read_byte', 'read_byte_data', 'write_byte_data',
+                     'read_i2c_block_data', 'write_i2c_block_data', 'sleep'):
+            setattr(self, name, getattr(sim, name))
+
+
+@pytest.fixture
+def pattern(sim):
+    data = bytes(bytearray(i * 7 & 0xFF for i in range(sim.eeprom.SIZE)))
+    sim.eeprom.memory[:] = data
+    return data
+
+
+def test_one_transaction_past_block_limit(sim, rtc, pattern):
+    buffer = bytearray(100)
+    assert rtc.readinto_AT24C32(0x3F0, buffer) == 100
+    assert buffer == pattern[0x3F0:0x454]
+    assert sim.ops == {'transfer': 1}
+
+
+def test_whole_chip(sim, rtc, pattern):
+    assert rtc.read_AT24C32_all() == pattern
+    assert sim.transactions == 1
+
+
+def test_into_memoryview_and_array(rtc, pattern):
+    buffer = bytearray(64)
+    rtc.readinto_AT24C32(10, memoryview(buffer)[16:48])
+    assert buffer[16:48] == pattern[10:42]
+    assert buffer[:16] == bytearray(16)
+    words = array.array('H', [0] * 20)
+    assert rtc.readinto_AT24C32(200, words) == 40
+    assert words.tobytes() == pattern[200:240]
+
+
+def test_byte_fallback(sim, pattern):
+    rtc = SDL_DS3231.SDL_DS3231(bus=SMBusOnly(sim))
+    buffer = bytearray(100)
+    rtc.readinto_AT24C32(0x3F0, buffer)
+    assert buffer == pattern[0x3F0:0x454]
+    # The address is set once, then the bytes are read sequentially.
+    assert sim.ops == {'write_i2c_block_data': 1, 'read_byte': 100}
+    assert rtc.read_AT24C32_byte(0x3F0) == pattern[0x3F0]
+
+
+def test_fallback_on_eopnotsupp(sim, pattern):
+    def eopnotsupp(*args):
+        raise IOError(errno.EOPNOTSUPP, 'Operation not supported')
+    bus = SMBusOnly(sim)
+    bus.transfer = eopnotsupp
+    rtc = SDL_DS3231.SDL_DS3231(bus=bus)
+    assert rtc.read_AT24C32_block(4000, 96) == pattern[4000:]
+    assert not rtc._combined
+    assert sim.ops['read_byte'] == 96
+
+
+@pytest.mark.parametrize('address, length', [(-1, 1), (4000, 97), (0, 4097)])
+def test_out_of_range(sim, rtc, address, length):
+    with pytest.raises(ValueError):
+        rtc.readinto_AT24C32(address, bytearray(length))
+    assert sim.transactions == 0
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import SDL_DS3231
+import SDL_DS3231_record
+
+
+def _workload(rtc):
+    times = [rtc.read_datetime() for _ in range(3)]
+    rtc.setAlarm(rtc.ALM1_MATCH_SECONDS, 30, 0, 0, 1)
+    rtc.write_AT24C32_byte(0x100, 0x5A)
+    return times, rtc.getTemp(), rtc.read_AT24C32_byte(0x100)
+
+
+def test_record_replay_round_trip(sim, tmpdir):
+    path = str(tmpdir.join('trace.bin'))
+    with SDL_DS3231_record.RecordingBus(sim, path, clock=sim.monotonic) as bus:
+        recorded = _workload(SDL_DS3231.SDL_DS3231(bus=bus))
+    replay = SDL_DS3231_record.ReplayBus(path)
+    assert _workload(SDL_DS3231.SDL_DS3231(bus=replay)) == recorded
+    assert replay.remaining == 0
+    with pytest.raises(ValueError):
+        replay.read_byte_data(0x68, 0)
+    replay.close()
+
+    summary = SDL_DS3231_record.analyze(path)
+    assert summary['transactions'] == len(replay)
+    assert summary['hot_registers'][0][0] == (0x68, 0)
+
+
+def test_replay_divergence(sim, tmpdir):
+    path = str(tmpdir.join('trace.bin'))
+    with SDL_DS3231_record.RecordingBus(sim, path) as bus:
+        bus.read_byte_data(0x68, 0)
+    replay = SDL_DS3231_record.ReplayBus(path)
+    with pytest.raises(ValueError):
+        replay.read_byte_data(0x68, 1)
+    replay.close()
+
+
+def test_new_recording_can_be_mapped(sim, tmpdir):
+    path = str(tmpdir.join('trace.bin'))
+    bus = SDL_DS3231_record.RecordingBus(sim, path)
+    with SDL_DS3231_record.Recording(path) as recording:
+        assert len(recording) == 0
+    bus.close()
+
+
+def test_reopen_cuts_torn_record(sim, tmpdir):
+    path = str(tmpdir.join('trace.bin'))
+    with SDL_DS3231_record.RecordingBus(sim, path) as bus:
+        for _ in range(5):
+            bus.read_byte_data(0x68, 0)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)
+    with SDL_DS3231_record.RecordingBus(sim, path) as bus:
+        for _ in range(5):
+            bus.write_byte_data(0x68, 0x0E, 0x1C)
+    with SDL_DS3231_record.Recording(path) as recording:
+        ops = [t.op for t in recording]
+    assert ops == ['read_byte_data'] * 4 + ['write_byte_data'] * 5
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+import SDL_DS3231_scheduler
+
+
+def _run(sim, scheduler, seconds):
+    """Advance simulated time a second at a time, servicing INT like the
+    dispatcher would."""
+    for _ in range(seconds):
+        sim.advance(1.0)
+        if sim.rtc.int_asserted:
+            scheduler.service()
+
+
+def test_deadlines_fire_in_order(rtc, sim):
+    scheduler = SDL_DS3231_scheduler.AlarmScheduler(rtc)
+    start = scheduler.now()
+    fired = []
+
+    def record(alarm):
+        fired.append((scheduler.now() - start, alarm.interval))
+
+    scheduler.schedule(start + timedelta(seconds=90), record)
+    scheduler.schedule(start + timedelta(seconds=5), record,
+                       interval=timedelta(seconds=30))
+    _run(sim, scheduler, 100)
+    assert fired == [
+        (timedelta(seconds=5), timedelta(seconds=30)),
+        (timedelta(seconds=35), timedelta(seconds=30)),
+        (timedelta(seconds=65), timedelta(seconds=30)),
+        (timedelta(seconds=90), None),
+        (timedelta(seconds=95), timedelta(seconds=30)),
+    ]
+
+
+def test_cancel_and_far_deadline(rtc, sim):
+    scheduler = SDL_DS3231_scheduler.AlarmScheduler(rtc)
+    fired = []
+    alarm = scheduler.schedule_in(3, fired.append)
+    scheduler.cancel(alarm)
+    _run(sim, scheduler, 10)
+    assert fired == []
+    assert len(scheduler) == 0
+
+    far = scheduler.schedule_in(timedelta(days=2), fired.append)
+    assert scheduler.next_deadline == far.deadline
+    sim.advance(2 * 86400 - 5)
+    _run(sim, scheduler, 10)
+    assert fired == [far]
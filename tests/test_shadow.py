@@ -0,0 +1,105 @@
+import pytest
+
+import SDL_DS3231
+from SDL_DS3231 import RTC_CONTROL, RTC_STATUS, OSF, A1F, A2F, bv
+
+
+def clearRTCAlarms(rtc):
+    # As in examples/alarm_ex1.py.
+    rtc.setAlarm(rtc.ALM1_MATCH_DATE, 0, 0, 0, 1)
+    rtc.setAlarm(rtc.ALM2_MATCH_DATE, 0, 0, 0, 1)
+    rtc.alarm(rtc.ALARM_1)
+    rtc.alarm(rtc.ALARM_2)
+    rtc.alarmInterrupt(rtc.ALARM_1, False)
+    rtc.alarmInterrupt(rtc.ALARM_2, False)
+    rtc.squareWave(rtc.SQWAVE_NONE)
+
+
+@pytest.fixture
+def writes(sim, monkeypatch):
+    """The (register, value) byte writes to the DS3231."""
+    log = []
+    write_byte_data = sim.write_byte_data
+
+    def record(addr, register, value):
+        if addr == 0x68:
+            log.append((register, value))
+        return write_byte_data(addr, register, value)
+    monkeypatch.setattr(sim, 'write_byte_data', record)
+    return log
+
+
+def _count(sim, **kwargs):
+    rtc = SDL_DS3231.SDL_DS3231(bus=sim, **kwargs)
+    clearRTCAlarms(rtc)
+    sim.reset_stats()
+    clearRTCAlarms(rtc)
+    return sim.transactions, sim.ops.get('read_byte_data', 0)
+
+
+def test_clear_alarms_transactions(sim):
+    assert _count(sim) == (10, 5)
+
+
+def test_clear_alarms_cached_control(sim):
+    # The two alarm() status reads and the two setAlarm() block writes.
+    assert _count(sim, cache_control=True) == (4, 2)
+
+
+def test_clear_alarms_cached_status(sim):
+    assert _count(sim, cache_control=True,
+                  status_max_age=float('inf')) == (2, 0)
+
+
+def test_clear_status_leaves_other_flags(sim, rtc, writes):
+    sim.rtc.registers[RTC_STATUS] |= bv(OSF) | bv(A1F) | bv(A2F)
+    assert rtc.alarm(rtc.ALARM_1)
+    register, value = writes[-1]
+    assert register == RTC_STATUS
+    assert value & bv(OSF) and value & bv(A2F) and not value & bv(A1F)
+    status = sim.rtc.registers[RTC_STATUS]
+    assert status & bv(OSF) and status & bv(A2F) and not status & bv(A1F)
+
+
+def test_clear_status_keeps_flag_set_meanwhile(sim, writes):
+    rtc = SDL_DS3231.SDL_DS3231(bus=sim, status_max_age=float('inf'))
+    sim.rtc.registers[RTC_STATUS] |= bv(A1F)
+    rtc.oscStopped(False)          # caches the status without A2F
+    sim.rtc.registers[RTC_STATUS] |= bv(A2F)
+    assert rtc.alarm(rtc.ALARM_1)
+    for register, value in writes:
+        if register == RTC_STATUS:
+            assert value & bv(A2F)
+    assert sim.rtc.registers[RTC_STATUS] & bv(A2F)
+
+
+def test_oscstopped_clears_only_osf(sim, rtc, writes):
+    sim.rtc.registers[RTC_STATUS] |= bv(A2F)
+    assert rtc.oscStopped(True)
+    assert writes[-1][1] & bv(A1F) and writes[-1][1] & bv(A2F)
+    assert sim.rtc.registers[RTC_STATUS] & bv(A2F)
+    assert not sim.rtc.registers[RTC_STATUS] & bv(OSF)
+
+
+def test_invalidate_shadow_rereads(sim):
+    rtc = SDL_DS3231.SDL_DS3231(bus=sim, cache_control=True,
+                                status_max_age=float('inf'))
+    rtc.alarmInterrupt(rtc.ALARM_1, True)
+    rtc.alarm(rtc.ALARM_1)
+    sim.reset_stats()
+    rtc.alarmInterrupt(rtc.ALARM_2, True)
+    assert not rtc.alarm(rtc.ALARM_2)
+    assert sim.ops.get('read_byte_data', 0) == 0
+
+    # Another program sets a flag and changes the control register.
+    sim.rtc.registers[RTC_STATUS] |= bv(A2F)
+    sim.rtc.registers[RTC_CONTROL] &= ~0x03
+    assert not rtc.alarm(rtc.ALARM_2)
+    rtc.invalidate_shadow(control=False)
+    assert rtc.alarm(rtc.ALARM_2)
+    assert sim.ops['read_byte_data'] == 1
+
+    rtc.invalidate_shadow()
+    rtc.alarmInterrupt(rtc.ALARM_1, True)
+    assert sim.ops['read_byte_data'] == 2
+    assert sim.rtc.registers[RTC_CONTROL] & 0x03 == 0x01
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+import SDL_DS3231
+import SDL_DS3231_sim
+from SDL_DS3231 import RTC_CONTROL, RTC_MONTH, RTC_TEMP_MSB, RTC_TEMP_LSB
+
+
+def test_one_transaction(sim, rtc):
+    snap = rtc.snapshot()
+    assert sim.transactions == 1
+    assert len(snap.registers) == SDL_DS3231.DS3231Snapshot.SIZE
+    assert snap.time == (17, 9, 16, 6, 6, 29, 50)
+    assert snap.datetime() == sim.rtc.datetime()
+    assert snap.control == sim.rtc.registers[RTC_CONTROL]
+    assert snap.osc_stopped
+    assert not snap.century
+
+
+def test_alarms_and_control(sim, rtc):
+    rtc.setAlarm(rtc.ALM1_MATCH_HOURS, 30, 15, 6, 1)
+    rtc.setAlarm(rtc.ALM2_MATCH_DAY, 0, 45, 7, 3)
+    rtc.alarmInterrupt(rtc.ALARM_2, True)
+    rtc.squareWave(rtc.SQWAVE_NONE)
+    snap = rtc.snapshot()
+    assert snap.alarm1 == (rtc.ALM1_MATCH_HOURS, 30, 15, 6, 1)
+    assert snap.alarm2 == (rtc.ALM2_MATCH_DAY, 0, 45, 7, 3)
+    assert not snap.alarm_interrupt(rtc.ALARM_1)
+    assert snap.alarm_interrupt(rtc.ALARM_2)
+    assert snap.square_wave == rtc.SQWAVE_NONE
+    assert snap.alarm_config == rtc.read_alarm_config()
+
+
+@pytest.mark.parametrize('msb, lsb, celsius', [
+    (0x19, 0x40, 25.25),
+    (0x00, 0x00, 0.0),
+    (0xFF, 0xC0, -0.25),
+    (0xF5, 0x40, -10.75),
+    (0x80, 0x00, -128.0),
+])
+def test_temperature(sim, rtc, msb, lsb, celsius):
+    sim.rtc.registers[RTC_TEMP_MSB] = msb
+    sim.rtc.registers[RTC_TEMP_LSB] = lsb
+    assert rtc.snapshot().temperature == celsius
+    assert rtc.getTemp() == celsius
+
+
+def test_simulated_negative_temperature():
+    sim = SDL_DS3231_sim.SimulatedBus(temperature=-20.5)
+    rtc = SDL_DS3231.SDL_DS3231(bus=sim)
+    assert rtc.getTemp(convert=True, sleep=sim.sleep) == -20.5
+
+
+def test_century_rollover():
+    sim = SDL_DS3231_sim.SimulatedBus(start=datetime(2099, 12, 31, 23, 59, 59))
+    rtc = SDL_DS3231.SDL_DS3231(bus=sim)
+    sim.advance(1.0)
+    snap = rtc.snapshot()
+    assert snap.century
+    assert snap.registers[RTC_MONTH] == 0x81
+    assert snap.time == (0, 1, 1, snap.time[3], 0, 0, 0)
+    assert snap.datetime(century=22) == datetime(2100, 1, 1)
+    assert rtc.read_all() == snap.time
+
+
+def test_immutable(rtc):
+    snap = rtc.snapshot()
+    with pytest.raises(AttributeError):
+        snap.control = 0
+    assert snap == SDL_DS3231.DS3231Snapshot(snap.registers)
+    assert hash(snap) == hash(SDL_DS3231.DS3231Snapshot(snap.registers))
+    with pytest.raises(ValueError):
+        SDL_DS3231.DS3231Snapshot(snap.registers[:-1])
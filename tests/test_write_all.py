@@ -0,0 +1,57 @@
+import errno
+from datetime import datetime
+
+import pytest
+
+
+FULL = dict(seconds=5, minutes=4, hours=3, day=2, date=1, month=12, year=25)
+
+
+def test_block_write(sim, rtc):
+    rtc.write_all(**FULL)
+    assert sim.ops == {'write_i2c_block_data': 1}
+    assert sim.rtc.datetime() == datetime(2025, 12, 1, 3, 4, 5)
+    assert rtc.read_all() == (25, 12, 1, 2, 3, 4, 5)
+
+
+def test_partial_write(sim, rtc):
+    rtc.write_all(minutes=0, hours=12)
+    assert sim.ops == {'write_byte_data': 2}
+    assert sim.rtc.datetime() == datetime(2017, 9, 16, 12, 0, 50)
+
+
+@pytest.mark.parametrize('field, value', [
+    ('seconds', 60), ('minutes', -1), ('hours', 24), ('day', 0),
+    ('day', 8), ('date', 0), ('date', 32), ('month', 13), ('year', 100),
+])
+def test_validates_before_writing(sim, rtc, field, value):
+    registers = bytes(sim.rtc.registers)
+    for values in (dict(FULL), {'seconds': 0, 'minutes': 0}):
+        values[field] = value
+        with pytest.raises(ValueError):
+            rtc.write_all(**values)
+    assert sim.transactions == 0
+    assert bytes(sim.rtc.registers) == registers
+
+
+def test_fallback_on_eopnotsupp(sim, rtc, monkeypatch):
+    def eopnotsupp(*args):
+        raise IOError(errno.EOPNOTSUPP, 'Operation not supported')
+    monkeypatch.setattr(sim, 'write_i2c_block_data', eopnotsupp)
+    rtc.write_all(**FULL)
+    assert sim.ops == {'write_byte_data': 7}
+    assert sim.rtc.datetime() == datetime(2025, 12, 1, 3, 4, 5)
+    assert not rtc._burst
+
+
+def test_write_datetime_sync(sim, rtc):
+    start = sim.time
+    rtc.write_datetime(datetime(2020, 2, 29, 23, 59, 59, 300000), sync=True)
+    # Written at the rounded up second, 0.7 s later.
+    assert sim.time - start == pytest.approx(0.7, abs=0.001)
+    assert sim.rtc.datetime() == datetime(2020, 3, 1, 0, 0, 0)
+
+    start = sim.time
+    rtc.write_datetime(datetime(2020, 3, 1, 12, 0, 0), sync=True)
+    assert sim.time - start < 0.001
+    assert sim.rtc.datetime() == datetime(2020, 3, 1, 12, 0, 0)